@@ -0,0 +1,506 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import datetime
+import platform
+import tempfile
+import argparse
+import subprocess
+
+from . import core, leaderboard, state as state_format
+from .crdt import empty_sync_state, add_to_counter, merge_sync_state, observe_state
+from .leaderboard_server import LeaderboardServer
+from .rules import ACHIEVEMENTS, SKILL_TREE, seed_random
+from .state import XPState, decode_snapshot, encode_snapshot
+from .stats import build_stats, get_previous_day
+from .timing import get_timing_report, reset_timers
+
+# Headless benchmarks for the XP core. They drive core.py the way ui.py does
+# (queue an answer, then run the deferred consumers) with stub tooltip and
+# main window objects, against a temporary data folder. Answers, dates and
+# custom achievements come from fixed seeds, so results from two commits can
+# be compared. Run from the folder that contains the add-on:
+#
+#   python -m <add-on folder>.benchmark --output after.json --baseline before.json
+
+BENCH_SEED = 0
+EASE_WEIGHTS = (1, 2, 3, 3, 3, 4, 4)  # Again/Hard/Good/Easy mix of a typical session
+
+# Scenario sizes (--quick divides them by 10)
+ANSWER_COUNT = 100000
+SIZE_EVERY_ANSWERS = 10000  # State file size is sampled this often
+HISTORY_YEARS = 10
+ACHIEVEMENT_COUNT = 2000
+ACHIEVEMENT_ANSWERS = 20000
+IMPORT_RUNS = 5
+PROFILE_COUNT = 30
+PROFILE_SWITCHES = 300
+MERGE_DEVICES = 50
+LEADERBOARD_ANSWERS = 20000
+FORMAT_RUNS = 20
+UNDO_ANSWERS = 20000
+UNDO_BURST = 5  # Answers taken back after every UNDO_BURST * 2 answered
+BREAKDOWN_ANSWERS = 20000
+BREAKDOWN_DECKS = 5000
+BREAKDOWN_NOTE_TYPES = 20
+LEADERBOARD_LATENCY = 0.005  # Seconds the stand-in server takes per request
+
+# Stands in for Anki's tooltip: counts calls and keeps the last message
+class StubTooltip:
+    def __init__(self):
+        self.calls = 0
+        self.last = None
+
+    def __call__(self, message, period=None):
+        self.calls += 1
+        self.last = message
+
+# Stands in for the main window the status bar consumer checks
+class StubMainWindow:
+    def __init__(self):
+        self.repaints = 0
+
+    def isVisible(self):
+        return True
+
+    def isMinimized(self):
+        return False
+
+# Latency summary in microseconds
+def summarize_latencies(latencies):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        "p50_us": latencies[(count - 1) // 2] * 1e6,
+        "p95_us": latencies[(count - 1) * 95 // 100] * 1e6,
+        "p99_us": latencies[(count - 1) * 99 // 100] * 1e6,
+        "max_us": latencies[-1] * 1e6
+    }
+
+# Size of the data files (files left behind by a migration don't count)
+def get_data_size():
+    return sum(os.path.getsize(os.path.join(core.data_dir, name)) for name in os.listdir(core.data_dir)
+               if name.startswith("xp_") and not name.endswith(".migrated"))
+
+# Point the core at a fresh temporary folder with the stubs hooked up
+def start_scenario(backend="json"):
+    core.STORAGE_BACKEND = backend
+    core.set_device_id("benchmark")
+    data_dir = tempfile.mkdtemp(prefix="xp-bench-")
+    core.set_data_dir(data_dir)
+    reset_timers()
+    seed_random(BENCH_SEED)
+    return data_dir
+
+def end_scenario(data_dir):
+    core.flush_state_now()
+    core.STORAGE_BACKEND = "json"
+    shutil.rmtree(data_dir, ignore_errors=True)
+
+# Stub UI consumers, registered once: a tooltip that gets the real message
+# text and a status bar that redoes the level lookup
+stub_tooltip = StubTooltip()
+stub_mw = StubMainWindow()
+
+def consume_stub_tooltip(event):
+    message, period = core.get_answer_message(event)
+    stub_tooltip(message, period=period)
+
+def consume_stub_status_bar(event):
+    core.calculate_level(core.xp_state["total_xp"])
+    stub_mw.repaints += 1
+
+def register_stub_consumers():
+    if not any(consumer.name == "stub_tooltip" for consumer in core._answer_consumers):
+        core.set_notifier(stub_tooltip)
+        core.register_answer_consumer("stub_tooltip", consume_stub_tooltip, deferred=True)
+        core.register_answer_consumer("stub_status_bar", consume_stub_status_bar, deferred=True,
+                                      should_run=lambda: stub_mw.isVisible() and not stub_mw.isMinimized(),
+                                      latest_only=True)
+
+# Answer count eases the way the reviewer does, timing each one
+def run_answers(count, rng, sizes=None):
+    eases = [rng.choice(EASE_WEIGHTS) for _ in range(count)]
+    latencies = []
+    start = time.perf_counter()
+    for number, ease in enumerate(eases, 1):
+        answer_start = time.perf_counter()
+        if core.queue_answer(ease):
+            core.run_deferred_consumers()
+        latencies.append(time.perf_counter() - answer_start)
+        if sizes is not None and number % SIZE_EVERY_ANSWERS == 0:
+            core.flush_state(wait=True)
+            sizes.append((number, get_data_size()))
+    elapsed = time.perf_counter() - start
+    result = summarize_latencies(latencies)
+    result["answers"] = count
+    result["answers_per_second"] = count / elapsed
+    return result
+
+# Many answers in one session: latency, throughput and state file growth
+def bench_answers(count):
+    data_dir = start_scenario()
+    try:
+        sizes = []
+        result = run_answers(count, random.Random(BENCH_SEED), sizes)
+        result["size_bytes"] = sizes
+        core.flush_state_now()
+        result["compacted_size_bytes"] = get_data_size()
+        result["timers"] = get_timing_report()
+        return result
+    finally:
+        end_scenario(data_dir)
+
+# Daily history covering years of study, ending yesterday
+def make_history(years, rng):
+    today = datetime.date.fromisoformat(core.get_today())
+    return {(today - datetime.timedelta(days=offset)).isoformat(): rng.randint(50, 2000)
+            for offset in range(1, years * 365 + 1) if rng.random() < 0.9}
+
+# Years of daily history on disk: first load (which moves old days to the
+# archive and builds the stats aggregates), a reload, the stats history and
+# dashboard and the answer path afterwards
+def bench_history(years, backend):
+    data_dir = start_scenario(backend)
+    try:
+        rng = random.Random(BENCH_SEED)
+        state = core.default_state()
+        state["xp_history"] = make_history(years, rng)
+        state["total_xp"] = sum(state["xp_history"].values())
+        state["date"] = state["last_study_date"] = get_previous_day(core.get_today())
+        with open(os.path.join(data_dir, "xp_data.json"), "w") as f:
+            json.dump(state.to_dict(), f)
+        result = {"days": len(state["xp_history"]), "input_size_bytes": get_data_size()}
+
+        start = time.perf_counter()
+        core.ensure_state()
+        result["first_load_ms"] = (time.perf_counter() - start) * 1000
+        core.flush_state_now()
+        result["size_bytes"] = get_data_size()
+
+        core.set_data_dir(data_dir)
+        start = time.perf_counter()
+        core.ensure_state()
+        result["reload_ms"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        core.get_history()
+        result["history_ms"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        core.get_stats()
+        result["stats_ms"] = (time.perf_counter() - start) * 1000
+
+        result["answers"] = run_answers(ANSWER_COUNT // 10, rng)
+        return result
+    finally:
+        end_scenario(data_dir)
+
+# Median milliseconds fn takes over runs calls
+def median_ms(fn, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2] * 1000
+
+# A state with years of daily history kept per day (as replays and
+# simulations produce), every achievement and skill, and the mergeable state
+# and stats: size and median write and read times of the JSON snapshot and
+# the binary one. The binary snapshot's first read of a history is timed on
+# its own, since later reads reuse the day keys it built.
+def bench_state_format(years, runs):
+    rng = random.Random(BENCH_SEED)
+    today = core.get_today()
+    state = core.default_state(today)
+    state["xp_history"] = make_history(years, rng)
+    state["total_xp"] = sum(state["xp_history"].values())
+    days = sorted(state["xp_history"])
+    state["achievements"] = {ach_id: {"earned": True, "date": rng.choice(days)} for ach_id in ACHIEVEMENTS}
+    state["skills"] = {skill_id: 1 for skill_id in SKILL_TREE}
+    state["sync"] = empty_sync_state("benchmark")
+    observe_state(state["sync"], state, "benchmark", days[-core.HISTORY_DAILY_DAYS])
+    state["stats"] = build_stats(state["xp_history"], {}, state)
+
+    text = json.dumps(state.to_dict())
+    data = encode_snapshot(state)
+    state_format._year_days.clear()
+    start = time.perf_counter()
+    decoded = decode_snapshot(data)[0]
+    snapshot_first_read_ms = (time.perf_counter() - start) * 1000
+    assert decoded == state and XPState.from_dict(json.loads(text)) == state
+    return {
+        "days": len(days),
+        "json_size_bytes": len(text.encode()),
+        "snapshot_size_bytes": len(data),
+        "json_write_ms": median_ms(lambda: json.dumps(state.to_dict()), runs),
+        "snapshot_write_ms": median_ms(lambda: encode_snapshot(state), runs),
+        "json_read_ms": median_ms(lambda: XPState.from_dict(json.loads(text)), runs),
+        "snapshot_first_read_ms": snapshot_first_read_ms,
+        "snapshot_read_ms": median_ms(lambda: decode_snapshot(data), runs)
+    }
+
+# Custom achievements on the answer-driven fields, with seeded thresholds
+def make_achievements(count, rng):
+    ranges = {"level": (2, 100), "streak": (5, 5000), "total_xp": (100, 1000000), "multiplier": (1.5, 5.0)}
+    achievements = {}
+    for number in range(count):
+        field = rng.choice(sorted(ranges))
+        low, high = ranges[field]
+        threshold = round(rng.uniform(low, high), 1) if isinstance(low, float) else rng.randint(low, high)
+        achievements[f"bench_{number}"] = {
+            "name": f"Benchmark {number}",
+            "description": f"{field} >= {threshold}",
+            "requirement": f"{field} >= {threshold}",
+            "reward_xp": 10,
+            "icon": "*",
+            "hidden": True
+        }
+    return achievements
+
+# Answers with many achievements still to earn
+def bench_achievements(count, answers):
+    data_dir = start_scenario()
+    custom = make_achievements(count, random.Random(BENCH_SEED))
+    ACHIEVEMENTS.update(custom)
+    try:
+        start = time.perf_counter()
+        core.reload_achievements()
+        result = {"achievements": count, "compile_ms": (time.perf_counter() - start) * 1000}
+        result["answers"] = run_answers(answers, random.Random(BENCH_SEED))
+        result["earned"] = sum(1 for ach_id in custom if ach_id in core.xp_state["achievements"])
+        return result
+    finally:
+        for ach_id in custom:
+            del ACHIEVEMENTS[ach_id]
+        core.reload_achievements()
+        end_scenario(data_dir)
+
+# Cost of importing the core in a fresh interpreter (median of a few runs);
+# the add-on's share of Anki's launch apart from the deferred startup
+def bench_import(runs):
+    package = __package__ or __name__.rpartition(".")[0]
+    parent_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    code = ("import time; start = time.perf_counter(); "
+            f"import {package}.core; print(time.perf_counter() - start)")
+    times = sorted(float(subprocess.run([sys.executable, "-c", code], cwd=parent_dir, check=True,
+                                        capture_output=True, text=True).stdout.split()[-1])
+                   for _ in range(runs))
+    return {"import_ms": times[len(times) // 2] * 1000}
+
+# Deferred startup against a typical state file: first load of the day
+def bench_startup():
+    data_dir = start_scenario()
+    try:
+        rng = random.Random(BENCH_SEED)
+        state = core.default_state()
+        state["xp_history"] = make_history(1, rng)
+        state["total_xp"] = sum(state["xp_history"].values())
+        state["date"] = state["last_study_date"] = get_previous_day(core.get_today())
+        with open(os.path.join(data_dir, "xp_data.json"), "w") as f:
+            json.dump(state.to_dict(), f)
+        start = time.perf_counter()
+        core.ensure_state()
+        return {"load_ms": (time.perf_counter() - start) * 1000}
+    finally:
+        end_scenario(data_dir)
+
+# Switching between profiles that each have a year of history: a few
+# profiles in turn (served from the profile cache) and many (read from disk)
+def bench_profiles(count, switches):
+    data_dir = start_scenario()
+    try:
+        rng = random.Random(BENCH_SEED)
+        yesterday = get_previous_day(core.get_today())
+        for number in range(count):
+            profile_dir = os.path.join(data_dir, f"profile_{number}")
+            os.makedirs(profile_dir)
+            state = core.default_state()
+            state["xp_history"] = make_history(1, rng)
+            state["total_xp"] = sum(state["xp_history"].values())
+            state["date"] = state["last_study_date"] = yesterday
+            with open(os.path.join(profile_dir, "xp_data.json"), "w") as f:
+                json.dump(state.to_dict(), f)
+
+        result = {"profiles": count}
+        for name, in_turn in (("cached", core.PROFILE_CACHE_SIZE), ("uncached", count)):
+            start = time.perf_counter()
+            for number in range(switches):
+                profile = f"profile_{number % in_turn}"
+                core.switch_profile(profile, os.path.join(data_dir, profile))
+                core.ensure_state()
+            result[f"{name}_switch_ms"] = (time.perf_counter() - start) * 1000 / switches
+        return result
+    finally:
+        end_scenario(data_dir)
+
+# Merging the mergeable states of many devices, each with a full daily window
+def bench_merge(devices):
+    rng = random.Random(BENCH_SEED)
+    today = datetime.date.fromisoformat(core.get_today())
+    days = [(today - datetime.timedelta(days=offset)).isoformat() for offset in range(core.HISTORY_DAILY_DAYS)]
+    syncs = []
+    for number in range(devices):
+        sync = empty_sync_state(f"device_{number}")
+        for day in days:
+            day_xp = rng.randint(-50, 2000)
+            add_to_counter(sync["total_xp"], sync["device"], day_xp)
+            add_to_counter(sync["days"].setdefault(day, {}), sync["device"], day_xp)
+        syncs.append(sync)
+    start = time.perf_counter()
+    merged = empty_sync_state("merged")
+    for sync in syncs:
+        merge_sync_state(merged, sync)
+    elapsed = time.perf_counter() - start
+    return {"devices": devices, "merge_ms": elapsed * 1000,
+            "merged_size_bytes": len(json.dumps(merged)), "device_size_bytes": len(json.dumps(syncs[0]))}
+
+# Answers with leaderboard uploads to the local stand-in server (with some
+# request latency): answer latency, and how fast the batches drain
+def bench_leaderboard(count):
+    data_dir = start_scenario()
+    server = LeaderboardServer(delay=LEADERBOARD_LATENCY)
+    port = server.start()
+    batch_delay = leaderboard.BATCH_DELAY
+    leaderboard.BATCH_DELAY = 0.01
+    try:
+        core.start_leaderboard(f"http://127.0.0.1:{port}", "benchmark", "Benchmark")
+        client = core.leaderboard_client
+        start = time.perf_counter()
+        result = run_answers(count, random.Random(BENCH_SEED))
+        while client.queue or client.uploaded < count:
+            time.sleep(0.001)
+        elapsed = time.perf_counter() - start
+        core.stop_leaderboard()
+        result["upload_ms"] = elapsed * 1000
+        result["uploads_per_second"] = count / elapsed
+        result["requests"] = server.requests
+        result["connections"] = server.connections
+        result["events_per_request"] = server.events / max(server.requests, 1)
+        return result
+    finally:
+        core.stop_leaderboard()
+        leaderboard.BATCH_DELAY = batch_delay
+        server.stop()
+        end_scenario(data_dir)
+
+# A fast session with undo hammered: after every UNDO_BURST * 2 answers the
+# last UNDO_BURST are taken back. Undo latency, and what the journal ends up
+# holding.
+def bench_undo(count):
+    data_dir = start_scenario()
+    try:
+        rng = random.Random(BENCH_SEED)
+        latencies = []
+        for number in range(1, count + 1):
+            if core.queue_answer(rng.choice(EASE_WEIGHTS), number, number):
+                core.run_deferred_consumers()
+            if number % (UNDO_BURST * 2) == 0:
+                for _ in range(UNDO_BURST):
+                    undo_start = time.perf_counter()
+                    core.undo_answer()
+                    latencies.append(time.perf_counter() - undo_start)
+        core.flush_state(wait=True)
+        result = summarize_latencies(latencies)
+        result["undos"] = len(latencies)
+        result["undos_per_second"] = len(latencies) / sum(latencies)
+        result["size_bytes"] = get_data_size()
+        return result
+    finally:
+        end_scenario(data_dir)
+
+# Answers spread over thousands of decks, a few busy and most rarely
+# studied: answer latency with per-deck attribution, how big the breakdown
+# gets and how long the breakdown view's summary takes
+def bench_breakdown(count, decks):
+    data_dir = start_scenario()
+    try:
+        rng = random.Random(BENCH_SEED)
+        latencies = []
+        start = time.perf_counter()
+        for number in range(count):
+            deck_id = int(rng.paretovariate(1.0) * 10) % decks
+            answer_start = time.perf_counter()
+            if core.queue_answer(rng.choice(EASE_WEIGHTS), number, number, deck_id, deck_id % BREAKDOWN_NOTE_TYPES):
+                core.run_deferred_consumers()
+            latencies.append(time.perf_counter() - answer_start)
+        elapsed = time.perf_counter() - start
+        result = summarize_latencies(latencies)
+        result["answers_per_second"] = count / elapsed
+        result["decks_tracked"] = len(core.xp_state["breakdown"]["decks"])
+        result["breakdown_bytes"] = len(json.dumps(core.xp_state["breakdown"]))
+        result["summary_ms"] = median_ms(core.get_breakdown, FORMAT_RUNS)
+        return result
+    finally:
+        end_scenario(data_dir)
+
+def run_benchmarks(scale=1):
+    register_stub_consumers()
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": scale,
+        "seed": BENCH_SEED,
+        "scenarios": {
+            "import": bench_import(IMPORT_RUNS),
+            "startup": bench_startup(),
+            "profiles": bench_profiles(PROFILE_COUNT, PROFILE_SWITCHES),
+            "merge": bench_merge(MERGE_DEVICES),
+            "answers": bench_answers(ANSWER_COUNT // scale),
+            "history_json": bench_history(HISTORY_YEARS, "json"),
+            "history_sqlite": bench_history(HISTORY_YEARS, "sqlite"),
+            "history_snapshot": bench_history(HISTORY_YEARS, "snapshot"),
+            "state_format": bench_state_format(HISTORY_YEARS, FORMAT_RUNS),
+            "achievements": bench_achievements(ACHIEVEMENT_COUNT // scale, ACHIEVEMENT_ANSWERS // scale),
+            "leaderboard": bench_leaderboard(LEADERBOARD_ANSWERS // scale),
+            "undo": bench_undo(UNDO_ANSWERS // scale),
+            "breakdown": bench_breakdown(BREAKDOWN_ANSWERS // scale, BREAKDOWN_DECKS)
+        }
+    }
+
+# Flatten nested results into {"scenario.key": number}
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        if key == "timers":
+            continue
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+def print_results(results, baseline=None):
+    flat = flatten(results["scenarios"])
+    old = flatten(baseline["scenarios"]) if baseline else {}
+    for key, value in flat.items():
+        line = f"{key:45} {value:14.2f}"
+        if old.get(key):
+            line += f"   {value / old[key]:6.2f}x baseline"
+        print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless benchmarks for the XP add-on core")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--quick", action="store_true", help="a tenth of the answers and achievements")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+    results = run_benchmarks(10 if args.quick else 1)
+    if baseline and baseline.get("scale") != results["scale"]:
+        print("Baseline was run at a different scale; ratios are not comparable", file=sys.stderr)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import heapq
+import datetime
+
+from .stats import add_to_period
+
+# Per-deck and per-note-type XP, kept in xp_state["breakdown"] and updated by
+# each answer in constant time (see attribute_answer), so the breakdown view
+# never walks the history:
+#
+#   "version": BREAKDOWN_VERSION
+#   "decks": {deck_id: {"xp", "answers", "days": {"YYYY-MM-DD": xp}}}  the
+#            MAX_DECKS most recently answered decks, least recent first, each
+#            with its last DECK_DAYS study days
+#   "note_types": {note_type_id: {"xp", "answers"}}  the MAX_NOTE_TYPES most
+#                 recently answered note types, least recent first
+#   "other_decks", "other_note_types": {"xp", "answers"}  what the decks and
+#                                      note types dropped past those limits had
+#   "top": [[xp, deck_id]]  min-heap of the TOP_DECKS decks with the most XP
+#   "top_stale": True when the heap may be missing a deck (a top deck lost
+#                enough XP to fall behind one outside it, or was dropped);
+#                get_top_decks rebuilds it then
+#
+# Ids are strings (they're JSON keys). Only answer XP is attributed:
+# achievement rewards and daily bonuses aren't earned in a deck.
+
+BREAKDOWN_VERSION = 1
+MAX_DECKS = 200
+MAX_NOTE_TYPES = 100
+DECK_DAYS = 14
+TOP_DECKS = 10
+
+def empty_totals():
+    return {"xp": 0, "answers": 0}
+
+def empty_breakdown():
+    return {
+        "version": BREAKDOWN_VERSION,
+        "decks": {},
+        "note_types": {},
+        "other_decks": empty_totals(),
+        "other_note_types": empty_totals(),
+        "top": [],
+        "top_stale": False
+    }
+
+# Entry for key in a least recently used first {key: entry}, moved to the end
+# (or added there). Past limit, the least recently used entry is dropped and
+# its totals added to other; returns (entry, dropped key or None).
+def touch_entry(entries, key, limit, other, new_entry):
+    entry = entries.pop(key, None)
+    if entry is None:
+        entry = new_entry()
+    entries[key] = entry
+    dropped = None
+    if len(entries) > limit:
+        dropped = next(iter(entries))
+        old = entries.pop(dropped)
+        other["xp"] += old["xp"]
+        other["answers"] += old["answers"]
+    return entry, dropped
+
+def new_deck_entry():
+    return {"xp": 0, "answers": 0, "days": {}}
+
+# Keep the top heap in line with a deck's new XP total. The decks outside the
+# heap never have more XP than its smallest entry, so a deck only has to be
+# compared with that; a top deck dropping below it may leave a bigger one
+# outside, which marks the heap stale.
+def update_top(breakdown, deck_id, xp):
+    top = breakdown["top"]
+    for entry in top:
+        if entry[1] == deck_id:
+            least = top[0][0]
+            entry[0] = xp
+            heapq.heapify(top)  # TOP_DECKS entries
+            if xp < least and len(breakdown["decks"]) > len(top):
+                breakdown["top_stale"] = True
+            return
+    if len(top) < TOP_DECKS:
+        heapq.heappush(top, [xp, deck_id])
+    elif xp > top[0][0]:
+        heapq.heapreplace(top, [xp, deck_id])
+
+# Take a dropped deck out of the top heap
+def drop_from_top(breakdown, deck_id):
+    top = breakdown["top"]
+    for index, entry in enumerate(top):
+        if entry[1] == deck_id:
+            top.pop(index)
+            heapq.heapify(top)
+            breakdown["top_stale"] = True
+            return
+
+# Count an answer's XP for its deck and note type (either may be None) on day.
+# A taken-back answer is counted again with the XP negated and answers=-1.
+def attribute_answer(breakdown, day, deck_id, note_type_id, xp, answers=1):
+    if deck_id is not None:
+        deck, dropped = touch_entry(breakdown["decks"], str(deck_id), MAX_DECKS, breakdown["other_decks"],
+                                    new_deck_entry)
+        deck["xp"] += xp
+        deck["answers"] += answers
+        add_to_period(deck["days"], day, xp, DECK_DAYS)
+        if dropped is not None:
+            drop_from_top(breakdown, dropped)
+        update_top(breakdown, str(deck_id), deck["xp"])
+    if note_type_id is not None:
+        note_type, dropped = touch_entry(breakdown["note_types"], str(note_type_id), MAX_NOTE_TYPES,
+                                         breakdown["other_note_types"], empty_totals)
+        note_type["xp"] += xp
+        note_type["answers"] += answers
+
+# The TOP_DECKS decks with the most XP as [(deck_id, xp)], most first. Only a
+# stale heap is rebuilt, from the (at most MAX_DECKS) deck totals.
+def get_top_decks(breakdown):
+    if breakdown["top_stale"]:
+        top = heapq.nlargest(TOP_DECKS, ([deck["xp"], deck_id] for deck_id, deck in breakdown["decks"].items()))
+        heapq.heapify(top)
+        breakdown["top"] = top
+        breakdown["top_stale"] = False
+    return [(deck_id, xp) for xp, deck_id in sorted(breakdown["top"], reverse=True)]
+
+# What the breakdown view shows: the top decks with their answers, today's
+# and the last 7 days' XP, and every tracked note type by XP
+def summarize_breakdown(breakdown, day):
+    start_7 = (datetime.date.fromisoformat(day) - datetime.timedelta(days=6)).isoformat() if day else ""
+    decks = []
+    for deck_id, xp in get_top_decks(breakdown):
+        deck = breakdown["decks"][deck_id]
+        decks.append({
+            "deck_id": deck_id,
+            "xp": xp,
+            "answers": deck["answers"],
+            "today": deck["days"].get(day, 0),
+            "last_7": sum(day_xp for deck_day, day_xp in deck["days"].items() if deck_day >= start_7)
+        })
+    note_types = [{"note_type_id": note_type_id, "xp": note_type["xp"], "answers": note_type["answers"]}
+                  for note_type_id, note_type in breakdown["note_types"].items()]
+    note_types.sort(key=lambda note_type: note_type["xp"], reverse=True)
+    return {
+        "decks": decks,
+        "deck_count": len(breakdown["decks"]),
+        "note_types": note_types,
+        "other_decks": dict(breakdown["other_decks"]),
+        "other_note_types": dict(breakdown["other_note_types"])
+    }
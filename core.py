@@ -0,0 +1,714 @@
+import os
+import json
+import datetime
+import time
+import hashlib
+from collections import OrderedDict, deque
+
+from .storage import JsonStore, SnapshotStore, StateWriter, take_old_history, write_atomic
+from .crdt import (apply_sync_state, empty_sync_state, forget_achievements, get_spent_skill_points, get_sync_delta,
+                   load_device_id, merge_sync_state, observe_state)
+from .rules import *
+from .leaderboard import LeaderboardClient
+from .replay import replay_answers
+from .state import XPState
+from .breakdown import BREAKDOWN_VERSION, attribute_answer, empty_breakdown, summarize_breakdown
+from .stats import RUNS_KEPT, STATS_VERSION, build_stats, observe_stats, summarize_stats
+from .timing import timed
+from .tooltips import TOOLTIP_PERIOD_BONUS, TOOLTIP_PERIOD_LONG, TooltipTemplates
+
+# XP state engine: loading, saving, daily rollover, achievements and the answer
+# pipeline. Nothing here imports aqt/anki, so it runs outside Anki too (see
+# benchmark.py); the add-on's Qt side lives in ui.py.
+
+# Persistence configuration (answers are saved in batches, whichever comes first)
+STORAGE_BACKEND = "json"  # "json" (xp_data.json + journal), "snapshot" (binary xp_data.snap + journal) or "sqlite" (xp_data.db)
+SAVE_EVERY_ANSWERS = 25
+SAVE_EVERY_SECONDS = 30
+COMPACT_EVERY_ANSWERS = 500  # Journal entries before they're folded into a snapshot
+HISTORY_DAILY_DAYS = 90  # Days kept per day in xp_data.json; older ones go to the archive
+PROFILE_CACHE_SIZE = 4  # Recently used profiles kept in memory besides the current one
+DAY_ROLLOVER_HOUR = 0  # Local hour a new study day starts (the UI uses Anki's "next day starts at")
+UNDO_DEPTH = 100  # Answers that can be taken back (Anki's undo); older ones drop out
+
+# Global data (fields and defaults are in state.py). Always updated in place
+# (see replace_state), so modules that imported xp_state keep seeing the
+# current state.
+xp_state = XPState()
+
+# Resident state tracking: xp_state stays in memory after the first load and
+# is only re-read when the saved state changes on disk or the day rolls over
+_state_day = ""  # Day the in-memory state was last loaded for
+
+# What the latest answers changed, newest last, for taking them back (see
+# undo_answer). A ring buffer: the oldest delta drops out once it's full.
+_undo_deltas = deque(maxlen=UNDO_DEPTH)
+
+# Current study day, worked out once per day rather than per answer (see
+# update_study_day)
+_today = ""
+_yesterday = ""
+_day_end = 0.0  # time.time() when the current study day ends
+_history_cutoff = ""  # First day kept at daily granularity in xp_history
+
+# Write-behind persistence: changes go to a store that hands them to a
+# background writer thread in batches
+_writer = StateWriter()
+_last_flush = time.monotonic()
+
+# Folder the data files live in: the add-on folder until a profile is
+# selected (see switch_profile), or whatever set_data_dir was given
+addon_dir = os.path.dirname(os.path.realpath(__file__))
+data_dir = addon_dir
+
+# Notifications for the user (level ups, bonuses, achievements); the UI sets
+# this to Anki's tooltip, and without it they're dropped
+_notifier = None
+
+def set_notifier(notifier):
+    global _notifier
+    _notifier = notifier
+
+def notify(message, period):
+    if _notifier is not None:
+        _notifier(message, period=period)
+
+# Get file path
+def get_file_path():
+    return os.path.join(data_dir, "xp_data.json")
+
+# Get binary snapshot file path (snapshot backend)
+def get_snapshot_path():
+    return os.path.join(data_dir, "xp_data.snap")
+
+# Get journal file path
+def get_journal_path():
+    return os.path.join(data_dir, "xp_data.journal")
+
+# Get history archive file path
+def get_archive_path():
+    return os.path.join(data_dir, "xp_history_archive.json")
+
+# Get database file path (sqlite backend)
+def get_db_path():
+    return os.path.join(data_dir, "xp_data.db")
+
+# Get cached leaderboard file path
+def get_leaderboard_path():
+    return os.path.join(data_dir, "xp_leaderboard.json")
+
+# Create the configured state store
+def create_store():
+    json_store = JsonStore(_writer, get_file_path(), get_journal_path(), get_archive_path(), COMPACT_EVERY_ANSWERS)
+    if STORAGE_BACKEND == "sqlite":
+        from .sqlite_store import SqliteStore
+        return SqliteStore(_writer, get_db_path(), HISTORY_DAILY_DAYS, json_store)
+    if STORAGE_BACKEND == "snapshot":
+        return SnapshotStore(_writer, get_snapshot_path(), get_journal_path(), get_archive_path(), COMPACT_EVERY_ANSWERS,
+                             get_file_path())
+    return json_store
+
+_store = create_store()
+
+# Use another data folder (and the current STORAGE_BACKEND) from now on,
+# outside of any profile. The state starts over empty; the next
+# ensure_state loads from there.
+def set_data_dir(path):
+    global data_dir, _store, _state_day, current_profile
+    _writer.wait()
+    for cached in _profiles.values():
+        cached.store.close()
+    _profiles.clear()
+    _store.close()
+    current_profile = None
+    data_dir = path
+    _store = create_store()
+    _state_day = ""
+    replace_state(default_state())
+
+# Data files from before states were kept per profile, in the add-on folder
+LEGACY_DATA_FILES = ("xp_data.json", "xp_data.snap", "xp_data.journal", "xp_history_archive.json",
+                     "xp_data.db", "xp_data.db-wal", "xp_data.db-shm")
+
+# Everything that belongs to one profile while it isn't the current one
+class ProfileState:
+    def __init__(self, data_dir, store, state, state_day, achievement_index):
+        self.data_dir = data_dir
+        self.store = store
+        self.state = state
+        self.state_day = state_day
+        self.achievement_index = achievement_index
+
+# Folder for a profile's data files. user_files is kept by Anki when the
+# add-on is updated. Names are percent-encoded, so no two profiles share a
+# folder: letters, digits, "-" and "_" are kept as they are, and so are spaces
+# and dots inside the name (not at either end, where file systems drop or
+# misread them).
+def get_profile_dir(name):
+    chars = []
+    for index, c in enumerate(name):
+        if c.isalnum() or c in "-_" or (c in " ." and 0 < index < len(name) - 1):
+            chars.append(c)
+        else:
+            chars.append("".join(f"%{byte:02X}" for byte in c.encode()))
+    return os.path.join(addon_dir, "user_files", "profiles", "".join(chars) or "%")
+
+current_profile = None
+_profiles = OrderedDict()  # Format: {profile name: ProfileState}, least recently used first
+
+# Make name (with its data in path) the current profile. The outgoing
+# profile's writes are flushed to its own files and its state is kept in a
+# small LRU, so switching back doesn't parse its files again.
+def switch_profile(name, path):
+    global current_profile, data_dir, _store, _state_day, achievement_index
+    if name == current_profile:
+        return
+    flush_state_now()
+    if current_profile is not None:
+        _profiles[current_profile] = ProfileState(data_dir, _store, xp_state.copy(), _state_day, achievement_index)
+        while len(_profiles) > PROFILE_CACHE_SIZE:
+            evicted = _profiles.popitem(last=False)[1]
+            evicted.store.close()
+
+    current_profile = name
+    cached = _profiles.pop(name, None)
+    if cached is not None:
+        data_dir, _store, _state_day, achievement_index = cached.data_dir, cached.store, cached.state_day, cached.achievement_index
+        replace_state(cached.state)
+        return
+
+    os.makedirs(path, exist_ok=True)
+    adopt_legacy_data(path)
+    data_dir = path
+    _store = create_store()
+    _state_day = ""
+    achievement_index = AchievementIndex(ACHIEVEMENTS)
+    replace_state(default_state())
+
+# Move the shared pre-profile data files into the first profile folder that
+# has no data of its own
+def adopt_legacy_data(path):
+    if any(os.path.exists(os.path.join(path, name)) for name in LEGACY_DATA_FILES):
+        return
+    for name in LEGACY_DATA_FILES:
+        legacy_path = os.path.join(addon_dir, name)
+        if os.path.exists(legacy_path):
+            os.replace(legacy_path, os.path.join(path, name))
+            print(f"XP Add-on: Moved {name} to {path}")
+
+# Swap in a whole new state, keeping the xp_state object
+def replace_state(state):
+    if state is not xp_state:
+        xp_state.assign(state)
+    _undo_deltas.clear()
+    update_skill_effects()
+
+# Save state (full snapshot, for changes that aren't plain answers). Answers
+# from before such a change can't be taken back any more.
+@timed("save_state")
+def save_state():
+    _undo_deltas.clear()
+    _store.mark_dirty()
+    flush_state()
+
+# Record an answer (handed to the writer in batches)
+def journal_answer(ease, earned_xp, achievement_ids):
+    reward_xp = sum(get_reward_xp(ach_id) for ach_id in achievement_ids)
+    _store.record_answer(xp_state, ease, earned_xp, achievement_ids, reward_xp, int(time.time()))
+    if _store.pending_answers() >= SAVE_EVERY_ANSWERS or time.monotonic() - _last_flush >= SAVE_EVERY_SECONDS:
+        flush_state()
+
+# Record a taken-back answer, like journal_answer. The journal doesn't carry
+# skill points (they follow from the level on load, upward only), so taking
+# back a level up is saved as a snapshot.
+def journal_undo(delta):
+    _store.record_undo(xp_state, delta, int(time.time()))
+    if delta.skill_points:
+        _store.mark_dirty()
+    if _store.pending_answers() >= SAVE_EVERY_ANSWERS or time.monotonic() - _last_flush >= SAVE_EVERY_SECONDS:
+        flush_state()
+
+# Hand pending changes to the background writer
+@timed("flush_state")
+def flush_state(wait=False, compact=False):
+    global _last_flush
+    try:
+        observe_sync()
+        _store.flush(xp_state, compact)
+        _last_flush = time.monotonic()
+        if wait:
+            _writer.wait()
+    except Exception as e:
+        print(f"Error saving state: {str(e)}")
+
+# Work out the current study day and when it ends
+def update_study_day():
+    global _today, _yesterday, _day_end, _history_cutoff
+    _today, _yesterday, _day_end = get_study_day(time.time(), DAY_ROLLOVER_HOUR)
+    _history_cutoff = (datetime.date.fromisoformat(_today) - datetime.timedelta(days=HISTORY_DAILY_DAYS)).isoformat()
+
+update_study_day()
+
+# Current study day (moving on to the next one if it has started)
+def get_today():
+    if time.time() >= _day_end:
+        update_study_day()
+    return _today
+
+# Use another day rollover hour (e.g. from Anki's preferences)
+def set_rollover_hour(hour):
+    global DAY_ROLLOVER_HOUR
+    DAY_ROLLOVER_HOUR = hour
+    update_study_day()
+
+# Seconds until the current study day ends, for arming a rollover timer
+def get_seconds_to_day_end():
+    return max(0.0, _day_end - time.time())
+
+# First day kept at daily granularity in xp_history
+def get_history_cutoff():
+    return _history_cutoff
+
+# Move days that fell out of the daily window into the weekly/monthly archive
+def archive_old_history():
+    old_days = take_old_history(xp_state["xp_history"], get_history_cutoff())
+    if old_days:
+        _store.archive_days(old_days)
+    return old_days
+
+# Fold days past the history cutoff into the archive and the journal into a
+# snapshot (housekeeping that can wait until after startup)
+def compact_history():
+    if archive_old_history():
+        _store.mark_dirty()
+    flush_state(compact=True)
+
+# Replace the archive with the given days (after a reset or rebuild)
+def replace_history_archive(days):
+    _store.replace_archive(days)
+
+# Compact pending changes and wait for them to land (profile close / shutdown)
+def flush_state_now(*args):
+    flush_state(wait=True, compact=True)
+
+# Id of this machine in the mergeable state (see crdt.py)
+_device_id = None
+
+def get_device_id():
+    global _device_id
+    if _device_id is None:
+        _device_id = load_device_id(os.path.join(addon_dir, "user_files", "device_id"))
+    return _device_id
+
+# Use a fixed device id instead of this machine's (tools and benchmarks)
+def set_device_id(device):
+    global _device_id
+    _device_id = device
+
+# Count this device's changes since the last flush in xp_state["sync"], the
+# mergeable copy of the state that other devices can merge
+def observe_sync():
+    if "sync" not in xp_state:
+        xp_state["sync"] = empty_sync_state(get_device_id())
+    skill_costs = {skill_id: skill["cost"] for skill_id, skill in skill_tree.skills.items()}
+    rewards = {ach_id: get_reward_xp(ach_id) for ach_id in ACHIEVEMENTS}
+    observe_state(xp_state["sync"], xp_state, get_device_id(), get_history_cutoff(), skill_costs, rewards)
+
+# Write the mergeable state for other devices: all of it, or only what's
+# ahead of known (another device's export, for a small delta)
+def export_sync_file(path, known_path=None):
+    ensure_state()
+    observe_sync()
+    known = None
+    if known_path:
+        with open(known_path, "r") as f:
+            known = json.load(f)
+    write_atomic(path, json.dumps(get_sync_delta(xp_state["sync"], known)))
+
+# Merge another device's export (full or delta) into the state
+def merge_sync_file(path):
+    with open(path, "r") as f:
+        other = json.load(f)
+    ensure_state()
+    observe_sync()
+    merge_sync_state(xp_state["sync"], other)
+    apply_sync_state(xp_state["sync"], xp_state, get_history_cutoff())
+    settle_skill_points(xp_state, get_spent_skill_points(xp_state["sync"]))
+    update_skill_effects()
+    achievement_index.rebuild(xp_state)
+    rebuild_stats()
+    save_state()
+
+# History for the stats view (best day, recent average, streaks, monthly XP)
+def get_history(runs_kept=5):
+    return _store.get_history(xp_state, runs_kept)
+
+# Start the stats aggregates over from the whole stored history, with the
+# bests and runs from the store's history summary
+def rebuild_stats():
+    history = get_history(RUNS_KEPT) if xp_state["date"] else None
+    days, archive = _store.get_stats_history(xp_state)
+    xp_state["stats"] = build_stats(days, archive, xp_state, history)
+
+# Bring the stats aggregates up to date, building them the first time
+def update_stats():
+    stats = xp_state.get("stats")
+    if not stats or stats.get("version") != STATS_VERSION:
+        rebuild_stats()
+    else:
+        observe_stats(stats, xp_state)
+
+# What the stats dashboard shows (see summarize_stats)
+def get_stats():
+    ensure_state()
+    update_stats()
+    return summarize_stats(xp_state["stats"])
+
+# The per-deck and per-note-type breakdown, started empty the first time
+# (answers from before then aren't attributed)
+def get_breakdown_state():
+    breakdown = xp_state.get("breakdown")
+    if not breakdown or breakdown.get("version") != BREAKDOWN_VERSION:
+        breakdown = xp_state["breakdown"] = empty_breakdown()
+    return breakdown
+
+# What the breakdown view shows (see summarize_breakdown)
+def get_breakdown():
+    ensure_state()
+    return summarize_breakdown(get_breakdown_state(), xp_state["date"])
+
+leaderboard_client = None
+
+# Leaderboard user id for this device and profile (the profile name itself
+# isn't sent)
+def get_leaderboard_user():
+    profile = hashlib.sha1((current_profile or "").encode()).hexdigest()[:8]
+    return f"{get_device_id()}-{profile}"
+
+# Start uploading XP to the leaderboard server at url as name, in cohort;
+# any running client is stopped first
+def start_leaderboard(url, cohort, name=""):
+    global leaderboard_client
+    stop_leaderboard()
+    leaderboard_client = LeaderboardClient(url, cohort, get_leaderboard_user(), name, get_leaderboard_path())
+    leaderboard_client.start()
+
+# Stop uploading, sending what's queued if the server answers quickly
+def stop_leaderboard():
+    global leaderboard_client
+    if leaderboard_client is not None:
+        leaderboard_client.stop()
+        leaderboard_client = None
+
+# Cached leaderboard entries and the future of a refresh, if one was started
+# (see LeaderboardClient.get_leaderboard)
+def get_leaderboard():
+    if leaderboard_client is None:
+        return None, None
+    return leaderboard_client.get_leaderboard()
+
+# Upload counters of the running client (see LeaderboardClient.get_status),
+# or None if no leaderboard is configured
+def get_leaderboard_status():
+    if leaderboard_client is None:
+        return None
+    return leaderboard_client.get_status()
+
+achievement_index = AchievementIndex(ACHIEVEMENTS)
+tooltip_templates = TooltipTemplates(ACHIEVEMENTS)
+
+# Recompile the achievement index and tooltips after ACHIEVEMENTS changed
+# (custom achievements)
+def reload_achievements():
+    global achievement_index, tooltip_templates
+    achievement_index = AchievementIndex(ACHIEVEMENTS)
+    achievement_index.rebuild(xp_state)
+    tooltip_templates = TooltipTemplates(ACHIEVEMENTS)
+
+skill_tree = SkillTree(SKILL_TREE)
+skill_effects = skill_tree.get_effects({})
+
+# Recompute the skill effects answers use; call after xp_state["skills"] changed
+def update_skill_effects():
+    global skill_effects
+    skill_effects = skill_tree.get_effects(xp_state.get("skills", {}))
+
+# Recompile the skill tree after SKILL_TREE changed (custom skills)
+def reload_skills():
+    global skill_tree
+    skill_tree = SkillTree(SKILL_TREE)
+    update_skill_effects()
+
+# Skills the user can spend skill points on now
+def get_available_skills():
+    ensure_state()
+    return skill_tree.get_available(xp_state)
+
+# Spend skill points on one more level of skill_id, returning the ids of the
+# achievements that earned. Raises ValueError if the skill can't be unlocked.
+def unlock_skill(skill_id):
+    ensure_state()
+    unlock_skill_level(xp_state, skill_id, skill_tree)
+    update_skill_effects()
+    achievement_ids = earn_achievements(("skills",))
+    update_level(xp_state)
+    save_state()
+    return achievement_ids
+
+# Mark newly met achievements as earned and award their XP, returning their ids
+@timed("check_achievements")
+def earn_achievements(changed=None):
+    if not achievement_index.pending:
+        return []
+    return award_achievements(xp_state, achievement_index, xp_state["date"], changed)
+
+# Check if any achievements have been earned
+def check_achievements(changed=None):
+    return [ACHIEVEMENTS[ach_id] for ach_id in earn_achievements(changed)]
+
+# Load state
+@timed("load_state")
+def load_state():
+    global _state_day
+    try:
+        replace_state(_store.load(default_state()))
+        achievement_index.rebuild(xp_state)
+        update_stats()
+
+        start_day()
+
+    except Exception as e:
+        # Reset to defaults if there's any problem, keeping the unreadable file
+        print(f"Error loading state: {str(e)}")
+        _store.quarantine()
+        replace_state(new_user_state())
+        _state_day = xp_state["date"]
+        achievement_index.rebuild(xp_state)
+        update_stats()
+        save_state()
+
+# Fresh state for a new user starting today
+def new_user_state():
+    state = default_state(get_today())
+    state["study_streak"] = 1
+    state["last_study_date"] = _today
+    return state
+
+# Bring xp_state up to today: study streak, daily rollover, level and achievements
+def start_day():
+    global _state_day
+    today = get_today()
+    yesterday = _yesterday
+    _state_day = today
+
+    # Only a later day rolls over: if the clock went back (or the state came
+    # from a device ahead of this one), the state's day is kept until today
+    # catches up with it
+    bonus_xp = None
+    if today > xp_state["date"]:
+        # Count the previous day's last answers as that day's before rolling over
+        observe_sync()
+        update_study_streak(xp_state, today, yesterday)
+        bonus_xp = roll_over_day(xp_state, today, skill_effects)
+    if bonus_xp is not None:
+        if bonus_xp > 0:
+            notify(tooltip_templates.render_daily_bonus(bonus_xp), TOOLTIP_PERIOD_BONUS)
+        # Archive before the snapshot, so a crash in between can't lose days
+        archive_old_history()
+        save_state()
+
+    # Ensure level is updated based on total XP
+    update_level(xp_state)
+    update_stats()
+
+    # Check achievements
+    new_achievement_ids = earn_achievements()
+    if new_achievement_ids:
+        save_state()
+    for ach_id in new_achievement_ids:
+        notify(tooltip_templates.render_achievement(ach_id), TOOLTIP_PERIOD_LONG)
+
+# Make sure the in-memory state is current: load it if it hasn't been loaded
+# or changed on disk, and roll it over if a new study day has started. Usually
+# that's one time comparison and the store's stamp check; the rollover timer
+# normally gets to a new day first.
+def ensure_state():
+    if time.time() >= _day_end:
+        update_study_day()
+    if not _state_day or not _store.is_current():
+        load_state()
+    elif _state_day != _today:
+        start_day()
+
+# Start over from a fresh state. The mergeable state is kept, so the reset
+# reaches other devices as this device taking the XP back off.
+def clear_state():
+    observe_sync()
+    sync = xp_state["sync"]
+    state = new_user_state()
+    state["sync"] = sync
+    replace_state(state)
+    achievement_index.rebuild(xp_state)
+    replace_history_archive({})
+    xp_state["stats"] = build_stats({}, {}, xp_state)
+    save_state()
+
+# Replace the state with a replay of (revlog id, ease) rows, keeping skills.
+# The breakdown is kept too (the replay doesn't know decks).
+def rebuild_state(rows):
+    observe_sync()
+    state = replay_answers(rows, skills=xp_state["skills"], rollover_hour=DAY_ROLLOVER_HOUR)
+    state["sync"] = xp_state["sync"]
+    if "breakdown" in xp_state:
+        state["breakdown"] = xp_state["breakdown"]
+    replace_state(state)
+    achievement_index.rebuild(xp_state)
+    xp_state["stats"] = build_stats(xp_state["xp_history"], {}, xp_state)
+    replace_history_archive(take_old_history(xp_state["xp_history"], get_history_cutoff()))
+    start_day()
+    save_state()
+
+# Result of one answer, handed to every answer consumer
+class AnswerEvent:
+    def __init__(self, ease, earned_xp, multiplier, level_up, new_level, deck_id=None, note_type_id=None):
+        self.ease = ease
+        self.deck_id = deck_id  # Card's deck and note type, if known
+        self.note_type_id = note_type_id
+        self.earned_xp = earned_xp
+        self.multiplier = multiplier
+        self.level_up = level_up
+        self.new_level = new_level
+        self.achievement_ids = []  # Filled in by the achievements consumer
+        self.new_achievements = []
+
+# Answer pipeline consumers, run in registration order. Immediate ones run
+# inside the answer; deferred ones run once the reviewer has moved on to the
+# next card. A consumer with should_run is skipped while it returns False, and
+# a latest_only consumer only sees the newest of a burst of answers.
+class AnswerConsumer:
+    def __init__(self, name, consume, deferred=False, should_run=None, latest_only=False):
+        self.name = name
+        self.consume = consume
+        self.deferred = deferred
+        self.should_run = should_run
+        self.latest_only = latest_only
+
+_answer_consumers = []
+_deferred_events = []  # Events waiting for the deferred consumers
+
+# Add a consumer to the answer pipeline
+def register_answer_consumer(name, consume, deferred=False, should_run=None, latest_only=False):
+    _answer_consumers.append(AnswerConsumer(name, consume, deferred, should_run, latest_only))
+
+# Run a consumer, keeping one failing consumer from stopping the others
+def run_answer_consumer(consumer, event):
+    try:
+        if consumer.should_run is None or consumer.should_run():
+            consumer.consume(event)
+    except Exception as e:
+        print(f"Error in answer consumer {consumer.name}: {str(e)}")
+
+# Apply an answer and run the immediate consumers, keeping what it changed
+# for undo_answer
+@timed("calculate_xp")
+def answer_card(ease, card_id=None, answered_at=0, deck_id=None, note_type_id=None):
+    delta = AnswerDelta(xp_state, ease, card_id, answered_at, deck_id, note_type_id)
+    earned_xp, level_up, new_level = apply_answer(xp_state, ease, effects=skill_effects)
+    event = AnswerEvent(ease, earned_xp, xp_state["multiplier"], level_up, new_level, deck_id, note_type_id)
+    for consumer in _answer_consumers:
+        if not consumer.deferred:
+            run_answer_consumer(consumer, event)
+    delta.finish(xp_state, earned_xp, event.achievement_ids)
+    _undo_deltas.append(delta)
+    return event
+
+# Run the deferred consumers on the events answered since they last ran
+def run_deferred_consumers():
+    events = _deferred_events[:]
+    _deferred_events.clear()
+    if not events:
+        return
+    for consumer in _answer_consumers:
+        if not consumer.deferred:
+            continue
+        for event in (events[-1:] if consumer.latest_only else events):
+            run_answer_consumer(consumer, event)
+
+# Answer handling up to the deferred consumers: make sure the state is
+# current, apply the answer and queue it. Returns True when the caller should
+# schedule run_deferred_consumers (the first answer since they last ran).
+# card_id and answered_at (epoch ms) identify the review, for undo; its XP is
+# attributed to deck_id and note_type_id.
+def queue_answer(ease, card_id=None, answered_at=0, deck_id=None, note_type_id=None):
+    if not isinstance(ease, int) or ease < 1 or ease > 4:
+        return False
+    ensure_state()
+    _deferred_events.append(answer_card(ease, card_id, answered_at, deck_id, note_type_id))
+    return len(_deferred_events) == 1
+
+# The latest answer that can be taken back (an AnswerDelta), or None
+def get_last_answer():
+    return _undo_deltas[-1] if _undo_deltas else None
+
+# Take back the latest answer (Anki undid its review): its XP, multiplier,
+# streak, level, skill points and achievements, in constant time. Returns
+# its delta, or None if there's none to take back (none since the last
+# change that wasn't an answer, or the day rolled over since).
+@timed("undo_answer")
+def undo_answer():
+    ensure_state()
+    if not _undo_deltas:
+        return None
+    delta = _undo_deltas.pop()
+    revert_answer(xp_state, delta)
+    achievement_index.restore(delta.achievement_ids)
+    if delta.achievement_ids and "sync" in xp_state:
+        forget_achievements(xp_state["sync"], get_device_id(), delta.achievement_ids)
+    update_stats()
+    if delta.deck_id is not None or delta.note_type_id is not None:
+        attribute_answer(get_breakdown_state(), delta.day, delta.deck_id, delta.note_type_id, -delta.xp, -1)
+    if leaderboard_client is not None:
+        leaderboard_client.record(delta.day, -(delta.xp + delta.reward_xp))
+    journal_undo(delta)
+    return delta
+
+# XP calculation
+def calculate_xp(ease, deck_id=None, note_type_id=None):
+    event = answer_card(ease, deck_id=deck_id, note_type_id=note_type_id)
+    return event.earned_xp, event.multiplier, event.level_up, event.new_level, event.new_achievements
+
+# Achievements consumer: check the achievements whose inputs the answer changed
+def consume_achievements(event):
+    event.achievement_ids = earn_achievements(answer_changed_fields(event.level_up))
+    event.new_achievements = [ACHIEVEMENTS[ach_id] for ach_id in event.achievement_ids]
+
+# Stats consumer: count the answer in the dashboard aggregates
+def consume_stats(event):
+    observe_stats(xp_state["stats"], xp_state)
+
+# Breakdown consumer: count the answer's XP for its deck and note type
+def consume_breakdown(event):
+    if event.deck_id is not None or event.note_type_id is not None:
+        attribute_answer(get_breakdown_state(), xp_state["date"], event.deck_id, event.note_type_id, event.earned_xp)
+
+# Leaderboard consumer: queue the XP for upload
+def is_leaderboard_running():
+    return leaderboard_client is not None
+
+def consume_leaderboard(event):
+    reward_xp = sum(get_reward_xp(ach_id) for ach_id in event.achievement_ids)
+    leaderboard_client.record(xp_state["date"], event.earned_xp + reward_xp)
+
+# Persistence consumer: record the answer
+def consume_persistence(event):
+    journal_answer(event.ease, event.earned_xp, event.achievement_ids)
+
+# Tooltip text for an answer, with how long to show it (ms)
+def get_answer_message(event):
+    return tooltip_templates.render_answer(event)
+
+register_answer_consumer("achievements", consume_achievements)
+register_answer_consumer("stats", consume_stats)
+register_answer_consumer("breakdown", consume_breakdown)
+register_answer_consumer("leaderboard", consume_leaderboard, should_run=is_leaderboard_running)
+register_answer_consumer("persistence", consume_persistence)
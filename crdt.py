@@ -0,0 +1,207 @@
+import os
+import uuid
+
+# Mergeable (CRDT-style) form of the XP state, so devices can exchange their
+# state and merge it without double counting. Kept in xp_state["sync"]:
+#
+#   "device": id of the device that last wrote it (informational)
+#   "total_xp": {device: [gained, lost]}  PN counter; XP can go down
+#   "days": {"YYYY-MM-DD": {device: [gained, lost]}}  PN counter per day
+#   "high_score": int  max register
+#   "achievements": {achievement_id: "YYYY-MM-DD"}  union (earliest date)
+#   "skills": {skill_id: level}  max register per skill
+#   "spent": {skill_id: points}  max register per skill: skill points spent on
+#            it, so merged skills are paid for once
+#   "rewarded": {achievement_id: {device: reward_xp}}  union: devices whose
+#               total_xp counter includes the achievement's reward, so a
+#               reward earned on two devices is only counted once
+#   "seen": [total_xp, day, daily_xp]  local only: state values the counters
+#           already include, so observe_state only counts what's new
+#
+# Each device only ever increases its own counters, and merging takes the
+# element-wise max, so merging is idempotent and order doesn't matter.
+
+SYNC_VERSION = 1
+
+def new_device_id():
+    return uuid.uuid4().hex[:12]
+
+# Device id for this machine, created on first use. It lives outside the
+# profile data, so copying a profile's state to another machine doesn't copy
+# the id along with it.
+def load_device_id(path):
+    try:
+        with open(path, "r") as f:
+            device = f.read().strip()
+        if device:
+            return device
+    except OSError:
+        pass
+    device = new_device_id()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(device)
+    return device
+
+def empty_sync_state(device):
+    return {
+        "version": SYNC_VERSION,
+        "device": device,
+        "total_xp": {},
+        "days": {},
+        "high_score": 0,
+        "achievements": {},
+        "skills": {},
+        "spent": {},
+        "rewarded": {},
+        "seen": [0, "", 0]
+    }
+
+# Value of a PN counter ({device: [gained, lost]})
+def counter_value(counter):
+    return sum(gained - lost for gained, lost in counter.values())
+
+# Count amount (positive or negative) for device
+def add_to_counter(counter, device, amount):
+    entry = counter.get(device)
+    if entry is None:
+        entry = counter[device] = [0, 0]
+    if amount > 0:
+        entry[0] += amount
+    elif amount < 0:
+        entry[1] -= amount
+
+# Merge PN counter other into counter (element-wise max)
+def merge_counter(counter, other):
+    for device, (gained, lost) in other.items():
+        entry = counter.get(device)
+        if entry is None:
+            counter[device] = [gained, lost]
+        else:
+            if gained > entry[0]:
+                entry[0] = gained
+            if lost > entry[1]:
+                entry[1] = lost
+
+# Count what changed in state since the last observation as device's own.
+# Days before first_day are dropped from the per-day counters (older days are
+# settled and only kept in the archive). skill_costs ({skill_id: points per
+# level}) and rewards ({achievement_id: reward_xp}) price the skills and
+# achievements state has.
+def observe_state(sync, state, device, first_day, skill_costs=None, rewards=None):
+    sync["device"] = device
+    seen_total, seen_day, seen_daily = sync["seen"]
+    day = state["date"]
+    if day != seen_day:
+        seen_daily = 0
+        for old_day in [old_day for old_day in sync["days"] if old_day < first_day]:
+            del sync["days"][old_day]
+
+    if state["total_xp"] != seen_total:
+        add_to_counter(sync["total_xp"], device, state["total_xp"] - seen_total)
+    if day and state["daily_xp"] != seen_daily:
+        add_to_counter(sync["days"].setdefault(day, {}), device, state["daily_xp"] - seen_daily)
+    sync["seen"] = [state["total_xp"], day, state["daily_xp"]]
+
+    if state["high_score"] > sync["high_score"]:
+        sync["high_score"] = state["high_score"]
+    if len(state["achievements"]) != len(sync["achievements"]):
+        rewarded = sync.setdefault("rewarded", {})
+        for ach_id, achievement in state["achievements"].items():
+            if ach_id not in sync["achievements"]:
+                sync["achievements"][ach_id] = achievement.get("date", "")
+                rewarded.setdefault(ach_id, {})[device] = (rewards or {}).get(ach_id, 0)
+    spent = sync.setdefault("spent", {})
+    for skill_id, level in state["skills"].items():
+        if level > sync["skills"].get(skill_id, 0):
+            sync["skills"][skill_id] = level
+        if skill_costs is not None and level * skill_costs.get(skill_id, 0) > spent.get(skill_id, 0):
+            spent[skill_id] = level * skill_costs.get(skill_id, 0)
+
+# Merge another device's sync state (or a delta of it) into sync, in time
+# linear in the size of both
+def merge_sync_state(sync, other):
+    merge_counter(sync["total_xp"], other.get("total_xp", {}))
+    for day, counter in other.get("days", {}).items():
+        merge_counter(sync["days"].setdefault(day, {}), counter)
+    sync["high_score"] = max(sync["high_score"], other.get("high_score", 0))
+    for ach_id, date in other.get("achievements", {}).items():
+        if ach_id not in sync["achievements"] or date < sync["achievements"][ach_id]:
+            sync["achievements"][ach_id] = date
+    for skill_id, level in other.get("skills", {}).items():
+        if level > sync["skills"].get(skill_id, 0):
+            sync["skills"][skill_id] = level
+    spent = sync.setdefault("spent", {})
+    for skill_id, points in other.get("spent", {}).items():
+        if points > spent.get(skill_id, 0):
+            spent[skill_id] = points
+    rewarded = sync.setdefault("rewarded", {})
+    for ach_id, devices in other.get("rewarded", {}).items():
+        rewarded.setdefault(ach_id, {}).update(devices)
+    return sync
+
+# Take back achievements device earned (an undone answer): its counter no
+# longer includes their rewards, and one no device has left is dropped
+def forget_achievements(sync, device, achievement_ids):
+    rewarded = sync.setdefault("rewarded", {})
+    for ach_id in achievement_ids:
+        devices = rewarded.get(ach_id, {})
+        devices.pop(device, None)
+        if not devices:
+            rewarded.pop(ach_id, None)
+            sync["achievements"].pop(ach_id, None)
+
+# XP the total_xp counters count more than once: rewards of achievements
+# earned on more than one device (all but the biggest of each)
+def get_duplicate_rewards(sync):
+    return sum(sum(devices.values()) - max(devices.values())
+               for devices in sync.get("rewarded", {}).values() if len(devices) > 1)
+
+# Skill points the merged skills cost
+def get_spent_skill_points(sync):
+    return sum(sync.get("spent", {}).values())
+
+# Bring state in line with the merged counters and registers
+def apply_sync_state(sync, state, first_day):
+    today = state["date"]
+    state["total_xp"] = int(counter_value(sync["total_xp"]) - get_duplicate_rewards(sync))
+    state["daily_xp"] = int(counter_value(sync["days"].get(today, {})))
+    for day, counter in sync["days"].items():
+        if first_day <= day < today:
+            day_xp = int(counter_value(counter))
+            if day_xp > 0:
+                state["xp_history"][day] = day_xp
+            else:
+                state["xp_history"].pop(day, None)
+    state["high_score"] = max(state["high_score"], sync["high_score"])
+    for ach_id, date in sync["achievements"].items():
+        if ach_id not in state["achievements"]:
+            state["achievements"][ach_id] = {"earned": True, "date": date}
+    for skill_id, level in sync["skills"].items():
+        if level > state["skills"].get(skill_id, 0):
+            state["skills"][skill_id] = level
+    sync["seen"] = [state["total_xp"], today, state["daily_xp"]]
+
+# What to send another device: everything, or only the parts that are ahead
+# of known (what that device is known to have, e.g. its last export)
+def get_sync_delta(sync, known=None):
+    delta = {key: value for key, value in sync.items() if key != "seen"}
+    if known is None:
+        return delta
+
+    def counter_delta(counter, known_counter):
+        return {device: entry for device, entry in counter.items()
+                if device not in known_counter or entry[0] > known_counter[device][0] or entry[1] > known_counter[device][1]}
+
+    delta["total_xp"] = counter_delta(sync["total_xp"], known.get("total_xp", {}))
+    known_days = known.get("days", {})
+    delta["days"] = {}
+    for day, counter in sync["days"].items():
+        changed = counter_delta(counter, known_days.get(day, {}))
+        if changed:
+            delta["days"][day] = changed
+    known_achievements = known.get("achievements", {})
+    delta["achievements"] = {ach_id: date for ach_id, date in sync["achievements"].items() if ach_id not in known_achievements}
+    known_skills = known.get("skills", {})
+    delta["skills"] = {skill_id: level for skill_id, level in sync["skills"].items() if level > known_skills.get(skill_id, 0)}
+    return delta
@@ -0,0 +1,164 @@
+from aqt import mw
+from aqt.qt import *
+
+from .core import calculate_level, get_stats, xp_state
+from .timing import timed
+
+# Stats dashboard: totals, bests and charts for XP per day, week and month,
+# study runs and level progression. Everything comes from the aggregates
+# summarize_stats returns, so opening it costs the same with years of history.
+
+CHART_WIDTH = 560
+CHART_HEIGHT = 140
+CHART_COLOR = "#3e8f3e"
+CHART_NEGATIVE_COLOR = "#AA0000"
+
+# Rendered charts, kept while the series they show stay the same. Each
+# drawing gets a new URL, so the browser never shows an older one it cached.
+_chart_cache = {}  # Format: {chart name: (series, url, QPixmap)}
+_charts_drawn = 0
+_dashboard = None
+
+# Draw a bar chart of series ([(label, value)]) with the first and last label
+# underneath
+def draw_bar_chart(series, color=CHART_COLOR):
+    pixmap = QPixmap(CHART_WIDTH, CHART_HEIGHT)
+    pixmap.fill(QColor("#ffffff"))
+    painter = QPainter(pixmap)
+    label_height = 16
+    plot_height = CHART_HEIGHT - label_height
+    values = [value for label, value in series]
+    top = max(max(values, default=0), 0)
+    bottom = min(min(values, default=0), 0)
+    scale = (plot_height - 4) / ((top - bottom) or 1)
+    zero_y = 2 + top * scale
+    bar_width = CHART_WIDTH / max(len(series), 1)
+    for index, value in enumerate(values):
+        if not value:
+            continue
+        height = abs(value) * scale
+        y = zero_y - height if value > 0 else zero_y
+        painter.fillRect(QRectF(index * bar_width + 1, y, max(bar_width - 2, 1), max(height, 1)),
+                         QColor(color if value > 0 else CHART_NEGATIVE_COLOR))
+    painter.setPen(QColor("#888888"))
+    painter.drawLine(QPointF(0, zero_y), QPointF(CHART_WIDTH, zero_y))
+    if series:
+        painter.drawText(QRectF(0, plot_height, CHART_WIDTH / 2, label_height),
+                         Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, str(series[0][0]))
+        painter.drawText(QRectF(CHART_WIDTH / 2, plot_height, CHART_WIDTH / 2, label_height),
+                         Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter, str(series[-1][0]))
+    painter.end()
+    return pixmap
+
+# Chart name's (url, pixmap) for series, drawn only when the series changed
+def get_chart(name, series, color=CHART_COLOR):
+    global _charts_drawn
+    series = tuple(series)
+    cached = _chart_cache.get(name)
+    if cached is not None and cached[0] == series:
+        return cached[1:]
+    _charts_drawn += 1
+    url = f"xpchart://{name}/{_charts_drawn}"
+    pixmap = draw_bar_chart(series, color)
+    _chart_cache[name] = (series, url, pixmap)
+    return url, pixmap
+
+def format_best(best, unit=""):
+    return f"{best[1]}{unit} ({best[0]})" if best[0] else "-"
+
+# Dashboard HTML plus the charts it refers to ({url: QPixmap})
+def build_dashboard(summary):
+    level, progress, xp_needed = calculate_level(xp_state["total_xp"])
+    charts = {
+        "daily": get_chart("daily", summary["daily"]),
+        "weekly": get_chart("weekly", summary["weekly"]),
+        "monthly": get_chart("monthly", summary["monthly"]),
+        "runs": get_chart("runs", [(run[1], run[2]) for run in reversed(summary["runs"])], "#1f77b4"),
+        "levels": get_chart("levels", summary["levels"], "#FFD700")
+    }
+    run = summary["runs"][0] if summary["runs"] else None
+    run_rows = "".join(f"<tr><td>{start} to {end}:</td><td><b>{length} days</b></td></tr>"
+                       for start, end, length in summary["runs"][:5])
+    html = f"""
+    <h2>Anki XP Stats</h2>
+    <table cellspacing="4">
+        <tr><td>Level:</td><td><b>{level}</b> ({progress}%, {xp_needed} XP to level {level + 1})</td></tr>
+        <tr><td>Total XP:</td><td><b>{xp_state['total_xp']}</b></td></tr>
+        <tr><td>Today:</td><td><b>{summary['today']} XP</b></td></tr>
+        <tr><td>Last 7 Days:</td><td><b>{summary['sum_7']} XP</b> ({summary['average_7']:.0f} XP/day)</td></tr>
+        <tr><td>Last 30 Days:</td><td><b>{summary['sum_30']} XP</b> ({summary['average_30']:.0f} XP/day)</td></tr>
+        <tr><td>Current Streak:</td><td><b>{xp_state['streak']} cards</b></td></tr>
+        <tr><td>Current Multiplier:</td><td><b>x{xp_state['multiplier']:.1f}</b></td></tr>
+        <tr><td>High Score:</td><td><b>{xp_state['high_score']}</b></td></tr>
+        <tr><td>Skill Points Available:</td><td><b>{xp_state['skill_points']}</b></td></tr>
+    </table>
+
+    <h3>Personal Bests</h3>
+    <table cellspacing="4">
+        <tr><td>Best Day:</td><td><b>{format_best(summary['best_day'], ' XP')}</b></td></tr>
+        <tr><td>Best Week:</td><td><b>{format_best(summary['best_week'], ' XP')}</b></td></tr>
+        <tr><td>Best Month:</td><td><b>{format_best(summary['best_month'], ' XP')}</b></td></tr>
+        <tr><td>Longest Study Streak:</td><td><b>{summary['best_run'][2]} days</b></td></tr>
+        <tr><td>Longest Card Streak:</td><td><b>{summary['best_card_streak']} cards</b></td></tr>
+    </table>
+
+    <h3>XP per Day</h3>
+    <img src="{charts['daily'][0]}">
+    <h3>XP per Week</h3>
+    <img src="{charts['weekly'][0]}">
+    <h3>XP per Month</h3>
+    <img src="{charts['monthly'][0]}">
+
+    <h3>Study Streaks</h3>
+    <p>Current: <b>{run[2] if run else 0} days</b> (Study Streak: {xp_state['study_streak']} days)</p>
+    <img src="{charts['runs'][0]}">
+    <table cellspacing="4">
+        {run_rows or "<tr><td>No history yet</td></tr>"}
+    </table>
+
+    <h3>Level Progression</h3>
+    <img src="{charts['levels'][0]}">
+    """
+    return html, dict(charts.values())
+
+# Text browser that serves the chart images from memory
+class ChartBrowser(QTextBrowser):
+    def __init__(self, parent=None):
+        super(ChartBrowser, self).__init__(parent)
+        self.charts = {}  # Format: {url: QPixmap}
+
+    def loadResource(self, resource_type, url):
+        pixmap = self.charts.get(url.toString())
+        if pixmap is not None:
+            return pixmap
+        return super(ChartBrowser, self).loadResource(resource_type, url)
+
+class StatsDashboard(QDialog):
+    def __init__(self, parent=None):
+        super(StatsDashboard, self).__init__(parent)
+        self.setWindowTitle("Anki XP Stats")
+        self.resize(CHART_WIDTH + 80, 700)
+        self.footer_html = ""  # Shown below the stats
+        layout = QVBoxLayout(self)
+        self.browser = ChartBrowser()
+        layout.addWidget(self.browser)
+        close_button = QPushButton("Close")
+        close_button.clicked.connect(self.close)
+        layout.addWidget(close_button)
+
+    @timed("dashboard")
+    def refresh(self):
+        html, self.browser.charts = build_dashboard(get_stats())
+        self.browser.setHtml(html + self.footer_html)
+
+# Open the dashboard (or bring it to the front) with the current stats and
+# footer_html below them
+def show_dashboard(footer_html=""):
+    global _dashboard
+    if _dashboard is None:
+        _dashboard = StatsDashboard(mw)
+    _dashboard.footer_html = footer_html
+    _dashboard.refresh()
+    _dashboard.show()
+    _dashboard.raise_()
+    _dashboard.activateWindow()
@@ -0,0 +1,275 @@
+import json
+import time
+import uuid
+import random
+import asyncio
+import threading
+from collections import deque
+from urllib.parse import urlsplit, quote
+
+from .storage import write_atomic
+
+# Client for a cohort leaderboard server. XP events from the answer path go
+# into a bounded in-memory queue (appending never blocks and never touches the
+# network); an asyncio loop on a background thread uploads them in batches
+# over a small pool of keep-alive HTTP connections, retrying with exponential
+# backoff. Leaderboard snapshots are cached (in memory and on disk) for
+# LEADERBOARD_TTL seconds. http and https URLs are supported.
+#
+# Server API (see leaderboard_server.py for a local stand-in):
+#   POST /events  {"cohort", "user", "name", "batch", "events": [{"t", "d", "xp"}]}
+#                 batch is the same on every retry of an upload, so the server
+#                 can drop a batch it already stored (e.g. when the response
+#                 to the first attempt was lost)
+#   GET /leaderboard?cohort=...  {"cohort", "entries": [{"user", "name", "xp", "today"}]}
+
+QUEUE_SIZE = 10000  # Events kept while the server is unreachable; the oldest are dropped
+BATCH_SIZE = 200  # Events per upload
+BATCH_DELAY = 2.0  # Seconds to wait for a batch to fill before sending it
+POOL_SIZE = 2  # Keep-alive connections to the server
+REQUEST_TIMEOUT = 10.0
+RETRY_DELAY = 1.0  # First retry delay; doubled per failure up to RETRY_DELAY_MAX
+RETRY_DELAY_MAX = 60.0
+LEADERBOARD_TTL = 300.0
+STOP_TIMEOUT = 2.0  # Seconds stop() waits for the last upload
+
+class HttpError(Exception):
+    def __init__(self, status, body):
+        super(HttpError, self).__init__(f"HTTP {status}")
+        self.status = status
+        self.body = body
+
+# Minimal HTTP/1.1 client over a pool of keep-alive connections to one host
+# (over TLS if use_ssl is set)
+class ConnectionPool:
+    def __init__(self, host, port, use_ssl=False, size=POOL_SIZE, timeout=REQUEST_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.idle = []  # Format: [(reader, writer)]
+        self.slots = asyncio.Semaphore(size)
+        self.opened = 0  # Connections opened since startup
+
+    async def request(self, method, path, payload=None):
+        async with self.slots:
+            connection = self.idle.pop() if self.idle else None
+            try:
+                # A pooled connection may have been closed by the server
+                # while idle; that's retried once on a new connection
+                if connection is not None:
+                    try:
+                        return await self.send(connection, method, path, payload)
+                    except (ConnectionError, asyncio.IncompleteReadError):
+                        connection[1].close()
+                connection = await asyncio.wait_for(asyncio.open_connection(self.host, self.port, ssl=self.use_ssl or None),
+                                                    self.timeout)
+                self.opened += 1
+                return await self.send(connection, method, path, payload)
+            except BaseException:
+                if connection is not None and connection not in self.idle:
+                    connection[1].close()
+                raise
+
+    # Send one request on connection and read the response; the connection
+    # goes back to the pool unless the server is closing it
+    async def send(self, connection, method, path, payload):
+        reader, writer = connection
+        body = json.dumps(payload, separators=(",", ":")).encode() if payload is not None else b""
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nConnection: keep-alive\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n")
+        writer.write(head.encode() + body)
+        await asyncio.wait_for(writer.drain(), self.timeout)
+
+        status_line = await asyncio.wait_for(reader.readuntil(b"\r\n"), self.timeout)
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readuntil(b"\r\n"), self.timeout)
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        data = await asyncio.wait_for(reader.readexactly(int(headers.get("content-length", 0))), self.timeout)
+
+        if headers.get("connection", "").lower() == "close":
+            writer.close()
+        else:
+            self.idle.append(connection)
+        if not 200 <= status < 300:
+            raise HttpError(status, data)
+        return json.loads(data) if data else None
+
+    async def close(self):
+        idle, self.idle = self.idle, []
+        for reader, writer in idle:
+            writer.close()
+        for reader, writer in idle:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+class LeaderboardClient:
+    def __init__(self, url, cohort, user, name="", cache_path=None):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Leaderboard URL must be an http or https URL: {url}")
+        self.host = parts.hostname
+        self.use_ssl = parts.scheme == "https"
+        self.port = parts.port or (443 if self.use_ssl else 80)
+        self.base_path = parts.path.rstrip("/")
+        self.cohort = cohort
+        self.user = user
+        self.name = name or user
+        self.cache_path = cache_path
+        self.queue = deque(maxlen=QUEUE_SIZE)  # Events waiting for upload
+        self.dropped = 0  # Events pushed out of the full queue
+        self.uploaded = 0
+        self.batches = 0
+        self.failures = 0  # Failed upload attempts
+        self.last_error = None
+        self.cache = self.load_cache()  # Format: {"fetched": time, "cohort", "entries"}
+        self.loop = None
+        self.thread = None
+        self.wakeup = None  # Set when events arrive
+        self.wake_pending = False
+        self.stopping = False
+        self.stopped = None  # Set by stop(), to cut waits short
+        self.pool = None
+        self.refreshing = None
+
+    # Start the upload loop on its own thread
+    def start(self):
+        if self.thread is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self.run_loop, args=(ready,), name="xp-leaderboard", daemon=True)
+        self.thread.start()
+        ready.wait()
+
+    def run_loop(self, ready):
+        asyncio.set_event_loop(self.loop)
+        self.wakeup = asyncio.Event()
+        self.stopped = asyncio.Event()
+        self.pool = ConnectionPool(self.host, self.port, self.use_ssl)
+        ready.set()
+        try:
+            self.loop.run_until_complete(self.run())
+        finally:
+            self.loop.close()
+
+    async def run(self):
+        try:
+            await self.upload_loop()
+        finally:
+            await self.pool.close()
+
+    # Queue an XP event (called on the answer path: constant time, no I/O)
+    def record(self, day, xp):
+        if len(self.queue) == QUEUE_SIZE:
+            self.dropped += 1
+        self.queue.append({"t": int(time.time()), "d": day, "xp": xp})
+        if not self.wake_pending and self.loop is not None:
+            self.wake_pending = True
+            self.loop.call_soon_threadsafe(self.wake)
+
+    def wake(self):
+        self.wake_pending = False
+        self.wakeup.set()
+
+    def halt(self):
+        self.stopped.set()
+        self.wakeup.set()
+
+    # Upload what's queued (waiting for at most timeout seconds) and stop
+    def stop(self, timeout=STOP_TIMEOUT):
+        if self.thread is None:
+            return
+        self.stopping = True
+        self.loop.call_soon_threadsafe(self.halt)
+        self.thread.join(timeout)
+        self.thread = None
+
+    # Next batch of events and its id (kept for the batch's retries)
+    def take_batch(self):
+        return [self.queue.popleft() for _ in range(min(BATCH_SIZE, len(self.queue)))], uuid.uuid4().hex
+
+    async def upload_loop(self):
+        batch = []
+        batch_id = None
+        attempt = 0
+        while True:
+            if not batch:
+                if not self.queue:
+                    if self.stopping:
+                        return
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                    continue
+                # Give a small batch time to fill up
+                if len(self.queue) < BATCH_SIZE and not self.stopping:
+                    await self.sleep(BATCH_DELAY)
+                batch, batch_id = self.take_batch()
+            try:
+                await self.pool.request("POST", self.base_path + "/events", {
+                    "cohort": self.cohort, "user": self.user, "name": self.name, "batch": batch_id, "events": batch})
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, HttpError, ValueError) as e:
+                self.failures += 1
+                self.last_error = str(e)
+                if self.stopping:
+                    return
+                attempt += 1
+                delay = min(RETRY_DELAY_MAX, RETRY_DELAY * 2 ** (attempt - 1))
+                await self.sleep(delay * random.uniform(0.5, 1.0))
+                continue
+            self.uploaded += len(batch)
+            self.batches += 1
+            batch = []
+            attempt = 0
+
+    # Sleep that stop() cuts short
+    async def sleep(self, seconds):
+        try:
+            await asyncio.wait_for(self.stopped.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    def load_cache(self):
+        if self.cache_path:
+            try:
+                with open(self.cache_path, "r") as f:
+                    cache = json.load(f)
+                if cache.get("cohort") == self.cohort:
+                    return cache
+            except (OSError, ValueError):
+                pass
+        return {"fetched": 0, "cohort": self.cohort, "entries": None}
+
+    async def fetch_leaderboard(self):
+        try:
+            snapshot = await self.pool.request("GET", f"{self.base_path}/leaderboard?cohort={quote(self.cohort)}")
+            self.cache = {"fetched": time.time(), "cohort": self.cohort, "entries": snapshot["entries"]}
+            if self.cache_path:
+                write_atomic(self.cache_path, json.dumps(self.cache))
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, HttpError, ValueError, KeyError) as e:
+            self.last_error = str(e)
+        return self.cache
+
+    # The cached leaderboard entries (None before the first fetch). A stale
+    # cache starts a refresh in the background; its future is returned too,
+    # for callers that want to show the fresh snapshot once it arrives.
+    def get_leaderboard(self):
+        future = None
+        if time.time() - self.cache["fetched"] >= LEADERBOARD_TTL and self.thread is not None:
+            if self.refreshing is None or self.refreshing.done():
+                self.refreshing = asyncio.run_coroutine_threadsafe(self.fetch_leaderboard(), self.loop)
+            future = self.refreshing
+        return self.cache["entries"], future
+
+    # Upload counters, for the timings and benchmark views
+    def get_status(self):
+        return {"queued": len(self.queue), "uploaded": self.uploaded, "batches": self.batches,
+                "dropped": self.dropped, "failures": self.failures, "last_error": self.last_error,
+                "connections": self.pool.opened if self.pool else 0}
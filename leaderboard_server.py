@@ -0,0 +1,165 @@
+import json
+import random
+import asyncio
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs
+
+# Local stand-in for the leaderboard server (see leaderboard.py for the API),
+# for trying the client and benchmarking its batching offline. Totals are kept
+# in memory; a batch whose id was already stored (a retry) is acknowledged but
+# not counted again. fail_rate makes that share of requests answer 503, and delay
+# adds latency to every request, to exercise the client's retries.
+#
+#   python -m <add-on folder>.leaderboard_server --port 8765
+
+LEADERBOARD_SIZE = 50
+
+class LeaderboardServer:
+    def __init__(self, fail_rate=0.0, delay=0.0, seed=None):
+        self.fail_rate = fail_rate
+        self.delay = delay
+        self.random = random.Random(seed)
+        self.cohorts = {}  # Format: {cohort: {user: {"name", "xp", "days": {day: xp}, "batches": {batch id}}}}
+        self.requests = 0
+        self.events = 0
+        self.duplicates = 0  # Batches dropped as retries of stored ones
+        self.connections = 0
+        self.handlers = set()  # Tasks serving open connections
+        self.server = None
+        self.loop = None
+        self.thread = None
+
+    # Handle requests on one connection until the client closes it
+    async def handle_connection(self, reader, writer):
+        self.connections += 1
+        self.handlers.add(asyncio.current_task())
+        try:
+            while True:
+                try:
+                    request_line = await reader.readuntil(b"\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readuntil(b"\r\n")
+                    if line == b"\r\n":
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                self.requests += 1
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                if self.fail_rate and self.random.random() < self.fail_rate:
+                    status, payload = 503, {"error": "unavailable"}
+                else:
+                    status, payload = self.route(method, target, body)
+                data = json.dumps(payload).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write((f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n"
+                              f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.handlers.discard(asyncio.current_task())
+            writer.close()
+
+    def route(self, method, target, body):
+        url = urlsplit(target)
+        try:
+            if method == "POST" and url.path.endswith("/events"):
+                return 200, self.add_events(json.loads(body))
+            if method == "GET" and url.path.endswith("/leaderboard"):
+                return 200, self.get_leaderboard(parse_qs(url.query).get("cohort", [""])[0])
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {"error": str(e)}
+        return 404, {"error": "not found"}
+
+    def add_events(self, upload):
+        users = self.cohorts.setdefault(upload["cohort"], {})
+        user = users.setdefault(upload["user"], {"name": upload["user"], "xp": 0, "days": {}, "batches": set()})
+        user["name"] = upload.get("name") or upload["user"]
+        batch_id = upload.get("batch")
+        if batch_id is not None:
+            if batch_id in user["batches"]:
+                self.duplicates += 1
+                return {"accepted": 0, "duplicate": True}
+            user["batches"].add(batch_id)
+        for event in upload["events"]:
+            user["xp"] += event["xp"]
+            user["days"][event["d"]] = user["days"].get(event["d"], 0) + event["xp"]
+        self.events += len(upload["events"])
+        return {"accepted": len(upload["events"])}
+
+    def get_leaderboard(self, cohort):
+        users = self.cohorts.get(cohort, {})
+        latest_day = max((day for user in users.values() for day in user["days"]), default="")
+        entries = [{"user": user_id, "name": user["name"], "xp": user["xp"], "today": user["days"].get(latest_day, 0)}
+                   for user_id, user in users.items()]
+        entries.sort(key=lambda entry: entry["xp"], reverse=True)
+        return {"cohort": cohort, "entries": entries[:LEADERBOARD_SIZE]}
+
+    async def start_server(self, host, port):
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    # Serve on a background thread (for tests and benchmarks); returns the port
+    def start(self, host="127.0.0.1", port=0):
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+        result = {}
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            result["port"] = self.loop.run_until_complete(self.start_server(host, port))
+            started.set()
+            self.loop.run_forever()
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run, name="xp-leaderboard-server", daemon=True)
+        self.thread.start()
+        started.wait()
+        return result["port"]
+
+    def stop(self):
+        if self.thread is None:
+            return
+        async def shutdown():
+            self.server.close()
+            handlers = list(self.handlers)
+            for handler in handlers:
+                handler.cancel()
+            await asyncio.gather(*handlers, return_exceptions=True)
+            self.loop.stop()
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop)
+        self.thread.join()
+        self.thread = None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in leaderboard server for the XP add-on")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests to answer with 503")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds of latency added to each request")
+    args = parser.parse_args(argv)
+    server = LeaderboardServer(args.fail_rate, args.delay)
+
+    async def serve():
+        port = await server.start_server(args.host, args.port)
+        print(f"Leaderboard server on http://{args.host}:{port}")
+        await server.server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
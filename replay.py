@@ -0,0 +1,63 @@
+import random
+
+from .rules import (ACHIEVEMENTS, SKILL_TREE, AchievementIndex, answer_changed_fields, apply_answer,
+                    award_achievements, default_state, get_skill_effects, get_study_day, roll_over_day, update_level,
+                    update_study_streak)
+
+# Revlog rows are read in chunks of this many so memory stays bounded
+REPLAY_CHUNK_SIZE = 50000
+
+# Seed for chance-based skills, so the same history always replays the same way
+REPLAY_SEED = 0
+
+# Stream (id, ease) revlog rows in id order, one chunk at a time
+def iter_revlog(db, chunk_size=REPLAY_CHUNK_SIZE):
+    last_id = -1
+    while True:
+        rows = db.all("select id, ease from revlog where id > ? order by id limit ?", last_id, chunk_size)
+        for row in rows:
+            yield row
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1][0]
+
+# Get the day string and the start of the next day (revlog ms) for a revlog id
+def get_replay_day(revlog_id, rollover_hour=0):
+    day, yesterday, day_end = get_study_day(revlog_id / 1000, rollover_hour)
+    return day, yesterday, int(day_end * 1000)
+
+# Rebuild XP state by replaying (revlog_id, ease) rows, oldest first, through
+# the same rules as live answers. Each new day goes through the same rollover
+# as the first load of a day; days start at rollover_hour. skills are treated
+# as owned from the start and their cost is taken from the replayed skill
+# points.
+def replay_answers(rows, seed=REPLAY_SEED, skills=None, rollover_hour=0):
+    rng = random.Random(seed)
+    state = default_state()
+    state["skills"] = dict(skills or {})
+    effects = get_skill_effects(state)
+    index = AchievementIndex(ACHIEVEMENTS)
+    index.rebuild(state)
+    
+    day = ""
+    day_end = None
+    for revlog_id, ease in rows:
+        if ease < 1 or ease > 4:
+            continue
+        
+        # Roll over when the answer falls on a new day
+        if day_end is None or revlog_id >= day_end:
+            day, yesterday, day_end = get_replay_day(revlog_id, rollover_hour)
+            update_study_streak(state, day, yesterday)
+            roll_over_day(state, day, effects)
+            update_level(state)
+            award_achievements(state, index, day)
+        
+        earned_xp, level_up, new_level = apply_answer(state, ease, rng, effects)
+        if index.pending:
+            award_achievements(state, index, day, answer_changed_fields(level_up))
+    
+    # Pay for the skills the user already owns
+    spent = sum(SKILL_TREE[skill_id]["cost"] * level for skill_id, level in state["skills"].items() if skill_id in SKILL_TREE)
+    state["skill_points"] = max(0, state["skill_points"] - spent)
+    return state
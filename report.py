@@ -0,0 +1,221 @@
+import os
+import csv
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import zipfile
+import argparse
+import tempfile
+import pathlib
+from concurrent.futures import ProcessPoolExecutor
+
+from .rules import calculate_level
+from .replay import get_replay_day, iter_revlog, replay_answers
+
+# zstandard is only needed for collections exported by Anki 2.1.50+
+# (collection.anki21b inside the .colpkg/.apkg)
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Headless class reports: XP, level and achievements for every student in a
+# folder of exported collections or revlog dumps, replayed through the same
+# rules as live answers (see replay.py). Students are spread over a pool of
+# worker processes, and each worker reads a revlog in chunks, so its memory
+# doesn't grow with the size of a collection. Report rows are written as they
+# come in, in file name order.
+#
+#   python -m <add-on folder>.report students/ --output class.csv
+#
+# One file per student, named after the student:
+#   .colpkg, .apkg: exported collection
+#   .anki2, .anki21: collection file
+#   .csv: revlog dump with id and ease columns, e.g.
+#         sqlite3 -csv -header collection.anki2 "select * from revlog"
+#   .jsonl: revlog dump, one {"id": ..., "ease": ...} object per line
+# Days are counted in this machine's time zone.
+
+INPUT_SUFFIXES = (".colpkg", ".apkg", ".anki2", ".anki21", ".csv", ".jsonl")
+PACKAGE_COLLECTIONS = ("collection.anki21b", "collection.anki21", "collection.anki2")  # Newest format first
+
+REPORT_FIELDS = ("student", "file", "reviews", "days_studied", "first_day", "last_day", "total_xp", "level",
+                 "level_progress", "xp_to_next_level", "high_score", "study_streak", "skill_points",
+                 "achievement_count", "achievements", "error")
+
+# Anki's collection db.all() over a plain sqlite3 connection, for iter_revlog
+class RevlogDb:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def all(self, sql, *args):
+        return self.conn.execute(sql, args).fetchall()
+
+# Stream (id, ease) rows from a collection file, opened read-only
+def read_collection(path):
+    conn = sqlite3.connect(pathlib.Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        yield from iter_revlog(RevlogDb(conn))
+    finally:
+        conn.close()
+
+# Stream (id, ease) rows from the collection inside an exported package,
+# unpacked to a temporary file
+def read_package(path):
+    with zipfile.ZipFile(path) as package, tempfile.TemporaryDirectory(prefix="xp-report-") as temp_dir:
+        names = set(package.namelist())
+        if "collection.anki21b" in names and zstandard is None:
+            names.discard("collection.anki21b")
+            if "collection.anki21" not in names:
+                raise ValueError("needs the zstandard module to read this collection (pip install zstandard)")
+        name = next((name for name in PACKAGE_COLLECTIONS if name in names), None)
+        if name is None:
+            raise ValueError("no collection in this package")
+        collection_path = os.path.join(temp_dir, "collection.anki2")
+        with package.open(name) as member, open(collection_path, "wb") as f:
+            if name.endswith("b"):
+                member = zstandard.ZstdDecompressor().stream_reader(member)
+            shutil.copyfileobj(member, f)
+        yield from read_collection(collection_path)
+
+# Stream (id, ease) rows from a revlog dump, in file order
+def iter_dump(path):
+    with open(path, "r", newline="") as f:
+        if path.lower().endswith(".csv"):
+            reader = csv.reader(f)
+            header = next(reader, [])
+            if "id" not in header or "ease" not in header:
+                raise ValueError("no id and ease columns in this revlog dump")
+            id_column, ease_column = header.index("id"), header.index("ease")
+            for record in reader:
+                yield int(record[id_column]), int(record[ease_column])
+        else:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield int(record["id"]), int(record["ease"])
+
+# (id, ease) rows of a revlog dump in id order. Dumps are usually in that
+# order already and are streamed; otherwise they're read whole and sorted.
+def read_dump(path):
+    last_id = -1
+    for revlog_id, ease in iter_dump(path):
+        if revlog_id < last_id:
+            return iter(sorted(iter_dump(path)))
+        last_id = revlog_id
+    return iter_dump(path)
+
+def read_revlog(path):
+    name = path.lower()
+    if name.endswith((".colpkg", ".apkg")):
+        return read_package(path)
+    if name.endswith((".anki2", ".anki21")):
+        return read_collection(path)
+    return read_dump(path)
+
+# Report row for one student's file (runs in a worker process). A file that
+# can't be read gets a row with just the error.
+def report_student(path, rollover_hour=0):
+    row = {"student": os.path.splitext(os.path.basename(path))[0], "file": os.path.basename(path)}
+    counts = {"reviews": 0, "first_id": None}
+
+    # Only the answers the replay counts (manual reschedules have ease 0)
+    def count(rows):
+        for revlog_id, ease in rows:
+            if 1 <= ease <= 4:
+                if counts["first_id"] is None:
+                    counts["first_id"] = revlog_id
+                counts["reviews"] += 1
+            yield revlog_id, ease
+
+    try:
+        state = replay_answers(count(read_revlog(path)), rollover_hour=rollover_hour)
+    except Exception as e:
+        row["error"] = str(e) or type(e).__name__
+        return row
+    level, progress, xp_needed = calculate_level(state["total_xp"])
+    days = sum(1 for xp in state["xp_history"].values() if xp > 0) + (state["daily_xp"] > 0)
+    row.update({
+        "reviews": counts["reviews"],
+        "days_studied": days,
+        "first_day": get_replay_day(counts["first_id"], rollover_hour)[0] if counts["first_id"] is not None else "",
+        "last_day": state["date"],
+        "total_xp": state["total_xp"],
+        "level": state["level"],
+        "level_progress": progress,
+        "xp_to_next_level": xp_needed,
+        "high_score": state["high_score"],
+        "study_streak": state["study_streak"],
+        "skill_points": state["skill_points"],
+        "achievement_count": len(state["achievements"]),
+        "achievements": sorted(state["achievements"])
+    })
+    return row
+
+# Whether path is a CSV report written by this tool (e.g. from an earlier run)
+def is_report(path):
+    if not path.lower().endswith(".csv"):
+        return False
+    with open(path, "r", newline="") as f:
+        return tuple(next(csv.reader(f), [])) == REPORT_FIELDS
+
+# Student files in folder, in name order, leaving out the report being
+# written (output) and earlier reports
+def find_inputs(folder, output=None):
+    output = os.path.realpath(output) if output else None
+    paths = (os.path.join(folder, name) for name in os.listdir(folder) if name.lower().endswith(INPUT_SUFFIXES))
+    return sorted(path for path in paths
+                  if os.path.isfile(path) and os.path.realpath(path) != output and not is_report(path))
+
+# Write rows to path as they arrive, as CSV (achievements space-separated) or
+# a JSON array; returns (rows, rows with errors)
+def write_report(rows, path, report_format="csv"):
+    written = errors = 0
+    with open(path, "w", newline="") as f:
+        if report_format == "csv":
+            writer = csv.DictWriter(f, REPORT_FIELDS)
+            writer.writeheader()
+        else:
+            f.write("[")
+        for row in rows:
+            if report_format == "csv":
+                writer.writerow(dict(row, achievements=" ".join(row.get("achievements", []))))
+            else:
+                f.write(("," if written else "") + "\n  " + json.dumps(row))
+            written += 1
+            errors += "error" in row
+        if report_format != "csv":
+            f.write("\n]\n")
+    return written, errors
+
+# Report on every student file in folder, using workers processes (all cores
+# by default)
+def run_report(folder, output, report_format="csv", workers=None, rollover_hour=0):
+    paths = find_inputs(folder, output)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        rows = executor.map(report_student, paths, [rollover_hour] * len(paths))
+        return write_report(rows, output, report_format)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="XP, level and achievement report for a folder of exported "
+                                                 "Anki collections or revlog dumps, one per student")
+    parser.add_argument("folder", help="folder with one .colpkg/.apkg/.anki2/.anki21/.csv/.jsonl file per student")
+    parser.add_argument("--output", default="xp_report.csv", help="report file (default: xp_report.csv)")
+    parser.add_argument("--format", choices=("csv", "json"), help="report format (default: from the output name)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--rollover-hour", type=int, default=4, help="hour a new study day starts (default: 4, "
+                                                                     "Anki's default)")
+    args = parser.parse_args(argv)
+    report_format = args.format or ("json" if args.output.lower().endswith(".json") else "csv")
+
+    start = time.perf_counter()
+    written, errors = run_report(args.folder, args.output, report_format, args.workers, args.rollover_hour)
+    print(f"Wrote {written} students to {args.output} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    if errors:
+        print(f"{errors} files couldn't be read; see the error column", file=sys.stderr)
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,599 @@
+import random
+import bisect
+import datetime
+
+from .state import XPState
+from .timing import timed
+
+# XP rules shared by the live add-on and the headless tools (revlog replay,
+# simulator). Everything here works on a state (an XPState, or a dict with the
+# same fields) passed in by the caller.
+
+# Configuration
+BASE_XP_AGAIN = -5
+BASE_XP_HARD = -2
+BASE_XP_GOOD = 5
+BASE_XP_EASY = 10
+MULTIPLIER_INCREMENT = 0.2
+MULTIPLIER_DECAY = 0.5
+MAX_MULTIPLIER = 5.0
+
+# Level configuration
+BASE_XP_FOR_LEVEL = 100
+LEVEL_FACTOR = 1.5
+MAX_LEVEL = 100
+
+# Skill points configuration
+SKILL_POINTS_PER_LEVEL = 1
+
+# Effects a skill can have; each skill's levels add effect_per_level to one of
+# them:
+#   xp_boost: base XP of Good/Easy answers is multiplied by 1 + total
+#   multiplier_increment: added to the multiplier increment of Good/Easy
+#   multiplier_decay: taken off the multiplier decay of Hard answers
+#   streak_shield: chance that a Hard answer keeps the streak
+#   daily_bonus: XP awarded at the start of each day
+SKILL_EFFECTS = ("xp_boost", "multiplier_increment", "multiplier_decay", "streak_shield", "daily_bonus")
+
+# Define skill tree. New skills only need an entry here: "effect" is one of
+# SKILL_EFFECTS and "prerequisite" is None or "skill_id:level" (several
+# separated by commas).
+SKILL_TREE = {
+    "xp_boost": {
+        "name": "XP Boost",
+        "description": "Increases base XP earned by 10% per level",
+        "max_level": 5,
+        "effect": "xp_boost",
+        "effect_per_level": 0.1,  # 10% boost per level
+        "cost": 1,  # Skill points cost per level
+        "prerequisite": None,
+        "icon": "⬆️"
+    },
+    "multiplier_boost": {
+        "name": "Multiplier Boost",
+        "description": "Increases the multiplier increment by 0.05 per level",
+        "max_level": 3,
+        "effect": "multiplier_increment",
+        "effect_per_level": 0.05,
+        "cost": 1,
+        "prerequisite": "xp_boost:1",  # Requires XP Boost level 1
+        "icon": "✖️"
+    },
+    "streak_shield": {
+        "name": "Streak Shield",
+        "description": "Reduces streak loss on Hard answers by 20% per level",
+        "max_level": 3,
+        "effect": "streak_shield",
+        "effect_per_level": 0.2,  # 20% chance per level to not lose streak on Hard
+        "cost": 1,
+        "prerequisite": None,
+        "icon": "🛡️"
+    },
+    "recovery": {
+        "name": "Quick Recovery",
+        "description": "Reduces multiplier decay by 0.1 per level",
+        "max_level": 2,
+        "effect": "multiplier_decay",
+        "effect_per_level": 0.1,
+        "cost": 1,
+        "prerequisite": "streak_shield:2",  # Requires Streak Shield level 2
+        "icon": "🔄"
+    },
+    "daily_bonus": {
+        "name": "Daily Bonus",
+        "description": "Earn 25 bonus XP at the start of each day per level",
+        "max_level": 4,
+        "effect": "daily_bonus",
+        "effect_per_level": 25,
+        "cost": 1,
+        "prerequisite": "xp_boost:2",  # Requires XP Boost level 2
+        "icon": "🎁"
+    }
+}
+
+# Define achievements
+ACHIEVEMENTS = {
+    "novice": {
+        "name": "Novice Learner",
+        "description": "Reach level 5",
+        "requirement": "level >= 5",
+        "reward_xp": 100,
+        "icon": "🎓",
+        "hidden": False
+    },
+    "intermediate": {
+        "name": "Intermediate Scholar",
+        "description": "Reach level 10",
+        "reward_xp": 250,
+        "requirement": "level >= 10",
+        "icon": "📚",
+        "hidden": False
+    },
+    "advanced": {
+        "name": "Advanced Academic",
+        "description": "Reach level 25",
+        "reward_xp": 500,
+        "requirement": "level >= 25",
+        "icon": "🧠",
+        "hidden": False
+    },
+    "combo_master": {
+        "name": "Combo Master",
+        "description": "Reach a 10-card streak",
+        "reward_xp": 50,
+        "requirement": "streak >= 10",
+        "icon": "🔥",
+        "hidden": False
+    },
+    "multiplier_king": {
+        "name": "Multiplier King",
+        "description": "Reach maximum multiplier (5x)",
+        "reward_xp": 100,
+        "requirement": "multiplier >= 5.0",
+        "icon": "👑",
+        "hidden": False
+    },
+    "skill_starter": {
+        "name": "Skill Starter",
+        "description": "Unlock your first skill",
+        "reward_xp": 50,
+        "requirement": "total_skills_unlocked >= 1",
+        "icon": "🌱",
+        "hidden": False
+    },
+    "persistent": {
+        "name": "Persistent Student",
+        "description": "Study for 7 consecutive days",
+        "reward_xp": 150,
+        "requirement": "study_streak >= 7",
+        "icon": "📅",
+        "hidden": False
+    }
+}
+
+# Build the cumulative level thresholds once from the level constants.
+# level_thresholds[i] is the total XP needed to leave level i + 1 and
+# level_next_xp[i] is the XP span shown for level i + 1's progress bar.
+def build_level_table(base_xp=None, factor=None, max_level=None):
+    base_xp = BASE_XP_FOR_LEVEL if base_xp is None else base_xp
+    factor = LEVEL_FACTOR if factor is None else factor
+    max_level = MAX_LEVEL if max_level is None else max_level
+    thresholds = []
+    next_xp = []
+    xp_for_next_level = base_xp
+    for level in range(1, max_level + 1):
+        thresholds.append(xp_for_next_level)
+        next_xp.append(int(base_xp * (factor ** level)))
+        xp_for_next_level += next_xp[-1]
+    return thresholds, next_xp
+
+level_thresholds, level_next_xp = build_level_table()
+
+# Calculate level from XP (timed here, so the calls from update_level on every
+# answer are counted too)
+@timed("calculate_level")
+def calculate_level(xp):
+    level = bisect.bisect_right(level_thresholds, xp, 0, MAX_LEVEL - 1) + 1
+    xp_for_next_level = level_thresholds[level - 1]
+    
+    # Calculate progress to next level (as percentage)
+    if level < MAX_LEVEL:
+        next_level_xp = level_next_xp[level - 1]
+        current_level_total = xp_for_next_level - next_level_xp
+        progress = ((xp - current_level_total) / next_level_xp) * 100
+        progress = min(100, max(0, progress))  # Ensure between 0-100
+    else:
+        progress = 100
+        
+    return level, int(progress), xp_for_next_level - xp
+
+# Fresh state for a new user
+def default_state(day=""):
+    return XPState(day)
+
+# Random source for chance-based skills (seed it for reproducible replays)
+xp_random = random.Random()
+
+# Seed the random source used by chance-based skills
+def seed_random(seed):
+    xp_random.seed(seed)
+
+# Skill effects of a set of skill levels, summed per effect (see
+# SKILL_EFFECTS), so applying them to an answer is plain arithmetic
+class SkillEffects:
+    def __init__(self):
+        self.xp_boost = 0
+        self.multiplier_increment = 0
+        self.multiplier_decay = 0
+        self.streak_shield = 0
+        self.daily_bonus = 0
+
+# Parse a prerequisite like "xp_boost:2" (or several, separated by commas)
+# into [(skill_id, level)]
+def parse_prerequisite(prerequisite):
+    if not prerequisite:
+        return []
+    requires = []
+    for part in prerequisite.split(","):
+        skill_id, sep, level = part.partition(":")
+        try:
+            requires.append((skill_id.strip(), int(level) if sep else 1))
+        except ValueError:
+            raise ValueError(f"Unsupported skill prerequisite: {prerequisite}")
+    return requires
+
+# Skill tree compiled once: each skill's effect, and its prerequisites parsed
+# into a dependency graph. Skills with an unknown effect are ignored; skills
+# whose prerequisites can't be met (unknown skills, cycles) can't be unlocked.
+class SkillTree:
+    def __init__(self, skill_tree):
+        self.skills = skill_tree
+        self.effects = {}  # Format: {skill_id: (effect, effect_per_level)}
+        self.requires = {}  # Format: {skill_id: [(skill_id, level)]}
+        self.dependents = {}  # Format: {skill_id: [skill_ids it unlocks]}
+        self.blocked = set()  # Skills that can never be unlocked
+        for skill_id, skill in skill_tree.items():
+            effect = skill.get("effect", skill_id)
+            if effect in SKILL_EFFECTS:
+                self.effects[skill_id] = (effect, skill["effect_per_level"])
+            else:
+                print(f"XP Add-on: Skill {skill_id} has unknown effect {effect}")
+            try:
+                requires = parse_prerequisite(skill.get("prerequisite"))
+            except ValueError as e:
+                print(f"XP Add-on: Skill {skill_id} can't be unlocked: {str(e)}")
+                self.blocked.add(skill_id)
+                continue
+            self.requires[skill_id] = requires
+            for required_id, level in requires:
+                self.dependents.setdefault(required_id, []).append(skill_id)
+                if required_id not in skill_tree:
+                    print(f"XP Add-on: Skill {skill_id} requires unknown skill {required_id}")
+                    self.blocked.add(skill_id)
+        self.block_cycles()
+
+    # Block the skills that (directly or indirectly) require themselves, or a
+    # blocked skill
+    def block_cycles(self):
+        done = set()
+        def visit(skill_id, path):
+            if skill_id in path:
+                print(f"XP Add-on: Skill {skill_id} is part of a prerequisite cycle")
+                self.blocked.update(path[path.index(skill_id):])
+                return
+            if skill_id in done:
+                return
+            path.append(skill_id)
+            for required_id, level in self.requires.get(skill_id, ()):
+                visit(required_id, path)
+                if required_id in self.blocked:
+                    self.blocked.add(skill_id)
+            path.pop()
+            done.add(skill_id)
+        for skill_id in self.skills:
+            visit(skill_id, [])
+
+    # Sum the effects of skills ({skill_id: level})
+    def get_effects(self, skills):
+        effects = SkillEffects()
+        for skill_id, level in skills.items():
+            if level > 0 and skill_id in self.effects:
+                effect, effect_per_level = self.effects[skill_id]
+                setattr(effects, effect, getattr(effects, effect) + level * effect_per_level)
+        return effects
+
+    # Why skill_id can't get another level in state, or None if it can
+    def get_unlock_problem(self, state, skill_id):
+        if skill_id not in self.skills:
+            return f"Unknown skill: {skill_id}"
+        skill = self.skills[skill_id]
+        if skill_id in self.blocked:
+            return f"{skill['name']} can't be unlocked"
+        if state["skills"].get(skill_id, 0) >= skill["max_level"]:
+            return f"{skill['name']} is already at its maximum level"
+        for required_id, level in self.requires[skill_id]:
+            if state["skills"].get(required_id, 0) < level:
+                return f"{skill['name']} requires {self.skills[required_id]['name']} level {level}"
+        if state["skill_points"] < skill["cost"]:
+            return f"{skill['name']} costs {skill['cost']} skill point(s)"
+        return None
+
+    # Skills that can get another level in state
+    def get_available(self, state):
+        return [skill_id for skill_id in self.skills if self.get_unlock_problem(state, skill_id) is None]
+
+# Compiled live skill tree, for callers that don't pass their own effects
+default_skill_tree = SkillTree(SKILL_TREE)
+
+# Effects of state's skills under the live skill tree
+def get_skill_effects(state):
+    return default_skill_tree.get_effects(state["skills"])
+
+# Spend skill points on one more level of skill_id. Returns the new level;
+# raises ValueError if the skill can't be unlocked.
+def unlock_skill_level(state, skill_id, tree=None):
+    tree = tree or default_skill_tree
+    problem = tree.get_unlock_problem(state, skill_id)
+    if problem:
+        raise ValueError(problem)
+    state["skill_points"] -= tree.skills[skill_id]["cost"]
+    state["skills"][skill_id] = state["skills"].get(skill_id, 0) + 1
+    return state["skills"][skill_id]
+
+# Achievement requirement fields that are derived from other state fields
+DERIVED_ACHIEVEMENT_FIELDS = {
+    "skills": ("total_skills_unlocked", "has_maxed_skill")
+}
+
+# Compile a requirement string like "level >= 5" into (field, threshold)
+def compile_requirement(requirement):
+    if requirement.strip() == "has_maxed_skill == True":
+        return "has_maxed_skill", 1
+    field, sep, value = requirement.partition(">=")
+    if not sep:
+        raise ValueError(f"Unsupported achievement requirement: {requirement}")
+    value = value.strip()
+    return field.strip(), float(value) if "." in value else int(value)
+
+# Get the current value of an achievement requirement field
+def get_achievement_value(state, field, skill_tree=None):
+    if field == "total_skills_unlocked":
+        return sum(1 for skill_level in state["skills"].values() if skill_level > 0)
+    if field == "has_maxed_skill":
+        return any(state["skills"].get(skill_id, 0) >= skill["max_level"]
+                   for skill_id, skill in (skill_tree or SKILL_TREE).items())
+    return state.get(field, 0)
+
+# Achievement requirements compiled once into per-field threshold lists. Only
+# unearned achievements are kept, sorted by threshold, so checking a field is
+# a bisect that stops at the first requirement not yet met.
+class AchievementIndex:
+    def __init__(self, achievements):
+        self.rules = {}  # Format: {field: [(threshold, achievement_id)]}
+        self.requirements = {}  # Format: {achievement_id: (field, threshold)}
+        for ach_id, achievement in achievements.items():
+            try:
+                field, threshold = compile_requirement(achievement["requirement"])
+            except ValueError as e:
+                print(f"XP Add-on: Skipping achievement {ach_id}: {str(e)}")
+                continue
+            self.rules.setdefault(field, []).append((threshold, ach_id))
+            self.requirements[ach_id] = (field, threshold)
+        for rules in self.rules.values():
+            rules.sort()
+        self.pending = {}  # Format: {field: ([thresholds], [achievement_ids])}
+    
+    # Index the achievements state hasn't earned yet
+    def rebuild(self, state):
+        earned = state["achievements"]
+        self.pending = {}
+        for field, rules in self.rules.items():
+            rules = [(threshold, ach_id) for threshold, ach_id in rules
+                     if not (ach_id in earned and earned[ach_id]["earned"])]
+            if rules:
+                self.pending[field] = ([rule[0] for rule in rules], [rule[1] for rule in rules])
+    
+    # Return (and drop) achievements newly met; changed limits the check to
+    # the given state fields, None checks everything
+    def check(self, state, changed=None):
+        if changed is None:
+            fields = list(self.pending)
+        else:
+            fields = []
+            for field in changed:
+                fields.extend(DERIVED_ACHIEVEMENT_FIELDS.get(field, (field,)))
+        
+        earned_ids = []
+        for field in fields:
+            if field not in self.pending:
+                continue
+            thresholds, ach_ids = self.pending[field]
+            count = bisect.bisect_right(thresholds, get_achievement_value(state, field))
+            if count:
+                earned_ids.extend(ach_ids[:count])
+                if count == len(ach_ids):
+                    del self.pending[field]
+                else:
+                    del thresholds[:count]
+                    del ach_ids[:count]
+        return earned_ids
+    
+    # Index achievements again that were taken back (see revert_answer)
+    def restore(self, ach_ids):
+        for ach_id in ach_ids:
+            if ach_id not in self.requirements:
+                continue
+            field, threshold = self.requirements[ach_id]
+            thresholds, pending_ids = self.pending.setdefault(field, ([], []))
+            if ach_id in pending_ids:
+                continue
+            position = bisect.bisect_right(thresholds, threshold)
+            thresholds.insert(position, threshold)
+            pending_ids.insert(position, ach_id)
+
+# Mark newly met achievements as earned and award their XP, returning their ids
+def award_achievements(state, index, day, changed=None):
+    earned_ids = index.check(state, changed)
+    for ach_id in earned_ids:
+        state["achievements"][ach_id] = {
+            "earned": True,
+            "date": day
+        }
+        
+        # Award XP bonus
+        state["total_xp"] += get_reward_xp(ach_id)
+    return earned_ids
+
+# XP amounts are whole numbers everywhere (the binary snapshot packs them as
+# integers), including rewards and bonuses configured as fractions
+def get_reward_xp(ach_id):
+    return int(ACHIEVEMENTS[ach_id]["reward_xp"])
+
+# Apply daily bonus from skills
+def apply_daily_bonus(state, effects=None):
+    bonus_xp = int((effects or get_skill_effects(state)).daily_bonus)
+    if bonus_xp > 0:
+        state["daily_xp"] += bonus_xp
+        state["total_xp"] += bonus_xp
+        return bonus_xp
+    return 0
+
+# Study day a timestamp falls on, when days start at rollover_hour local
+# time: (day, previous day, timestamp the day ends)
+def get_study_day(timestamp, rollover_hour=0):
+    day = (datetime.datetime.fromtimestamp(timestamp) - datetime.timedelta(hours=rollover_hour)).date()
+    day_end = datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time(rollover_hour))
+    return day.isoformat(), (day - datetime.timedelta(days=1)).isoformat(), day_end.timestamp()
+
+# Update the consecutive study day count
+def update_study_streak(state, today, yesterday):
+    if state["last_study_date"] == yesterday:
+        state["study_streak"] += 1
+    elif state["last_study_date"] != today:
+        # Reset streak if we missed a day
+        state["study_streak"] = 1
+
+# Start a new day: archive yesterday and reset the daily values. Returns the
+# daily bonus XP awarded, or None if state is already on today (or a later
+# day: the day never moves back). effects are state's skill effects (computed
+# from state if not given).
+def roll_over_day(state, today, effects=None):
+    if state.get("date", "") >= today:
+        return None
+    
+    # Save high score
+    if state["daily_xp"] > state["high_score"]:
+        state["high_score"] = state["daily_xp"]
+    
+    # Save yesterday's XP to history
+    if state["date"] and state["daily_xp"] > 0:
+        state["xp_history"][state["date"]] = state["daily_xp"]
+    
+    # Reset daily values
+    state["daily_xp"] = 0
+    state["multiplier"] = 1.0
+    state["streak"] = 0
+    state["date"] = today
+    state["last_study_date"] = today
+    
+    # Apply daily bonus if skill is unlocked
+    return apply_daily_bonus(state, effects)
+
+# Bring the stored level in line with total XP, awarding skill points for
+# levels gained. Returns (new_level, level_up).
+def update_level(state):
+    old_level = state.get("level", 1)
+    new_level, progress, xp_needed = calculate_level(state["total_xp"])
+    state["level"] = new_level
+    
+    # Detect level up and award skill points
+    level_up = new_level > old_level
+    if level_up:
+        points_to_add = (new_level - old_level) * SKILL_POINTS_PER_LEVEL
+        state["skill_points"] += points_to_add
+    return new_level, level_up
+
+# Set the level from total_xp and the skill points from what the levels earned
+# less what the skills cost (after a merge, where skill_points can't simply be
+# topped up for the levels gained: the other device spent some of them)
+def settle_skill_points(state, spent_points):
+    state["level"] = calculate_level(state["total_xp"])[0]
+    state["skill_points"] = max(0, (state["level"] - 1) * SKILL_POINTS_PER_LEVEL - spent_points)
+
+# Apply one answer to state. Returns (earned_xp, level_up, new_level); the
+# caller checks achievements. effects are state's skill effects; callers
+# answering many cards pass them in rather than have them computed per answer.
+def apply_answer(state, ease, rng=None, effects=None):
+    if effects is None:
+        effects = get_skill_effects(state)
+
+    # Base XP based on answer
+    base_xp = 0
+    if ease == 1:  # Again
+        base_xp = BASE_XP_AGAIN
+        state["streak"] = 0
+        state["multiplier"] = max(1.0, state["multiplier"] - MULTIPLIER_DECAY)
+    elif ease == 2:  # Hard
+        base_xp = BASE_XP_HARD
+        # Check if streak shield activates
+        if not (effects.streak_shield > 0 and (rng or xp_random).random() < effects.streak_shield):
+            state["streak"] = 0
+        # Apply reduced multiplier decay if recovery skill is active
+        decay = max(0, MULTIPLIER_DECAY - effects.multiplier_decay)
+        state["multiplier"] = max(1.0, state["multiplier"] - decay)
+    elif ease == 3:  # Good
+        base_xp = BASE_XP_GOOD
+        state["streak"] += 1
+        # Apply multiplier boost skill if available
+        increment = MULTIPLIER_INCREMENT + effects.multiplier_increment
+        state["multiplier"] = min(MAX_MULTIPLIER, state["multiplier"] + increment)
+    elif ease == 4:  # Easy
+        base_xp = BASE_XP_EASY
+        state["streak"] += 1
+        # Apply multiplier boost skill if available (doubled for Easy answers)
+        increment = MULTIPLIER_INCREMENT * 2 + effects.multiplier_increment
+        state["multiplier"] = min(MAX_MULTIPLIER, state["multiplier"] + increment)
+    
+    # Apply multiplier to positive XP
+    if base_xp > 0:
+        # Apply XP boost skill if available
+        earned_xp = int(base_xp * (1 + effects.xp_boost) * state["multiplier"])
+    else:
+        earned_xp = int(base_xp)
+    
+    # Update XP totals
+    state["daily_xp"] += earned_xp
+    state["total_xp"] += earned_xp
+    
+    # Update level based on total XP
+    new_level, level_up = update_level(state)
+    return earned_xp, level_up, new_level
+
+# Achievement fields an answer can raise
+def answer_changed_fields(level_up):
+    if level_up:
+        return ("level", "streak", "multiplier", "daily_xp")
+    return ("streak", "multiplier", "daily_xp")
+
+# What one answer changed, for taking it back with revert_answer: the fields
+# it sets, as they were before it, and what it added. Made before the answer
+# is applied; finish fills in the rest once its achievements are awarded.
+class AnswerDelta:
+    __slots__ = ("card_id", "answered_at", "deck_id", "note_type_id", "day", "ease", "multiplier", "streak", "level",
+                 "xp", "reward_xp", "skill_points", "achievement_ids")
+
+    def __init__(self, state, ease, card_id=None, answered_at=0, deck_id=None, note_type_id=None):
+        self.card_id = card_id  # Anki card answered, if known
+        self.answered_at = answered_at  # Epoch ms when the answer started (revlog ids are at or after it)
+        self.deck_id = deck_id  # Where the XP was attributed (see breakdown.py)
+        self.note_type_id = note_type_id
+        self.day = state["date"]
+        self.ease = ease
+        self.multiplier = state["multiplier"]
+        self.streak = state["streak"]
+        self.level = state["level"]
+        self.skill_points = state["skill_points"]
+        self.xp = 0
+        self.reward_xp = 0
+        self.achievement_ids = ()
+
+    def finish(self, state, earned_xp, achievement_ids):
+        self.xp = earned_xp
+        self.reward_xp = sum(get_reward_xp(ach_id) for ach_id in achievement_ids)
+        self.skill_points = state["skill_points"] - self.skill_points  # Gained by a level up
+        self.achievement_ids = tuple(achievement_ids)
+
+# Take an answer back out of state: XP, multiplier, streak, level, the skill
+# points a level up gave and the achievements it earned. Constant time.
+# Deltas have to be reverted newest first, with nothing else changing state
+# in between (callers drop their deltas when it does).
+def revert_answer(state, delta):
+    state["daily_xp"] -= delta.xp
+    state["total_xp"] -= delta.xp + delta.reward_xp
+    state["multiplier"] = delta.multiplier
+    state["streak"] = delta.streak
+    state["level"] = delta.level
+    state["skill_points"] -= delta.skill_points
+    achievements = state["achievements"]
+    for ach_id in delta.achievement_ids:
+        achievements.pop(ach_id, None)
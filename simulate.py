@@ -0,0 +1,290 @@
+import datetime
+
+import numpy as np
+
+from . import rules
+from .rules import (ACHIEVEMENTS, SKILL_TREE, AchievementIndex, SkillTree, build_level_table, default_skill_tree,
+                    get_achievement_value)
+
+# Vectorized XP simulator for balancing the rule constants. It runs the same
+# rules as calculate_xp/calculate_level for many synthetic users at once: the
+# loop goes over answer steps and every step updates all users with array
+# operations.
+#
+# eases is an int array shaped (users, days, answers_per_day) holding 1-4 for
+# Again/Hard/Good/Easy and 0 for "no answer" padding. A day with at least one
+# answer counts as a study day and gets the same rollover as the first load of
+# a day in the add-on.
+
+# Rule constants simulate() reads; pass any of them as keyword arguments to try
+# a different value without editing rules.py
+TUNABLE_CONSTANTS = (
+    "BASE_XP_AGAIN", "BASE_XP_HARD", "BASE_XP_GOOD", "BASE_XP_EASY",
+    "MULTIPLIER_INCREMENT", "MULTIPLIER_DECAY", "MAX_MULTIPLIER",
+    "BASE_XP_FOR_LEVEL", "LEVEL_FACTOR", "MAX_LEVEL", "SKILL_POINTS_PER_LEVEL"
+)
+
+# Simulation output; per-user arrays are indexed by user
+class SimulationResult:
+    def __init__(self):
+        self.total_xp = None  # (users,)
+        self.level = None  # (users,)
+        self.progress = None  # (users,) percent to next level
+        self.xp_needed = None  # (users,)
+        self.skill_points = None  # (users,)
+        self.high_score = None  # (users,)
+        self.study_streak = None  # (users,)
+        self.multiplier = None  # (users,) at the end of the last day
+        self.streak = None  # (users,) at the end of the last day
+        self.daily_xp = None  # (users, days)
+        self.achievements = {}  # Format: {achievement_id: (users,) bool}
+        self.earned_xp = None  # (users, days, answers) when recorded
+        self.multipliers = None  # (users, days, answers) when recorded
+
+# Resolve the rule constants, with overrides applied
+def get_constants(overrides):
+    unknown = set(overrides) - set(TUNABLE_CONSTANTS)
+    if unknown:
+        raise ValueError(f"Unknown rule constants: {', '.join(sorted(unknown))}")
+    constants = {name: getattr(rules, name) for name in TUNABLE_CONSTANTS}
+    constants.update(overrides)
+    return constants
+
+# Vectorized calculate_level: (level, progress, xp_needed) arrays for an XP array
+def calculate_levels(xp, thresholds, next_xp, max_level):
+    xp = np.asarray(xp)
+    level = np.searchsorted(thresholds[:max_level - 1], xp, side="right") + 1
+    xp_for_next_level = thresholds[level - 1]
+    next_level_xp = next_xp[level - 1]
+    current_level_total = xp_for_next_level - next_level_xp
+    progress = np.clip((xp - current_level_total) / next_level_xp * 100, 0, 100)
+    progress = np.where(level < max_level, progress, 100).astype(np.int64)
+    return level, progress, xp_for_next_level - xp
+
+# Run the XP rules over eases for every user at once. skills (shared by all
+# users) and skill_tree default to the live configuration. draws optionally
+# fixes the streak shield's random numbers, shaped like eases; otherwise they
+# come from a generator seeded with seed. record keeps the per-answer earned
+# XP and multiplier trajectories, which cost users * days * answers memory.
+def simulate(eases, skills=None, skill_tree=None, achievements=None, seed=None, draws=None, record=False, **overrides):
+    c = get_constants(overrides)
+    skills = skills or {}
+    skill_tree = skill_tree or SKILL_TREE
+    achievements = ACHIEVEMENTS if achievements is None else achievements
+    eases = np.asarray(eases)
+    users, days, answers = eases.shape
+    rng = np.random.default_rng(seed)
+
+    # Level table as floats (high levels overflow int64; low ones stay exact)
+    thresholds, next_xp = build_level_table(c["BASE_XP_FOR_LEVEL"], c["LEVEL_FACTOR"], c["MAX_LEVEL"])
+    thresholds = np.array(thresholds, dtype=np.float64)
+    next_xp = np.array(next_xp, dtype=np.float64)
+
+    # Skill effects resolved to scalars, as apply_answer uses them
+    effects = (default_skill_tree if skill_tree is SKILL_TREE else SkillTree(skill_tree)).get_effects(skills)
+    xp_boost = 1 + effects.xp_boost
+    good_increment = c["MULTIPLIER_INCREMENT"] + effects.multiplier_increment
+    easy_increment = c["MULTIPLIER_INCREMENT"] * 2 + effects.multiplier_increment
+    shield_chance = effects.streak_shield
+    hard_decay = max(0, c["MULTIPLIER_DECAY"] - effects.multiplier_decay)
+    daily_bonus = effects.daily_bonus
+    good_xp = c["BASE_XP_GOOD"] * xp_boost
+    easy_xp = c["BASE_XP_EASY"] * xp_boost
+
+    # Per-ease lookup tables (index 0 is "no answer")
+    xp_by_ease = np.array([0, c["BASE_XP_AGAIN"], c["BASE_XP_HARD"], good_xp, easy_xp], dtype=np.float64)
+    multiplied = np.array([False, False, False, True, True])
+    decay_by_ease = np.array([0.0, c["MULTIPLIER_DECAY"], hard_decay, 0.0, 0.0])
+    increment_by_ease = np.array([0.0, 0.0, 0.0, good_increment, easy_increment])
+    resets_streak = np.array([False, True, True, False, False])
+    streak_step = np.array([0, 0, 0, 1, 1])
+
+    # Achievement rules, split into those an answer can trigger and the rest
+    index = AchievementIndex(achievements)
+    answer_fields = set(rules.answer_changed_fields(True))
+    skill_state = {"skills": skills}
+
+    # Per-user state
+    total_xp = np.zeros(users, dtype=np.int64)
+    daily = np.zeros(users, dtype=np.int64)
+    multiplier = np.ones(users, dtype=np.float64)
+    streak = np.zeros(users, dtype=np.int64)
+    level = np.ones(users, dtype=np.int64)
+    skill_points = np.zeros(users, dtype=np.int64)
+    high_score = np.zeros(users, dtype=np.int64)
+    study_streak = np.zeros(users, dtype=np.int64)
+    last_day = np.full(users, -2, dtype=np.int64)
+    earned = {ach_id: np.zeros(users, dtype=bool) for rules_list in index.rules.values() for _, ach_id in rules_list}
+    pending = {field: list(rules_list) for field, rules_list in index.rules.items()}
+
+    result = SimulationResult()
+    result.daily_xp = np.zeros((users, days), dtype=np.int64)
+    if record:
+        result.earned_xp = np.zeros((users, days, answers), dtype=np.int64)
+        result.multipliers = np.zeros((users, days, answers), dtype=np.float64)
+
+    # Arrays are only ever updated in place, so these stay current
+    field_arrays = {
+        "level": level,
+        "streak": streak,
+        "multiplier": multiplier,
+        "daily_xp": daily,
+        "total_xp": total_xp,
+        "skill_points": skill_points,
+        "high_score": high_score,
+        "study_streak": study_streak
+    }
+
+    def field_value(field):
+        if field in field_arrays:
+            return field_arrays[field]
+        return get_achievement_value(skill_state, field, skill_tree)
+
+    def check_achievements(mask, fields):
+        for field, rules_list in pending.items():
+            if fields is not None and field not in fields:
+                continue
+            value = field_value(field)
+            for threshold, ach_id in rules_list:
+                new = mask & ~earned[ach_id] & (value >= threshold)
+                earned[ach_id] |= new
+                np.add(total_xp, achievements[ach_id]["reward_xp"] * new, out=total_xp)
+
+    def update_levels(mask):
+        new_level = calculate_levels(total_xp, thresholds, next_xp, c["MAX_LEVEL"])[0]
+        level_up = mask & (new_level > level)
+        np.add(skill_points, (new_level - level) * c["SKILL_POINTS_PER_LEVEL"] * level_up, out=skill_points)
+        level[mask] = new_level[mask]
+
+    for day in range(days):
+        day_eases = eases[:, day, :]
+        studied = (day_eases > 0).any(axis=1)
+
+        # Start of a study day: streak, rollover, daily bonus, level, achievements
+        study_streak[:] = np.where(studied, np.where(last_day == day - 1, study_streak + 1, 1), study_streak)
+        last_day[studied] = day
+        high_score[:] = np.where(studied & (daily > high_score), daily, high_score)
+        daily[studied] = 0
+        multiplier[studied] = 1.0
+        streak[studied] = 0
+        if daily_bonus > 0:
+            daily[studied] += daily_bonus
+            total_xp[studied] += daily_bonus
+        update_levels(studied)
+        check_achievements(studied, None)
+
+        for answer in range(answers):
+            ease = day_eases[:, answer]
+            active = ease > 0
+
+            # Streak
+            resets = resets_streak[ease]
+            if shield_chance > 0:
+                draw = draws[:, day, answer] if draws is not None else rng.random(users)
+                resets = resets & ~((ease == 2) & (draw < shield_chance))
+            streak[:] = np.where(resets, 0, streak + streak_step[ease])
+
+            # Multiplier (adding or subtracting 0.0 leaves untouched users exact)
+            multiplier[:] = np.minimum(c["MAX_MULTIPLIER"], np.maximum(1.0, multiplier - decay_by_ease[ease]) + increment_by_ease[ease])
+
+            # Earned XP (multiplied and truncated for Good/Easy, flat otherwise)
+            base = xp_by_ease[ease]
+            earned_xp = np.where(multiplied[ease], base * multiplier, base).astype(np.int64)
+            daily += earned_xp
+            total_xp += earned_xp
+            if record:
+                result.earned_xp[:, day, answer] = earned_xp
+                result.multipliers[:, day, answer] = multiplier
+
+            update_levels(active)
+            check_achievements(active, answer_fields)
+
+        result.daily_xp[:, day] = np.where(studied, daily, 0)
+
+        # Stop checking achievements every user has earned
+        for field in list(pending):
+            pending[field] = [rule for rule in pending[field] if not earned[rule[1]].all()]
+            if not pending[field]:
+                del pending[field]
+
+    result.total_xp = total_xp
+    result.level = level
+    result.progress, result.xp_needed = calculate_levels(total_xp, thresholds, next_xp, c["MAX_LEVEL"])[1:]
+    result.skill_points = skill_points
+    result.high_score = high_score
+    result.study_streak = study_streak
+    result.multiplier = multiplier
+    result.streak = streak
+    result.achievements = earned
+    return result
+
+# Random source for apply_answer that hands out preset draws
+class PresetRandom:
+    def __init__(self):
+        self.value = 0.0
+
+    def random(self):
+        return self.value
+
+# Run one user's eases through the live rules (the path calculate_xp takes)
+def reference_run(user_eases, skills=None, user_draws=None):
+    state = rules.default_state()
+    state["skills"] = dict(skills or {})
+    effects = rules.get_skill_effects(state)
+    index = AchievementIndex(ACHIEVEMENTS)
+    index.rebuild(state)
+    rng = PresetRandom()
+    start = datetime.date(2000, 1, 1)
+    daily_xp = []
+    for day, day_eases in enumerate(user_eases):
+        if not any(ease > 0 for ease in day_eases):
+            daily_xp.append(0)
+            continue
+        today = (start + datetime.timedelta(days=day)).isoformat()
+        yesterday = (start + datetime.timedelta(days=day - 1)).isoformat()
+        rules.update_study_streak(state, today, yesterday)
+        rules.roll_over_day(state, today, effects)
+        rules.update_level(state)
+        rules.award_achievements(state, index, today)
+        for answer, ease in enumerate(day_eases):
+            if ease <= 0:
+                continue
+            if user_draws is not None:
+                rng.value = user_draws[day][answer]
+            earned_xp, level_up, new_level = rules.apply_answer(state, int(ease), rng, effects)
+            rules.award_achievements(state, index, today, rules.answer_changed_fields(level_up))
+        daily_xp.append(state["daily_xp"])
+    return state, daily_xp
+
+# Compare simulate() with the live rules user by user. Returns the indexes of
+# users whose results differ (empty when the simulator matches).
+def verify(eases, skills=None, seed=0):
+    eases = np.asarray(eases)
+    draws = np.random.default_rng(seed).random(eases.shape)
+    result = simulate(eases, skills=skills, draws=draws)
+    mismatches = []
+    for user in range(eases.shape[0]):
+        state, daily_xp = reference_run(eases[user].tolist(), skills, draws[user].tolist())
+        level, progress, xp_needed = rules.calculate_level(state["total_xp"])
+        expected = (state["total_xp"], state["level"], progress, xp_needed, state["skill_points"],
+                    state["high_score"], state["study_streak"], state["multiplier"], state["streak"],
+                    daily_xp, sorted(state["achievements"]))
+        actual = (int(result.total_xp[user]), int(result.level[user]), int(result.progress[user]),
+                  int(result.xp_needed[user]), int(result.skill_points[user]), int(result.high_score[user]),
+                  int(result.study_streak[user]), float(result.multiplier[user]), int(result.streak[user]),
+                  result.daily_xp[user].tolist(), sorted(ach_id for ach_id, got in result.achievements.items() if got[user]))
+        if expected != actual:
+            mismatches.append(user)
+    return mismatches
+
+# Random ease histories for quick experiments: each answer is Again/Hard/
+# Good/Easy with the given probabilities, and days are skipped with skip_day
+def random_eases(users, days, answers_per_day, probabilities=(0.1, 0.15, 0.6, 0.15), skip_day=0.1, seed=None):
+    rng = np.random.default_rng(seed)
+    cumulative = np.cumsum(probabilities)
+    eases = np.zeros((users, days, answers_per_day), dtype=np.int8)
+    # One day at a time keeps the float temporaries small for big runs
+    for day in range(days):
+        eases[:, day, :] = np.searchsorted(cumulative, rng.random((users, answers_per_day)) * cumulative[-1], side="right") + 1
+    eases[rng.random((users, days)) < skip_day] = 0
+    return eases
@@ -0,0 +1,281 @@
+import os
+import json
+import sqlite3
+import datetime
+
+from .state import XPState
+from .storage import fresh_state, load_history_archive
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS skills (skill_id TEXT PRIMARY KEY, level INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS achievements (achievement_id TEXT PRIMARY KEY, date TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS daily_xp (day TEXT PRIMARY KEY, xp INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS daily_xp_by_xp ON daily_xp (xp);
+CREATE TABLE IF NOT EXISTS history_archive (period TEXT PRIMARY KEY, xp INTEGER NOT NULL);
+"""
+
+# State fields kept in their own tables; every other field is a JSON value in
+# the state table
+TABLE_FIELDS = ("skills", "achievements", "xp_history")
+
+# Open a connection in WAL mode, so the stats view can read while the writer
+# thread commits
+def connect(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+# State kept in an SQLite database (xp_data.db). Flushes only write the fields
+# and rows that changed since the last flush, in one transaction on the
+# writer thread. The full daily history stays in the daily_xp table, so stats
+# are indexed queries; xp_state only holds the recent days.
+class SqliteStore:
+    def __init__(self, writer, db_path, history_days, legacy_store=None):
+        self.writer = writer
+        self.db_path = db_path
+        self.history_days = history_days  # Days of history loaded into xp_state
+        self.legacy_store = legacy_store  # JSON store to migrate from on first load
+        self.read_conn = None  # Main thread connection (loads and stats)
+        self.write_conn = None  # Writer thread connection
+        self.answers = 0  # Answers recorded since the last flush
+        self.written = {}  # Format: {field: JSON value as last written}
+        self.written_skills = {}
+        self.written_achievements = set()
+        self.written_days = {}  # Format: {"YYYY-MM-DD": xp} as last written
+
+    def get_read_conn(self):
+        if self.read_conn is None:
+            self.read_conn = connect(self.db_path)
+            self.read_conn.executescript(SCHEMA)
+        return self.read_conn
+
+    # Load state from the database, migrating xp_data.json on first use.
+    # Fields missing from the database are taken from defaults.
+    def load(self, defaults):
+        self.writer.wait()
+        defaults = fresh_state(defaults)
+        conn = self.get_read_conn()
+        if conn.execute("SELECT 1 FROM state LIMIT 1").fetchone() is None:
+            if self.legacy_store is None or not os.path.exists(self.legacy_store.state_path):
+                self.forget_written()
+                return defaults
+            self.migrate(conn, defaults)
+
+        state = {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM state")}
+        state["skills"] = dict(conn.execute("SELECT skill_id, level FROM skills"))
+        state["achievements"] = {ach_id: {"earned": True, "date": date}
+                                 for ach_id, date in conn.execute("SELECT achievement_id, date FROM achievements")}
+        # The last history_days days before the state's study day
+        day = state.get("date", "")
+        cutoff = (datetime.date.fromisoformat(day) - datetime.timedelta(days=self.history_days)).isoformat() if day else ""
+        state["xp_history"] = dict(conn.execute("SELECT day, xp FROM daily_xp WHERE day >= ? AND day < ?",
+                                                (cutoff, day)))
+
+        # Fields missing from the database come from defaults (for backward compatibility)
+        state = XPState.from_dict(state, defaults)
+
+        # What's loaded is what's on disk
+        self.written = {key: json.dumps(value) for key, value in state.items() if key not in TABLE_FIELDS}
+        self.written_skills = dict(state["skills"])
+        self.written_achievements = set(state["achievements"])
+        self.written_days = self.get_days(state)
+        return state
+
+    # One-shot copy of the JSON snapshot, journal and history archive into the
+    # database; the JSON files are kept with a .migrated suffix
+    def migrate(self, conn, defaults):
+        legacy = self.legacy_store
+        state = legacy.load(defaults)
+        archive = load_history_archive(legacy.archive_path)
+        self.forget_written()
+        with conn:
+            for sql, params in self.get_changes(state):
+                conn.executemany(sql, params)
+            conn.executemany("INSERT OR REPLACE INTO history_archive (period, xp) VALUES (?, ?)",
+                             list(archive["weekly"].items()) + list(archive["monthly"].items()))
+        for path in (legacy.state_path, legacy.journal_path, legacy.archive_path):
+            if os.path.exists(path):
+                os.replace(path, path + ".migrated")
+        print("XP Add-on: Migrated xp_data.json to xp_data.db")
+
+    # Move an unreadable database aside so it isn't overwritten
+    def quarantine(self):
+        self.writer.wait()
+        self.close()
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                if os.path.exists(self.db_path + suffix):
+                    os.replace(self.db_path + suffix, self.db_path + ".corrupt" + suffix)
+            except OSError:
+                pass
+        self.forget_written()
+
+    def close(self):
+        if self.read_conn is not None:
+            self.read_conn.close()
+            self.read_conn = None
+        self.writer.call(self.db_path, self.close_write_conn)
+        self.writer.wait()
+
+    def close_write_conn(self):
+        if self.write_conn is not None:
+            self.write_conn.close()
+            self.write_conn = None
+
+    # The database only has one writer (this add-on), so it's always current
+    def is_current(self):
+        return True
+
+    # Answers and taken-back answers are only counted: the next flush writes
+    # whatever they changed
+    def record_answer(self, state, ease, earned_xp, achievement_ids, reward_xp, timestamp):
+        self.answers += 1
+
+    def record_undo(self, state, delta, timestamp):
+        self.answers += 1
+
+    def pending_answers(self):
+        return self.answers
+
+    # Nothing to do: every flush writes whatever changed
+    def mark_dirty(self):
+        pass
+
+    # Forget what was written, so the next flush writes everything
+    def forget_written(self):
+        self.written = {}
+        self.written_skills = {}
+        self.written_achievements = set()
+        self.written_days = {}
+
+    # Days as they belong in daily_xp: the history plus today's running total
+    def get_days(self, state):
+        days = dict(state["xp_history"])
+        if state.get("date") and state["daily_xp"] > 0:
+            days[state["date"]] = state["daily_xp"]
+        return days
+
+    # SQL (statement, rows) pairs that bring the database in line with state,
+    # updating what's been written
+    def get_changes(self, state):
+        changes = []
+
+        # Plain fields whose value changed
+        fields = []
+        for key, value in state.items():
+            if key in TABLE_FIELDS:
+                continue
+            encoded = json.dumps(value)
+            if self.written.get(key) != encoded:
+                fields.append((key, encoded))
+                self.written[key] = encoded
+        if fields:
+            changes.append(("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", fields))
+
+        # Skills and achievements
+        skills = state["skills"]
+        if skills != self.written_skills:
+            removed = [(skill_id,) for skill_id in self.written_skills if skill_id not in skills]
+            changes.append(("DELETE FROM skills WHERE skill_id = ?", removed))
+            changes.append(("INSERT OR REPLACE INTO skills (skill_id, level) VALUES (?, ?)", list(skills.items())))
+            self.written_skills = dict(skills)
+        achievements = state["achievements"]
+        if len(achievements) != len(self.written_achievements) or not self.written_achievements.issuperset(achievements):
+            removed = [(ach_id,) for ach_id in self.written_achievements if ach_id not in achievements]
+            added = [(ach_id, achievements[ach_id].get("date", "")) for ach_id in achievements
+                     if ach_id not in self.written_achievements]
+            changes.append(("DELETE FROM achievements WHERE achievement_id = ?", removed))
+            changes.append(("INSERT OR REPLACE INTO achievements (achievement_id, date) VALUES (?, ?)", added))
+            self.written_achievements = set(achievements)
+
+        # Daily history rows (days that left xp_state are kept in the table)
+        days = self.get_days(state)
+        changed_days = [(day, xp) for day, xp in days.items() if self.written_days.get(day) != xp]
+        if changed_days:
+            changes.append(("INSERT OR REPLACE INTO daily_xp (day, xp) VALUES (?, ?)", changed_days))
+        # Today's row goes away if the day's total drops to zero or below
+        if state.get("date") in self.written_days and state["date"] not in days:
+            changes.append(("DELETE FROM daily_xp WHERE day = ?", [(state["date"],)]))
+        self.written_days = days
+        return changes
+
+    # Hand whatever changed to the writer as one transaction
+    def flush(self, state, compact=False):
+        self.answers = 0
+        changes = self.get_changes(state)
+        if changes:
+            self.writer.call(self.db_path, self.apply_changes, changes)
+
+    # Runs on the writer thread
+    def apply_changes(self, changes):
+        if self.write_conn is None:
+            self.write_conn = connect(self.db_path)
+            self.write_conn.executescript(SCHEMA)
+        with self.write_conn:
+            for sql, params in changes:
+                self.write_conn.executemany(sql, params)
+
+    # Days that left xp_state's daily history stay in the table
+    def archive_days(self, days):
+        self.writer.call(self.db_path, self.apply_changes,
+                         [("INSERT OR REPLACE INTO daily_xp (day, xp) VALUES (?, ?)", list(days.items()))])
+
+    # Replace the whole history with the given days (after a reset or rebuild)
+    def replace_archive(self, days):
+        self.forget_written()
+        self.writer.call(self.db_path, self.apply_changes, [
+            ("DELETE FROM daily_xp", [()]),
+            ("DELETE FROM history_archive", [()]),
+            ("INSERT INTO daily_xp (day, xp) VALUES (?, ?)", list(days.items()))
+        ])
+
+    # History for the stats view and the stats aggregates' bests and runs,
+    # from indexed queries over the whole table (the same summary as
+    # storage.summarize_days). Whatever state has that isn't written yet is
+    # flushed first.
+    def get_history(self, state, runs_kept=5):
+        self.flush(state)
+        self.writer.wait()
+        conn = self.get_read_conn()
+        today = state["date"]
+        history = {}
+        history["best_day"] = conn.execute("SELECT day, xp FROM daily_xp WHERE day < ? AND xp > 0 ORDER BY xp DESC, day LIMIT 1",
+                                           (today,)).fetchone()
+        start = (datetime.date.fromisoformat(today) - datetime.timedelta(days=29)).isoformat()
+        total = conn.execute("SELECT COALESCE(SUM(xp), 0) FROM daily_xp WHERE day BETWEEN ? AND ?", (start, today)).fetchone()[0]
+        history["average_30"] = total / 30
+
+        # Runs of consecutive study days: days minus their rank are constant
+        # within a run
+        runs = """
+            SELECT MIN(day), MAX(day), COUNT(*) FROM (
+                SELECT day, julianday(day) - ROW_NUMBER() OVER (ORDER BY day) AS run
+                FROM daily_xp WHERE xp > 0 AND day < ?
+            ) GROUP BY run
+        """
+        history["streaks"] = conn.execute(runs + " ORDER BY MIN(day) DESC LIMIT ?", (today, runs_kept)).fetchall()
+        history["best_streak"] = conn.execute(runs + " ORDER BY COUNT(*) DESC, MIN(day) LIMIT 1", (today,)).fetchone()
+
+        # Monthly totals, including months migrated from the JSON archive
+        first_month = (datetime.date.fromisoformat(today) - datetime.timedelta(days=366)).isoformat()[:7]
+        monthly_xp = dict(conn.execute("SELECT period, xp FROM history_archive WHERE period >= ? AND period NOT LIKE '%W%'",
+                                       (first_month,)))
+        for month, month_xp in conn.execute("SELECT substr(day, 1, 7) AS month, SUM(xp) FROM daily_xp WHERE day >= ? GROUP BY month",
+                                            (first_month,)):
+            monthly_xp[month] = monthly_xp.get(month, 0) + month_xp
+        history["monthly"] = monthly_xp
+        return history
+
+    # The whole history, to start the stats aggregates from: every day in the
+    # table (today included) and totals migrated from the JSON archive
+    def get_stats_history(self, state):
+        self.writer.wait()
+        conn = self.get_read_conn()
+        days = dict(conn.execute("SELECT day, xp FROM daily_xp"))
+        days.update(self.get_days(state))
+        archive = {"weekly": {}, "monthly": {}}
+        for period, xp in conn.execute("SELECT period, xp FROM history_archive"):
+            archive["weekly" if "W" in period else "monthly"][period] = xp
+        return days, archive
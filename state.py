@@ -0,0 +1,273 @@
+import sys
+import json
+import array
+import struct
+import calendar
+import datetime
+import itertools
+
+# Typed XP state: one object with a slot per field, used wherever a state is
+# kept (xp_state, the stores, replays and simulations). The rules and stores
+# read and write it as a mapping (state["total_xp"]), so it works anywhere the
+# plain dict did; to_dict is the JSON form and encode_snapshot the compact
+# binary one.
+
+STATE_VERSION = 1  # Schema version of both forms; bump when fields change meaning
+
+# Fields only some states have: the mergeable state (crdt.py), the stats
+# aggregates (stats.py) and the per-deck breakdown (breakdown.py). Missing
+# ones aren't in the mapping.
+OPTIONAL_FIELDS = ("sync", "stats", "breakdown")
+
+# XP fields, whole numbers in every state (states saved by older versions may
+# have fractions, which the binary snapshot can't hold)
+XP_FIELDS = ("daily_xp", "total_xp", "high_score")
+
+class XPState:
+    __slots__ = ("daily_xp", "total_xp", "multiplier", "streak", "high_score", "date", "level", "skill_points",
+                 "skills", "achievements", "xp_history", "study_streak", "last_study_date") + OPTIONAL_FIELDS
+
+    # Fresh state for a new user
+    def __init__(self, day=""):
+        self.daily_xp = 0
+        self.total_xp = 0
+        self.multiplier = 1.0
+        self.streak = 0
+        self.high_score = 0
+        self.date = day
+        self.level = 1
+        self.skill_points = 0
+        self.skills = {}  # Format: {"skill_id": level}
+        self.achievements = {}  # Format: {"achievement_id": {"earned": True, "date": "YYYY-MM-DD"}}
+        self.xp_history = {}  # Format: {"YYYY-MM-DD": xp_earned_that_day}
+        self.study_streak = 0  # Consecutive days studied
+        self.last_study_date = ""
+
+    # State from its JSON form. Fields missing from data are taken from
+    # defaults (a state or mapping) if given, or are the new-user defaults;
+    # fields this version doesn't know are dropped.
+    @classmethod
+    def from_dict(cls, data, defaults=None):
+        state = cls()
+        for name in cls.__slots__:
+            if name in data:
+                setattr(state, name, data[name])
+            elif defaults is not None and name in defaults:
+                setattr(state, name, defaults[name])
+        for name in XP_FIELDS:
+            if type(getattr(state, name)) is not int:
+                setattr(state, name, int(getattr(state, name)))
+        if not all(type(xp) is int for xp in state.xp_history.values()):
+            state.xp_history = {day: int(xp) for day, xp in state.xp_history.items()}
+        return state
+
+    # JSON form (shares the containers with the state)
+    def to_dict(self):
+        data = {"version": STATE_VERSION}
+        data.update(self.items())
+        return data
+
+    # Make this state a (shallow) copy of other, a state or a mapping in the
+    # JSON form, keeping the object itself
+    def assign(self, other):
+        if not isinstance(other, XPState):
+            other = XPState.from_dict(other)
+        for name in self.__slots__:
+            if name in other:
+                setattr(self, name, getattr(other, name))
+            elif name in self:
+                delattr(self, name)
+
+    def copy(self):
+        state = XPState()
+        state.assign(self)
+        return state
+
+    # Mapping access by field name
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        try:
+            setattr(self, key, value)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __delitem__(self, key):
+        if key not in OPTIONAL_FIELDS or key not in self:
+            raise KeyError(key)
+        delattr(self, key)
+
+    def __contains__(self, key):
+        return key in FIELD_NAMES and hasattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in FIELD_NAMES else default
+
+    def keys(self):
+        return [name for name in self.__slots__ if hasattr(self, name)]
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self.__slots__ if hasattr(self, name)]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, XPState):
+            other = dict(other.items())
+        return dict(self.items()) == other
+
+    def __repr__(self):
+        return f"XPState({dict(self.items())!r})"
+
+FIELD_NAMES = frozenset(XPState.__slots__)
+
+# Binary snapshot layout (little-endian):
+#   header: magic, STATE_VERSION, journal sequence number
+#   scalars: the numeric fields, with date and last_study_date as day numbers
+#            (date.toordinal(), 0 for none)
+#   xp_history: first year, days spanned from its January 1 and days kept,
+#               then a byte per spanned day (1 if it's kept) and the XP of
+#               each kept day, in day order
+#   skills, achievements: count, "\0"-joined ids, then packed levels or day
+#                         numbers earned
+#   optional fields: JSON (they're small and nested)
+SNAPSHOT_MAGIC = b"XPSN"
+SNAPSHOT_HEADER = struct.Struct("<4sHQ")
+SNAPSHOT_SCALARS = struct.Struct("<qqdqqqqqii")
+SNAPSHOT_COUNT = struct.Struct("<I")
+SNAPSHOT_IDS = struct.Struct("<II")  # Count, size of the joined ids
+SNAPSHOT_HISTORY = struct.Struct("<iII")  # First year, days spanned, days kept
+
+# Day keys by year, built once and shared by every state decoded, so
+# decoding a history doesn't format dates (or hash new key strings)
+_year_days = {}  # Format: {year: ["YYYY-01-01", ..., "YYYY-12-31"]}
+_year_templates = {}  # Format: {leap year: "YYYY-01-01 YYYY-01-02 ..."}
+MONTH_TEMPLATE = " ".join(f"YYYY-MM-{day:02d}" for day in range(1, 32))
+
+def get_day_number(day):
+    return datetime.date.fromisoformat(day).toordinal() if day else 0
+
+def get_day_key(number):
+    return datetime.date.fromordinal(number).isoformat() if number else ""
+
+# Keys of every day of the years first_year through last_year, so keys[n] is
+# the day n days after January 1 of first_year
+def get_day_keys(first_year, last_year):
+    keys = []
+    for year in range(first_year, last_year + 1):
+        days = _year_days.get(year)
+        if days is None:
+            leap = calendar.isleap(year)
+            template = _year_templates.get(leap)
+            if template is None:
+                month_lengths = (31, 29 if leap else 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+                template = " ".join(MONTH_TEMPLATE[:length * 11 - 1].replace("MM", f"{month:02d}")
+                                    for month, length in enumerate(month_lengths, 1))
+                _year_templates[leap] = template
+            days = _year_days[year] = template.replace("YYYY", f"{year:04d}").split()
+        keys.extend(days)
+    return keys
+
+def pack_array(typecode, values):
+    packed = array.array(typecode, values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+def unpack_array(typecode, data, pos, count):
+    packed = array.array(typecode)
+    end = pos + count * packed.itemsize
+    packed.frombytes(data[pos:end])
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed, end
+
+def pack_ids(ids):
+    blob = "\0".join(ids).encode()
+    return SNAPSHOT_IDS.pack(len(ids), len(blob)) + blob
+
+def unpack_ids(data, pos):
+    count, size = SNAPSHOT_IDS.unpack_from(data, pos)
+    pos += SNAPSHOT_IDS.size
+    ids = data[pos:pos + size].decode().split("\0") if count else []
+    return ids, pos + size
+
+# Binary snapshot of state, for the snapshot store (see storage.py)
+def encode_snapshot(state, journal_seq=0):
+    parts = [SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, STATE_VERSION, journal_seq),
+             SNAPSHOT_SCALARS.pack(state.daily_xp, state.total_xp, state.multiplier, state.streak, state.high_score,
+                                   state.level, state.skill_points, state.study_streak,
+                                   get_day_number(state.date), get_day_number(state.last_study_date))]
+
+    days = sorted(state.xp_history.items())  # Day order
+    first_year = int(days[0][0][:4]) if days else 1
+    base = datetime.date(first_year, 1, 1).toordinal()
+    mask = bytearray(get_day_number(days[-1][0]) - base + 1 if days else 0)
+    for date in map(datetime.date.fromisoformat, state.xp_history):
+        mask[date.toordinal() - base] = 1
+    parts.append(SNAPSHOT_HISTORY.pack(first_year, len(mask), len(days)) + mask)
+    parts.append(pack_array("i", [xp for day, xp in days]))
+
+    parts.append(pack_ids(list(state.skills)))
+    parts.append(pack_array("i", state.skills.values()))
+    parts.append(pack_ids(list(state.achievements)))
+    parts.append(pack_array("i", [get_day_number(achievement.get("date", ""))
+                                  for achievement in state.achievements.values()]))
+
+    optional = {name: getattr(state, name) for name in OPTIONAL_FIELDS if hasattr(state, name)}
+    blob = json.dumps(optional, separators=(",", ":")).encode() if optional else b""
+    parts.append(SNAPSHOT_COUNT.pack(len(blob)) + blob)
+    return b"".join(parts)
+
+# State and journal sequence number from a binary snapshot; raises ValueError
+# if data isn't one this version can read
+def decode_snapshot(data):
+    if len(data) < SNAPSHOT_HEADER.size or data[:4] != SNAPSHOT_MAGIC:
+        raise ValueError("Not an XP state snapshot")
+    magic, version, journal_seq = SNAPSHOT_HEADER.unpack_from(data)
+    if version > STATE_VERSION:
+        raise ValueError(f"XP state snapshot version {version} is newer than this add-on")
+    try:
+        state = XPState()
+        pos = SNAPSHOT_HEADER.size
+        (state.daily_xp, state.total_xp, state.multiplier, state.streak, state.high_score, state.level,
+         state.skill_points, state.study_streak, date, last_study_date) = SNAPSHOT_SCALARS.unpack_from(data, pos)
+        state.date, state.last_study_date = get_day_key(date), get_day_key(last_study_date)
+        pos += SNAPSHOT_SCALARS.size
+
+        first_year, span, count = SNAPSHOT_HISTORY.unpack_from(data, pos)
+        pos += SNAPSHOT_HISTORY.size
+        mask = data[pos:pos + span]
+        xps, pos = unpack_array("i", data, pos + span, count)
+        if count:
+            last_year = datetime.date.fromordinal(datetime.date(first_year, 1, 1).toordinal() + span - 1).year
+            state.xp_history = dict(zip(itertools.compress(get_day_keys(first_year, last_year), mask), xps))
+            if len(state.xp_history) != count:
+                raise ValueError("Damaged XP state snapshot: history doesn't match its days")
+
+        skill_ids, pos = unpack_ids(data, pos)
+        levels, pos = unpack_array("i", data, pos, len(skill_ids))
+        state.skills = dict(zip(skill_ids, levels))
+        ach_ids, pos = unpack_ids(data, pos)
+        days, pos = unpack_array("i", data, pos, len(ach_ids))
+        state.achievements = {ach_id: {"earned": True, "date": get_day_key(day)} for ach_id, day in zip(ach_ids, days)}
+
+        size = SNAPSHOT_COUNT.unpack_from(data, pos)[0]
+        pos += SNAPSHOT_COUNT.size
+        if size:
+            for name, value in json.loads(data[pos:pos + size]).items():
+                if name in OPTIONAL_FIELDS:
+                    setattr(state, name, value)
+        if pos + size != len(data):
+            raise ValueError("Truncated XP state snapshot")
+    except (struct.error, IndexError, OverflowError) as e:
+        raise ValueError(f"Damaged XP state snapshot: {e}") from None
+    return state, journal_seq
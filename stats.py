@@ -0,0 +1,250 @@
+import datetime
+
+from .rules import calculate_level
+
+# Aggregates behind the stats dashboard, kept in xp_state["stats"] and brought
+# up to date from the state after every answer in constant time, so opening
+# the dashboard never walks the daily history:
+#
+#   "version": STATS_VERSION
+#   "day", "day_xp": the day being counted and the XP counted for it so far
+#   "week", "month": "YYYY-Www" and "YYYY-MM" keys of that day
+#   "recent": {"YYYY-MM-DD": xp}  the last ROLLING_DAYS days, oldest first
+#   "sum_7", "sum_30": XP of the last 7 and 30 days, today included
+#   "weekly": {"YYYY-Www": xp}, "monthly": {"YYYY-MM": xp}  the last few
+#             WEEKS_KEPT weeks and MONTHS_KEPT months
+#   "best_day", "best_week", "best_month": [key, xp] over finished periods
+#   "runs": [[first day, last day, days]]  the last RUNS_KEPT study runs
+#   "best_run": [first day, last day, days]  longest run of study days
+#   "best_card_streak": longest card streak seen
+#   "levels": [[period, level]]  when each level was first reached
+#
+# Days with XP above zero count as study days. The running day, week and month
+# are only compared with the bests once they're over; until then the
+# dashboard compares them live.
+
+STATS_VERSION = 1
+ROLLING_DAYS = 30
+WEEKS_KEPT = 104
+MONTHS_KEPT = 120
+RUNS_KEPT = 20
+
+def get_week(day):
+    year, week, weekday = datetime.date.fromisoformat(day).isocalendar()
+    return f"{year}-W{week:02d}"
+
+def get_previous_day(day):
+    return (datetime.date.fromisoformat(day) - datetime.timedelta(days=1)).isoformat()
+
+def empty_stats():
+    return {
+        "version": STATS_VERSION,
+        "day": "",
+        "day_xp": 0,
+        "week": "",
+        "month": "",
+        "recent": {},
+        "sum_7": 0,
+        "sum_30": 0,
+        "weekly": {},
+        "monthly": {},
+        "best_day": ["", 0],
+        "best_week": ["", 0],
+        "best_month": ["", 0],
+        "runs": [],
+        "best_run": ["", "", 0],
+        "best_card_streak": 0,
+        "levels": []
+    }
+
+# Add amount to a {period: xp} total, dropping the oldest periods past keep
+def add_to_period(totals, period, amount, keep):
+    if period in totals:
+        totals[period] += amount
+        return
+    totals[period] = amount
+    while len(totals) > keep:
+        del totals[next(iter(totals))]
+
+# Count amount of XP for the day being counted
+def add_xp(stats, amount):
+    stats["day_xp"] += amount
+    stats["recent"][stats["day"]] = stats["day_xp"]
+    stats["sum_7"] += amount
+    stats["sum_30"] += amount
+    add_to_period(stats["weekly"], stats["week"], amount, WEEKS_KEPT)
+    add_to_period(stats["monthly"], stats["month"], amount, MONTHS_KEPT)
+
+# Close the day being counted: bests and study runs
+def finish_day(stats):
+    day, day_xp = stats["day"], stats["day_xp"]
+    if day_xp > stats["best_day"][1]:
+        stats["best_day"] = [day, day_xp]
+    if day_xp > 0:
+        runs = stats["runs"]
+        if runs and runs[-1][1] == get_previous_day(day):
+            runs[-1] = [runs[-1][0], day, runs[-1][2] + 1]
+        else:
+            runs.append([day, day, 1])
+            del runs[:-RUNS_KEPT]
+        if runs[-1][2] > stats["best_run"][2]:
+            stats["best_run"] = list(runs[-1])
+
+# Move on to day: close the periods that ended and slide the rolling windows
+# (at most ROLLING_DAYS entries, once a day)
+def start_stats_day(stats, day):
+    if stats["day"]:
+        finish_day(stats)
+    week, month = get_week(day), day[:7]
+    if stats["week"] and week != stats["week"]:
+        week_xp = stats["weekly"].get(stats["week"], 0)
+        if week_xp > stats["best_week"][1]:
+            stats["best_week"] = [stats["week"], week_xp]
+    if stats["month"] and month != stats["month"]:
+        month_xp = stats["monthly"].get(stats["month"], 0)
+        if month_xp > stats["best_month"][1]:
+            stats["best_month"] = [stats["month"], month_xp]
+    stats["day"], stats["day_xp"], stats["week"], stats["month"] = day, 0, week, month
+
+    date = datetime.date.fromisoformat(day)
+    start_30 = (date - datetime.timedelta(days=ROLLING_DAYS - 1)).isoformat()
+    start_7 = (date - datetime.timedelta(days=6)).isoformat()
+    stats["recent"] = {recent_day: xp for recent_day, xp in stats["recent"].items() if start_30 <= recent_day <= day}
+    stats["sum_30"] = sum(stats["recent"].values())
+    stats["sum_7"] = sum(xp for recent_day, xp in stats["recent"].items() if recent_day >= start_7)
+
+# Bring stats up to date with state: XP earned (or taken back) since the last
+# call, a new day, a new level or card streak. Constant time, except once a day.
+def observe_stats(stats, state):
+    day = state["date"]
+    if not day:
+        return
+    if day != stats["day"]:
+        # The finished day's XP as it ended up in the history (answers
+        # replayed from the journal after a crash may not have been counted;
+        # days that ended at or below zero aren't kept)
+        if stats["day"] in state["xp_history"]:
+            add_xp(stats, state["xp_history"][stats["day"]] - stats["day_xp"])
+        elif stats["day"] and stats["day_xp"] < 0:
+            add_xp(stats, -stats["day_xp"])
+        start_stats_day(stats, day)
+    if state["daily_xp"] != stats["day_xp"]:
+        add_xp(stats, state["daily_xp"] - stats["day_xp"])
+    if state["streak"] > stats["best_card_streak"]:
+        stats["best_card_streak"] = state["streak"]
+    levels = stats["levels"]
+    level = levels[-1][1] if levels else 1
+    while level < state["level"]:
+        level += 1
+        levels.append([day, level])
+    # Level ups taken back by an undo
+    while levels and levels[-1][1] > state["level"]:
+        levels.pop()
+
+# Build stats from the whole history: days ({"YYYY-MM-DD": xp}, today
+# included) and archive (weekly and monthly totals of days no longer kept
+# per day). The best day and study runs come from history (a store's history
+# summary, see storage.summarize_days) if given, or are counted from days.
+# Used once to start counting, and after the history is replaced.
+def build_stats(days, archive, state, history=None):
+    stats = empty_stats()
+    today = state["date"]
+    if not today:
+        return stats
+    weekly, monthly = dict(archive.get("weekly", {})), dict(archive.get("monthly", {}))
+    for day in sorted(days):
+        if day >= today:
+            continue
+        weekly[get_week(day)] = weekly.get(get_week(day), 0) + days[day]
+        monthly[day[:7]] = monthly.get(day[:7], 0) + days[day]
+        if history is None:
+            stats["day"], stats["day_xp"] = day, days[day]
+            finish_day(stats)
+    if history is not None:
+        if history["best_day"]:
+            stats["best_day"] = list(history["best_day"])
+        stats["runs"] = [list(run) for run in reversed(history["streaks"])]
+        if history["best_streak"]:
+            stats["best_run"] = list(history["best_streak"])
+    best_week = max(((week, xp) for week, xp in weekly.items() if week != get_week(today)), key=lambda item: item[1], default=None)
+    if best_week and best_week[1] > 0:
+        stats["best_week"] = list(best_week)
+    best_month = max(((month, xp) for month, xp in monthly.items() if month != today[:7]), key=lambda item: item[1], default=None)
+    if best_month and best_month[1] > 0:
+        stats["best_month"] = list(best_month)
+    for week in sorted(weekly)[-WEEKS_KEPT:]:
+        stats["weekly"][week] = weekly[week]
+    for month in sorted(monthly)[-MONTHS_KEPT:]:
+        stats["monthly"][month] = monthly[month]
+
+    # Level progression from the running XP total, archived weeks first
+    # (achievement rewards aren't part of daily XP, so this is the level XP
+    # from answers alone would have given)
+    total_xp = 0
+    level = 1
+    periods = sorted(archive.get("weekly", {}).items())
+    periods.extend((day, days[day]) for day in sorted(days) if day < today)
+    for period, xp in periods:
+        total_xp += xp
+        new_level = min(calculate_level(total_xp)[0], state["level"])
+        while level < new_level:
+            level += 1
+            stats["levels"].append([period, level])
+
+    # Count today from scratch, on top of the days before it
+    stats["day"], stats["day_xp"] = "", 0
+    stats["recent"] = {day: days[day] for day in sorted(days)[-ROLLING_DAYS - 1:] if day < today}
+    start_stats_day(stats, today)
+    observe_stats(stats, state)
+    return stats
+
+# Keys of the count periods up to day, oldest first, for the charts
+def get_recent_days(day, count):
+    date = datetime.date.fromisoformat(day)
+    return [(date - datetime.timedelta(days=offset)).isoformat() for offset in range(count - 1, -1, -1)]
+
+def get_recent_weeks(day, count):
+    date = datetime.date.fromisoformat(day)
+    return [get_week((date - datetime.timedelta(weeks=offset)).isoformat()) for offset in range(count - 1, -1, -1)]
+
+def get_recent_months(day, count):
+    year, month = int(day[:4]), int(day[5:7])
+    months = []
+    for offset in range(count - 1, -1, -1):
+        index = year * 12 + month - 1 - offset
+        months.append(f"{index // 12:04d}-{index % 12 + 1:02d}")
+    return months
+
+# What the dashboard shows, from the aggregates alone: chart series as
+# [(period, xp)] and the bests with the running day, week and month counted
+def summarize_stats(stats, chart_days=ROLLING_DAYS, chart_weeks=12, chart_months=12):
+    day = stats["day"]
+    summary = {
+        "today": stats["day_xp"],
+        "sum_7": stats["sum_7"],
+        "sum_30": stats["sum_30"],
+        "average_7": stats["sum_7"] / 7,
+        "average_30": stats["sum_30"] / ROLLING_DAYS,
+        "best_card_streak": stats["best_card_streak"],
+        "levels": [tuple(entry) for entry in stats["levels"]],
+        "daily": [(period, stats["recent"].get(period, 0)) for period in get_recent_days(day, chart_days)],
+        "weekly": [(period, stats["weekly"].get(period, 0)) for period in get_recent_weeks(day, chart_weeks)],
+        "monthly": [(period, stats["monthly"].get(period, 0)) for period in get_recent_months(day, chart_months)]
+    }
+    for key, period, current_xp in (("best_day", day, stats["day_xp"]),
+                                    ("best_week", stats["week"], stats["weekly"].get(stats["week"], 0)),
+                                    ("best_month", stats["month"], stats["monthly"].get(stats["month"], 0))):
+        best = tuple(stats[key])
+        summary[key] = (period, current_xp) if current_xp > best[1] else best
+
+    # Study runs, with today extending or starting one
+    runs = [tuple(run) for run in stats["runs"]]
+    if stats["day_xp"] > 0:
+        if runs and runs[-1][1] == get_previous_day(day):
+            runs[-1] = (runs[-1][0], day, runs[-1][2] + 1)
+        else:
+            runs.append((day, day, 1))
+    summary["runs"] = runs[::-1]
+    best_run = tuple(stats["best_run"])
+    summary["best_run"] = runs[-1] if runs and runs[-1][2] > best_run[2] else best_run
+    return summary
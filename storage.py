@@ -0,0 +1,425 @@
+import os
+import copy
+import json
+import datetime
+import threading
+
+from .state import XPState, decode_snapshot, encode_snapshot
+
+# Get a cheap fingerprint of a file (None if it doesn't exist)
+def get_stamp(path):
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+# Write a file (text, or bytes) atomically: a crash leaves either the old or
+# the new contents
+def write_atomic(path, payload):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb" if isinstance(payload, bytes) else "w") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+# Append text to a file and make sure it reached the disk. A torn last line
+# (a crash mid-append) is ended first, so the new lines don't run on from it.
+def append_durable(path, text):
+    with open(path, "a+b") as f:
+        end = f.seek(0, os.SEEK_END)
+        if end:
+            f.seek(end - 1)
+            if f.read(1) != b"\n":
+                text = "\n" + text
+        f.write(text.encode())
+        f.flush()
+        os.fsync(f.fileno())
+
+# A state of its own made from defaults (a state or mapping), so loading
+# never changes the caller's state
+def fresh_state(defaults):
+    return XPState.from_dict(copy.deepcopy(dict(defaults.items())))
+
+# Encode an answer event as one journal line
+def journal_line(seq, timestamp, day, ease, earned_xp, multiplier, streak, achievements, reward_xp):
+    event = {"n": seq, "t": timestamp, "d": day, "e": ease, "xp": earned_xp, "m": multiplier, "s": streak}
+    if achievements:
+        event["a"] = achievements
+        event["r"] = reward_xp
+    return json.dumps(event, separators=(",", ":")) + "\n"
+
+# Encode a taken-back answer (an AnswerDelta, see rules.py) as one journal
+# line: the answer's XP and rewards negated, the multiplier and streak it
+# restored, and the achievements it lost
+def undo_line(seq, timestamp, delta):
+    event = {"n": seq, "t": timestamp, "d": delta.day, "u": delta.ease, "xp": -delta.xp,
+             "m": delta.multiplier, "s": delta.streak}
+    if delta.achievement_ids:
+        event["x"] = list(delta.achievement_ids)
+        event["r"] = -delta.reward_xp
+    return json.dumps(event, separators=(",", ":")) + "\n"
+
+# Apply the journal events newer than after_seq to state, returning the last
+# sequence number seen. A torn final line from a crash mid-append is skipped.
+def replay_journal(state, path, after_seq):
+    last_seq = after_seq
+    if not os.path.exists(path):
+        return last_seq
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if event["n"] <= last_seq:
+                continue
+            state["daily_xp"] += event["xp"]
+            state["total_xp"] += event["xp"] + event.get("r", 0)
+            state["multiplier"] = event["m"]
+            state["streak"] = event["s"]
+            # The stats' longest card streak can be reached between snapshots
+            stats = state.get("stats")
+            if stats and event["s"] > stats.get("best_card_streak", 0):
+                stats["best_card_streak"] = event["s"]
+            for ach_id in event.get("a", []):
+                state["achievements"][ach_id] = {"earned": True, "date": event["d"]}
+            for ach_id in event.get("x", []):
+                state["achievements"].pop(ach_id, None)
+            last_seq = event["n"]
+    return last_seq
+
+# Move days before cutoff_day out of a {"YYYY-MM-DD": xp} history, returning them
+def take_old_history(history, cutoff_day):
+    old_days = {day: xp for day, xp in history.items() if day < cutoff_day}
+    for day in old_days:
+        del history[day]
+    return old_days
+
+# Empty long-term history: weekly and monthly XP totals for days that have
+# left the daily history, plus the last day folded in
+def empty_history_archive():
+    return {
+        "through": "",
+        "weekly": {},  # Format: {"YYYY-Www": xp}
+        "monthly": {}  # Format: {"YYYY-MM": xp}
+    }
+
+# Fold days into archive totals. Days up to "through" are already counted, so
+# folding the same days in twice (e.g. after a crash) doesn't double them.
+def add_to_history_archive(archive, days):
+    for day in sorted(days):
+        if day <= archive["through"]:
+            continue
+        year, week, weekday = datetime.date.fromisoformat(day).isocalendar()
+        week_key = f"{year}-W{week:02d}"
+        archive["weekly"][week_key] = archive["weekly"].get(week_key, 0) + days[day]
+        archive["monthly"][day[:7]] = archive["monthly"].get(day[:7], 0) + days[day]
+        archive["through"] = day
+    return archive
+
+# Load the long-term history archive (only needed for stats)
+def load_history_archive(path):
+    if not os.path.exists(path):
+        return empty_history_archive()
+    with open(path, "r") as f:
+        return json.load(f)
+
+# Fold days into the archive file
+def merge_history_archive(path, days):
+    archive = add_to_history_archive(load_history_archive(path), days)
+    write_atomic(path, json.dumps(archive))
+
+# Summarize a {"YYYY-MM-DD": xp} daily history for the stats view: average
+# over the last 30 calendar days up to today, and over the study days (XP above
+# zero) before today the best day, the last runs_kept runs of consecutive
+# study days (newest first) and the longest run. Ties go to the earliest.
+def summarize_days(days, today, runs_kept=5):
+    summary = {"best_day": None, "average_30": 0, "streaks": [], "best_streak": None}
+    start = (datetime.date.fromisoformat(today) - datetime.timedelta(days=29)).isoformat()
+    summary["average_30"] = sum(xp for day, xp in days.items() if start <= day <= today) / 30
+    study_days = sorted(day for day, xp in days.items() if day < today and xp > 0)
+    if not study_days:
+        return summary
+    best = max(study_days, key=days.get)
+    summary["best_day"] = (best, days[best])
+    
+    # Runs of consecutive study days
+    runs = []
+    run_start = previous = None
+    for day in study_days:
+        date = datetime.date.fromisoformat(day)
+        if previous is None or date - previous != datetime.timedelta(days=1):
+            if run_start is not None:
+                runs.append((run_start.isoformat(), previous.isoformat(), (previous - run_start).days + 1))
+            run_start = date
+        previous = date
+    runs.append((run_start.isoformat(), previous.isoformat(), (previous - run_start).days + 1))
+    summary["best_streak"] = max(runs, key=lambda run: run[2])
+    summary["streaks"] = runs[:-runs_kept - 1:-1]
+    return summary
+
+# State kept in xp_data.json (a snapshot) plus xp_data.journal (answers since
+# the snapshot), with older history in xp_history_archive.json. All writes go
+# through the background writer.
+class JsonStore:
+    def __init__(self, writer, state_path, journal_path, archive_path, compact_every):
+        self.writer = writer
+        self.state_path = state_path
+        self.journal_path = journal_path
+        self.archive_path = archive_path
+        self.compact_every = compact_every  # Journal entries before they're folded into a snapshot
+        self.stamp = None  # (mtime_ns, size) of the snapshot when last loaded
+        self.journal_buffer = []  # Journal lines not yet handed to the writer
+        self.journal_seq = 0  # Sequence number of the last journaled answer
+        self.snapshot_seq = 0  # Sequence number covered by the last snapshot
+        self.snapshot_dirty = False  # State changed outside of an answer
+    
+    # Load the snapshot and replay the journal onto it. Fields missing from
+    # the file are taken from defaults, which are also what the journal is
+    # replayed onto when there is no snapshot yet. defaults isn't changed.
+    def load(self, defaults):
+        self.stamp = get_stamp(self.state_path)
+        defaults = fresh_state(defaults)
+        state = defaults
+        snapshot_seq = 0
+        if os.path.exists(self.state_path):
+            state, snapshot_seq = self.read_snapshot(self.state_path, defaults)
+        
+        # Replay answers journaled since the snapshot
+        self.snapshot_seq = snapshot_seq
+        self.journal_seq = replay_journal(state, self.journal_path, snapshot_seq)
+        return state
+    
+    # (state, journal sequence number) from the snapshot at path
+    def read_snapshot(self, path, defaults):
+        with open(path, "r") as f:
+            data = json.load(f)
+        snapshot_seq = data.pop("journal_seq", 0)
+        return XPState.from_dict(data, defaults), snapshot_seq
+    
+    # Snapshot file contents for state
+    def encode_snapshot(self, state):
+        snapshot = state.to_dict()
+        snapshot["journal_seq"] = self.journal_seq
+        return json.dumps(snapshot)
+    
+    # Move an unreadable snapshot aside so it isn't overwritten
+    def quarantine(self):
+        try:
+            if os.path.exists(self.state_path):
+                os.replace(self.state_path, self.state_path + ".corrupt")
+        except OSError:
+            pass
+    
+    # Nothing is held open between writes
+    def close(self):
+        pass
+    
+    # True unless the snapshot was changed by someone else since we loaded it
+    def is_current(self):
+        # Our own pending or finished writes don't count as outside changes
+        if self.snapshot_dirty or self.writer.is_pending(self.state_path):
+            return True
+        stamp = get_stamp(self.state_path)
+        return stamp == self.stamp or stamp == self.writer.written_stamp(self.state_path)
+    
+    # Record an answer in the journal (handed to the writer on flush)
+    def record_answer(self, state, ease, earned_xp, achievement_ids, reward_xp, timestamp):
+        self.journal_seq += 1
+        self.journal_buffer.append(journal_line(self.journal_seq, timestamp, state["date"], ease, earned_xp,
+                                                state["multiplier"], state["streak"], achievement_ids, reward_xp))
+    
+    # Record a taken-back answer in the journal, like record_answer
+    def record_undo(self, state, delta, timestamp):
+        self.journal_seq += 1
+        self.journal_buffer.append(undo_line(self.journal_seq, timestamp, delta))
+    
+    # Answers recorded since the last flush
+    def pending_answers(self):
+        return len(self.journal_buffer)
+    
+    # State changed outside of an answer; the next flush writes a snapshot
+    def mark_dirty(self):
+        self.snapshot_dirty = True
+    
+    # Hand pending changes to the writer, compacting the journal into a
+    # snapshot when asked or when it has grown long enough
+    def flush(self, state, compact=False):
+        journal_length = self.journal_seq - self.snapshot_seq
+        if journal_length and (compact or journal_length >= self.compact_every):
+            self.snapshot_dirty = True
+        if self.snapshot_dirty:
+            # Snapshot already includes everything buffered for the journal
+            self.writer.replace(self.state_path, self.encode_snapshot(state), self.journal_path)
+            self.snapshot_seq = self.journal_seq
+            self.snapshot_dirty = False
+            self.journal_buffer.clear()
+        elif self.journal_buffer:
+            self.writer.append(self.journal_path, "".join(self.journal_buffer))
+            self.journal_buffer.clear()
+    
+    # Fold days that left the daily history into the archive
+    def archive_days(self, days):
+        self.writer.call(self.archive_path, merge_history_archive, self.archive_path, days)
+    
+    # Replace the archive with the given days (after a reset or rebuild)
+    def replace_archive(self, days):
+        archive = add_to_history_archive(empty_history_archive(), days)
+        self.writer.replace(self.archive_path, json.dumps(archive))
+    
+    # History for the stats view and the stats aggregates' bests and runs:
+    # monthly totals (archive plus recent days) and a summary of the recent
+    # daily history including today (see summarize_days)
+    def get_history(self, state, runs_kept=5):
+        self.writer.wait()
+        monthly_xp = dict(load_history_archive(self.archive_path)["monthly"])
+        days = dict(state["xp_history"])
+        if state["daily_xp"] > 0:
+            days[state["date"]] = state["daily_xp"]
+        for day, day_xp in days.items():
+            monthly_xp[day[:7]] = monthly_xp.get(day[:7], 0) + day_xp
+        history = summarize_days(days, state["date"], runs_kept)
+        history["monthly"] = monthly_xp
+        return history
+
+    # The whole history, to start the stats aggregates from: the days still
+    # kept per day (today included) and the archive's weekly and monthly totals
+    def get_stats_history(self, state):
+        self.writer.wait()
+        days = dict(state["xp_history"])
+        days[state["date"]] = state["daily_xp"]
+        return days, load_history_archive(self.archive_path)
+
+# JsonStore with the snapshot in the binary format (xp_data.snap, see
+# state.py): a fraction of the size, and faster to load and write with years
+# of daily history. The journal and archive are the same files. An existing
+# JSON snapshot is loaded the first time and renamed with a .migrated suffix
+# once the binary one has been written.
+class SnapshotStore(JsonStore):
+    def __init__(self, writer, state_path, journal_path, archive_path, compact_every, legacy_path=None):
+        super(SnapshotStore, self).__init__(writer, state_path, journal_path, archive_path, compact_every)
+        self.legacy_path = legacy_path  # JSON snapshot to migrate from
+        self.migrating = False
+    
+    def load(self, defaults):
+        if not os.path.exists(self.state_path) and self.legacy_path and os.path.exists(self.legacy_path):
+            state, snapshot_seq = JsonStore.read_snapshot(self, self.legacy_path, fresh_state(defaults))
+            self.stamp = None
+            self.snapshot_seq = snapshot_seq
+            self.journal_seq = replay_journal(state, self.journal_path, snapshot_seq)
+            self.migrating = self.snapshot_dirty = True
+            return state
+        return super(SnapshotStore, self).load(defaults)
+    
+    def read_snapshot(self, path, defaults):
+        with open(path, "rb") as f:
+            state, snapshot_seq = decode_snapshot(f.read())
+        for name in defaults.keys():
+            if name not in state:
+                state[name] = defaults[name]
+        return state, snapshot_seq
+    
+    def encode_snapshot(self, state):
+        return encode_snapshot(state, self.journal_seq)
+    
+    def flush(self, state, compact=False):
+        super(SnapshotStore, self).flush(state, compact)
+        # A newer snapshot can take the queued one's place behind this, so
+        # it's queued again on every flush until the JSON one is gone
+        if self.migrating and not self.snapshot_dirty:
+            if os.path.exists(self.legacy_path):
+                self.writer.call(self.legacy_path, finish_snapshot_migration, self.state_path, self.legacy_path)
+            else:
+                self.migrating = False
+
+# Retire the JSON snapshot, once the binary one that replaces it is on disk
+def finish_snapshot_migration(state_path, legacy_path):
+    if os.path.exists(state_path) and os.path.exists(legacy_path):
+        os.replace(legacy_path, legacy_path + ".migrated")
+        print("XP Add-on: Migrated xp_data.json to xp_data.snap")
+
+# Background writer: takes serialized payloads from the main thread and writes
+# them to disk on its own thread, in submission order. A new snapshot replaces
+# any queued snapshot and journal appends it already covers, so a burst of
+# saves while a slow disk is busy collapses into a single write.
+class StateWriter:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._ops = []  # Format: [(kind, path, payload, extra)]
+        self._stamps = {}  # Format: {path: stamp after our last write}
+        self._busy = False
+        self._thread = None
+
+    # Queue journal text to be appended to path
+    def append(self, path, text):
+        with self._cond:
+            if self._ops and self._ops[-1][0] == "append" and self._ops[-1][1] == path:
+                self._ops[-1] = ("append", path, self._ops[-1][2] + text, None)
+            else:
+                self._ops.append(("append", path, text, None))
+            self._wake()
+
+    # Queue fn(*args) to run on the writer thread, for read-modify-write updates
+    # of path that must stay in order with other writes
+    def call(self, path, fn, *args):
+        with self._cond:
+            self._ops.append(("call", path, fn, args))
+            self._wake()
+
+    # Queue an atomic snapshot of path; journal_path is emptied once it lands
+    def replace(self, path, payload, journal_path=None):
+        with self._cond:
+            self._ops = [op for op in self._ops if op[1] not in (path, journal_path)]
+            self._ops.append(("replace", path, payload, journal_path))
+            self._wake()
+
+    def _wake(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="xp-writer", daemon=True)
+            self._thread.start()
+        self._cond.notify_all()
+
+    # True while a write to path is queued or in progress
+    def is_pending(self, path):
+        with self._cond:
+            return self._busy or any(op[1] == path for op in self._ops)
+
+    # Stamp of the file as we last wrote it
+    def written_stamp(self, path):
+        with self._cond:
+            return self._stamps.get(path)
+
+    # Block until every queued write has reached the disk
+    def wait(self, timeout=None):
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._ops and not self._busy, timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._ops)
+                ops = self._ops
+                self._ops = []
+                self._busy = True
+            stamps = {}
+            for kind, path, payload, extra in ops:
+                try:
+                    if kind == "append":
+                        append_durable(path, payload)
+                    elif kind == "call":
+                        payload(*extra)
+                    else:
+                        write_atomic(path, payload)
+                        stamps[path] = get_stamp(path)
+                        # Events up to the snapshot's sequence number are now
+                        # part of it; replay skips them even if this fails
+                        if extra:
+                            open(extra, "w").close()
+                except Exception as e:
+                    print(f"Error saving state: {str(e)}")
+            with self._cond:
+                self._stamps.update(stamps)
+                self._busy = False
+                self._cond.notify_all()
@@ -0,0 +1,56 @@
+import os
+import sys
+import json
+import random
+import datetime
+import importlib
+
+import pytest
+
+# The add-on is a package named after its folder (Anki loads add-ons by
+# folder name), so the tests import it from the folder's parent. Importing
+# it outside Anki leaves the Qt side (ui.py) out.
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(ADDON_DIR))
+ADDON = os.path.basename(ADDON_DIR)
+
+def load(name):
+    return importlib.import_module(f"{ADDON}.{name}")
+
+@pytest.fixture
+def rules():
+    return load("rules")
+
+# The XP core pointed at an empty data folder of its own, with the JSON store
+@pytest.fixture
+def core(tmp_path):
+    core = load("core")
+    core.STORAGE_BACKEND = "json"
+    core.set_device_id("test")
+    core.set_data_dir(str(tmp_path))
+    yield core
+    core.stop_leaderboard()
+    core.flush_state_now()
+    core.STORAGE_BACKEND = "json"
+
+# Answer cards with eases the way the reviewer hook does: the answer, then the
+# deferred consumers once per burst
+def answer(core, eases):
+    for ease in eases:
+        if core.queue_answer(ease):
+            core.run_deferred_consumers()
+
+# Write a legacy state last studied yesterday, with years days of history
+def write_state(core, years, seed):
+    rng = random.Random(seed)
+    yesterday = datetime.date.fromisoformat(core.get_today()) - datetime.timedelta(days=1)
+    history = {(yesterday - datetime.timedelta(days=offset)).isoformat(): rng.randint(100, 999)
+               for offset in range(1, years * 365) if rng.random() < 0.8}
+    state = core.default_state().to_dict()
+    state.update(date=yesterday.isoformat(), last_study_date=yesterday.isoformat(), daily_xp=500,
+                 total_xp=sum(history.values()) + 500, xp_history=history)
+    state["level"] = core.calculate_level(state["total_xp"])[0]
+    with open(core.get_file_path(), "w") as f:
+        json.dump(state, f)
+    history[yesterday.isoformat()] = 500
+    return history
@@ -0,0 +1,73 @@
+import random
+
+# Every unearned achievement whose requirement state meets, found by parsing
+# each requirement string and checking it on its own
+def reference_met(rules, achievements, state, earned):
+    met = set()
+    for ach_id, achievement in achievements.items():
+        if ach_id in earned:
+            continue
+        requirement = achievement["requirement"]
+        if requirement == "has_maxed_skill == True":
+            value, threshold = rules.get_achievement_value(state, "has_maxed_skill"), True
+        else:
+            field, value = requirement.split(">=")
+            value, threshold = rules.get_achievement_value(state, field.strip()), float(value)
+        if value >= threshold:
+            met.add(ach_id)
+    return met
+
+def custom_achievements(rules, count, rng):
+    achievements = dict(rules.ACHIEVEMENTS)
+    limits = {"level": 40, "streak": 60, "multiplier": 5.0, "daily_xp": 3000, "study_streak": 30,
+              "total_skills_unlocked": len(rules.SKILL_TREE)}
+    for i in range(count):
+        field = rng.choice(sorted(limits))
+        if field == "multiplier":
+            threshold = f"{rng.uniform(1, limits[field]):.1f}"
+        else:
+            threshold = rng.randint(1, limits[field])
+        achievements[f"custom_{i}"] = {"requirement": f"{field} >= {threshold}", "reward_xp": 10}
+    achievements["custom_maxed"] = {"requirement": "has_maxed_skill == True", "reward_xp": 10}
+    return achievements
+
+# Checking only the fields a step changed earns the same achievements, at the
+# same step, as checking every achievement after every step
+def test_incremental_checks_match_full_scan(rules):
+    rng = random.Random(5)
+    achievements = custom_achievements(rules, 300, rng)
+    index = rules.AchievementIndex(achievements)
+    state = rules.default_state().to_dict()
+    index.rebuild(state)
+    earned = set()
+    for step in range(3000):
+        changed = rng.sample(["level", "streak", "multiplier", "daily_xp", "study_streak", "skills"], rng.randint(1, 3))
+        for field in changed:
+            if field == "skills":
+                skill_id = rng.choice(sorted(rules.SKILL_TREE))
+                state["skills"][skill_id] = min(state["skills"].get(skill_id, 0) + 1,
+                                                rules.SKILL_TREE[skill_id]["max_level"])
+            elif field == "multiplier":
+                state["multiplier"] = 1.0 if rng.random() < 0.1 else min(5.0, state["multiplier"] + 0.1)
+            elif field == "level":
+                state["level"] += 1 if rng.random() < 0.2 else 0
+            else:
+                state[field] = 0 if rng.random() < 0.05 else state[field] + rng.randint(1, 3)
+        expected = reference_met(rules, achievements, state, earned)
+        found = index.check(state, changed)
+        assert sorted(found) == sorted(expected), step
+        earned.update(found)
+    assert len(earned) > len(achievements) // 2
+    assert index.check(state) == []
+
+# Earned achievements leave the index; restored ones come back
+def test_earned_achievements_leave_index(rules):
+    index = rules.AchievementIndex(rules.ACHIEVEMENTS)
+    state = rules.default_state().to_dict()
+    state["achievements"] = {"novice": {"earned": True, "date": "2026-01-01"}}
+    index.rebuild(state)
+    state["level"] = 12
+    assert index.check(state, ["level"]) == ["intermediate"]
+    assert "level" in index.pending
+    index.restore(["novice", "intermediate"])
+    assert index.check(state, ["level"]) == ["novice", "intermediate"]
@@ -0,0 +1,52 @@
+import os
+import json
+import datetime
+
+from conftest import load, write_state
+
+# Days past the daily window move to the archive on rollover, with their
+# weekly and monthly totals intact
+def test_rollover_archives_old_days(core):
+    history = write_state(core, 3, 8)
+    core.ensure_state()
+    core.flush_state_now()
+
+    cutoff = core.get_history_cutoff()
+    kept = core.xp_state["xp_history"]
+    assert kept == {day: xp for day, xp in history.items() if day >= cutoff}
+    assert len(kept) <= core.HISTORY_DAILY_DAYS
+
+    weekly, monthly = {}, {}
+    for day, xp in history.items():
+        if day < cutoff:
+            year, week, weekday = datetime.date.fromisoformat(day).isocalendar()
+            weekly[f"{year}-W{week:02d}"] = weekly.get(f"{year}-W{week:02d}", 0) + xp
+            monthly[day[:7]] = monthly.get(day[:7], 0) + xp
+    with open(core.get_archive_path()) as f:
+        archive = json.load(f)
+    assert archive["weekly"] == weekly
+    assert archive["monthly"] == monthly
+
+# The state file stops growing with the history: past the daily window and
+# the stats' kept weeks and months, more years don't add to it
+def test_state_file_bounded(core, tmp_path):
+    sizes = []
+    for years in (11, 15):
+        data_dir = tmp_path / f"years_{years}"
+        data_dir.mkdir()
+        core.set_data_dir(str(data_dir))
+        write_state(core, years, 9)
+        core.ensure_state()
+        core.flush_state_now()
+        sizes.append(os.path.getsize(core.get_file_path()))
+    assert abs(sizes[0] - sizes[1]) < 0.05 * sizes[0]
+
+# Folding the same days in twice (e.g. after a crash) doesn't double them
+def test_archive_fold_is_idempotent():
+    storage = load("storage")
+    days = {"2025-12-30": 100, "2025-12-31": 200, "2026-01-01": 300}
+    archive = storage.add_to_history_archive(storage.empty_history_archive(), days)
+    assert archive["weekly"] == {"2026-W01": 600}
+    assert archive["monthly"] == {"2025-12": 300, "2026-01": 300}
+    assert storage.add_to_history_archive(archive, days) == {
+        "through": "2026-01-01", "weekly": {"2026-W01": 600}, "monthly": {"2025-12": 300, "2026-01": 300}}
@@ -0,0 +1,43 @@
+import random
+
+from conftest import load
+
+# Random answers, and XP taken back, over more decks than are tracked: the
+# dropped decks' totals fold into "other", and the top decks heap always
+# agrees with sorting the tracked decks
+def test_deck_cap_and_top_decks(monkeypatch):
+    breakdown_module = load("breakdown")
+    monkeypatch.setattr(breakdown_module, "MAX_DECKS", 30)
+    monkeypatch.setattr(breakdown_module, "MAX_NOTE_TYPES", 5)
+    breakdown = breakdown_module.empty_breakdown()
+    rng = random.Random(25)
+    last_answered = {}
+    total_xp = answers = 0
+    for step in range(4000):
+        deck_id = rng.randint(1, 20) if rng.random() < 0.8 else rng.randint(21, 80)
+        xp = rng.randint(1, 60)
+        if rng.random() < 0.2:
+            xp, count = -3 * xp, -1
+        else:
+            count = 1
+        breakdown_module.attribute_answer(breakdown, "2026-01-01", deck_id, deck_id % 9, xp, count)
+        last_answered[str(deck_id)] = step
+        total_xp += xp
+        answers += count
+
+        decks = breakdown["decks"]
+        assert len(decks) <= 30 and len(breakdown["note_types"]) <= 5
+        if step % 7 == 0:
+            recent = sorted(last_answered, key=last_answered.get)[-30:]
+            assert list(decks) == recent
+            for name in ("decks", "note_types"):
+                tracked = breakdown[name].values()
+                other = breakdown["other_" + name]
+                assert sum(entry["xp"] for entry in tracked) + other["xp"] == total_xp
+                assert sum(entry["answers"] for entry in tracked) + other["answers"] == answers
+
+            top = breakdown_module.get_top_decks(breakdown)
+            expected = sorted(((deck["xp"], deck_id) for deck_id, deck in decks.items()), reverse=True)[:10]
+            assert [xp for deck_id, xp in top] == [xp for xp, deck_id in expected]
+            assert all(decks[deck_id]["xp"] == xp for deck_id, xp in top)
+    assert breakdown["other_decks"]["answers"] > 0
@@ -0,0 +1,65 @@
+import datetime
+
+from conftest import answer
+
+def set_today(core, monkeypatch, day):
+    monkeypatch.setattr(core, "get_today", lambda: day)
+    monkeypatch.setattr(core, "_today", day)
+    monkeypatch.setattr(core, "_yesterday", (datetime.date.fromisoformat(day) - datetime.timedelta(days=1)).isoformat())
+
+def test_day_does_not_move_back(core, monkeypatch):
+    answer(core, [4] * 10)
+    state = core.xp_state
+    day = state["date"]
+    before = (state["daily_xp"], state["multiplier"], state["streak"], state["study_streak"], dict(state["xp_history"]))
+
+    earlier = (datetime.date.fromisoformat(day) - datetime.timedelta(days=1)).isoformat()
+    set_today(core, monkeypatch, earlier)
+    core.start_day()
+    assert state["date"] == day
+    assert (state["daily_xp"], state["multiplier"], state["streak"], state["study_streak"], dict(state["xp_history"])) == before
+
+    # Back on the state's day nothing rolls over either
+    set_today(core, monkeypatch, day)
+    core.start_day()
+    assert state["date"] == day
+    assert state["daily_xp"] == before[0]
+
+    # A later day does
+    later = (datetime.date.fromisoformat(day) + datetime.timedelta(days=1)).isoformat()
+    set_today(core, monkeypatch, later)
+    core.start_day()
+    assert state["date"] == later
+    assert state["xp_history"][day] == before[0]
+    assert state["study_streak"] == before[3] + 1
+
+def test_roll_over_day_keeps_a_later_day(rules):
+    state = {"date": "2026-03-02", "daily_xp": 50, "high_score": 0, "multiplier": 2.0, "streak": 3,
+             "last_study_date": "2026-03-02", "xp_history": {}}
+    assert rules.roll_over_day(state, "2026-03-01") is None
+    assert state["date"] == "2026-03-02" and state["daily_xp"] == 50
+
+# While the clock is behind the state's day, what answers earn is dated with
+# the state's day
+def test_events_dated_with_study_day(core, monkeypatch):
+    answer(core, [3])
+    day = core.xp_state["date"]
+    set_today(core, monkeypatch, (datetime.date.fromisoformat(day) - datetime.timedelta(days=1)).isoformat())
+    core.start_day()
+    answer(core, [4] * 12)
+    assert core.xp_state["achievements"]
+    assert {achievement["date"] for achievement in core.xp_state["achievements"].values()} == {day}
+
+# SQLite loads the days before the state's study day, however long ago that was
+def test_sqlite_loads_history_before_state_day(core, tmp_path, monkeypatch):
+    monkeypatch.setattr(core, "STORAGE_BACKEND", "sqlite")
+    core.set_data_dir(str(tmp_path))
+    day = datetime.date.fromisoformat(core.get_today()) - datetime.timedelta(days=400)
+    history = {(day - datetime.timedelta(days=offset)).isoformat(): 100 for offset in range(1, 30)}
+    store = core.create_store()
+    state = core.default_state(day.isoformat())
+    state["xp_history"] = history
+    store.flush(state)
+    loaded = store.load(core.default_state())
+    store.close()
+    assert loaded["xp_history"] == history
@@ -0,0 +1,86 @@
+import asyncio
+import pytest
+
+from conftest import load
+
+def test_retried_batch_is_stored_once():
+    server = load("leaderboard_server").LeaderboardServer()
+    upload = {"cohort": "c", "user": "u", "name": "U", "batch": "b1",
+              "events": [{"t": 0, "d": "2026-01-01", "xp": 10}, {"t": 1, "d": "2026-01-01", "xp": 5}]}
+    assert server.add_events(upload) == {"accepted": 2}
+    assert server.add_events(upload)["accepted"] == 0
+    assert server.add_events(dict(upload, batch="b2"))["accepted"] == 2
+    assert server.get_leaderboard("c")["entries"][0]["xp"] == 30
+    assert server.duplicates == 1
+
+def test_upload_to_local_server():
+    leaderboard = load("leaderboard")
+    server = load("leaderboard_server").LeaderboardServer()
+    port = server.start()
+    client = leaderboard.LeaderboardClient(f"http://127.0.0.1:{port}", "c", "u", "U")
+    try:
+        client.start()
+        for xp in range(1, 11):
+            client.record("2026-01-01", xp)
+        client.stop(timeout=10)
+    finally:
+        server.stop()
+    assert client.get_status()["uploaded"] == 10
+    assert server.get_leaderboard("c")["entries"] == [{"user": "u", "name": "U", "xp": 55, "today": 55}]
+
+def test_url_schemes():
+    leaderboard = load("leaderboard")
+    client = leaderboard.LeaderboardClient("https://example.com/xp", "c", "u")
+    assert (client.host, client.port, client.use_ssl, client.base_path) == ("example.com", 443, True, "/xp")
+    client = leaderboard.LeaderboardClient("http://example.com", "c", "u")
+    assert (client.port, client.use_ssl) == (80, False)
+    with pytest.raises(ValueError):
+        leaderboard.LeaderboardClient("ftp://example.com", "c", "u")
+
+def test_only_2xx_is_success():
+    leaderboard = load("leaderboard")
+    server = load("leaderboard_server").LeaderboardServer()
+    server.route = lambda method, target, body: (302, {"location": "/elsewhere"})
+    port = server.start()
+
+    async def post():
+        pool = leaderboard.ConnectionPool("127.0.0.1", port)
+        try:
+            await pool.request("POST", "/events", {"events": []})
+        finally:
+            await pool.close()
+    try:
+        with pytest.raises(leaderboard.HttpError):
+            asyncio.run(post())
+    finally:
+        server.stop()
+
+def test_status_of_running_client(core):
+    server = load("leaderboard_server").LeaderboardServer()
+    port = server.start()
+    try:
+        assert core.get_leaderboard_status() is None
+        core.start_leaderboard(f"http://127.0.0.1:{port}", "c", "U")
+        assert core.get_leaderboard_status()["queued"] == 0
+    finally:
+        core.stop_leaderboard()
+        server.stop()
+
+# The leaderboard view with a running client (needs Anki's aqt)
+def test_show_leaderboard(core, monkeypatch):
+    pytest.importorskip("aqt")
+    ui = load("ui")
+    shown = []
+    monkeypatch.setattr(ui, "start_addon", lambda *args: None)
+    monkeypatch.setattr(ui, "showInfo", lambda text, **kwargs: shown.append(text))
+    monkeypatch.setattr(ui, "LEADERBOARD_COHORT", "<c>")
+    server = load("leaderboard_server").LeaderboardServer()
+    port = server.start()
+    try:
+        core.start_leaderboard(f"http://127.0.0.1:{port}", "<c>", "U")
+        ui.show_leaderboard(refresh=False)
+    finally:
+        core.stop_leaderboard()
+        server.stop()
+    assert "&lt;c&gt; Leaderboard" in shown[0]
+    assert "Uploaded 0 answers, 0 waiting." in shown[0]
@@ -0,0 +1,46 @@
+import random
+
+# calculate_level looks levels up in a threshold table; this is the loop it
+# replaced, kept as the reference its results must match
+def reference_calculate_level(rules, xp):
+    level = 1
+    xp_required = rules.BASE_XP_FOR_LEVEL
+    xp_for_next_level = xp_required
+
+    while xp >= xp_for_next_level and level < rules.MAX_LEVEL:
+        level += 1
+        xp_required = int(rules.BASE_XP_FOR_LEVEL * (rules.LEVEL_FACTOR ** (level - 1)))
+        xp_for_next_level += xp_required
+
+    if level < rules.MAX_LEVEL:
+        next_level_xp = int(rules.BASE_XP_FOR_LEVEL * (rules.LEVEL_FACTOR ** level))
+        current_level_total = xp_for_next_level - next_level_xp
+        progress = ((xp - current_level_total) / next_level_xp) * 100
+        progress = min(100, max(0, progress))
+    else:
+        progress = 100
+
+    return level, int(progress), xp_for_next_level - xp
+
+def assert_parity(rules, values):
+    mismatches = [xp for xp in values if rules.calculate_level(xp) != reference_calculate_level(rules, xp)]
+    assert mismatches[:10] == []
+
+def test_thresholds(rules):
+    values = []
+    for threshold in rules.level_thresholds:
+        values.extend((threshold - 1, threshold, threshold + 1, threshold - 0.5, threshold + 0.5))
+    assert_parity(rules, values)
+
+def test_low_range(rules):
+    assert_parity(rules, range(-1000, 200001))
+
+def test_random_values(rules):
+    rng = random.Random(0)
+    top = rules.level_thresholds[-1] * 2
+    values = [rng.randint(-1000, int(top)) for _ in range(20000)]
+    values += [rng.uniform(-1000, top) for _ in range(20000)]
+    assert_parity(rules, values)
+
+def test_max_level(rules):
+    assert rules.calculate_level(rules.level_thresholds[-1] * 10)[0] == rules.MAX_LEVEL
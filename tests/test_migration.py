@@ -0,0 +1,41 @@
+import os
+
+from conftest import answer, write_state
+
+def strip(state):
+    state = state.to_dict()
+    state.pop("sync")
+    return state
+
+# Switching to the SQLite store copies the JSON snapshot, the journal and the
+# history archive into the database once, and the state loads back the same
+def test_json_to_sqlite_round_trip(core, tmp_path, monkeypatch):
+    write_state(core, 2, 10)
+    core.ensure_state()
+    core.flush_state_now()
+    answer(core, [4, 3, 3, 2, 1] * 10)
+    core.flush_state(wait=True)
+    assert os.path.getsize(core.get_journal_path()) > 0
+    live = strip(core.xp_state)
+    days, archive = core._store.get_stats_history(core.xp_state)
+    legacy_paths = [core.get_file_path(), core.get_journal_path(), core.get_archive_path()]
+
+    monkeypatch.setattr(core, "STORAGE_BACKEND", "sqlite")
+    core.set_data_dir(str(tmp_path))
+    core.ensure_state()
+    assert strip(core.xp_state) == live
+    for path in legacy_paths:
+        assert not os.path.exists(path)
+        assert os.path.exists(path + ".migrated")
+    migrated_days, migrated_archive = core._store.get_stats_history(core.xp_state)
+    assert migrated_days == days
+    assert migrated_archive["weekly"] == archive["weekly"]
+    assert migrated_archive["monthly"] == archive["monthly"]
+
+    # Answers after the migration land in the database
+    answer(core, [4] * 10)
+    live = strip(core.xp_state)
+    core.flush_state_now()
+    core.set_data_dir(str(tmp_path))
+    core.ensure_state()
+    assert strip(core.xp_state) == live
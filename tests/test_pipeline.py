@@ -0,0 +1,46 @@
+# Consumers registered for one test only
+def add_consumers(core, monkeypatch):
+    monkeypatch.setattr(core, "_answer_consumers", list(core._answer_consumers))
+    seen = {"immediate": [], "deferred": [], "latest": [], "hidden": []}
+    core.register_answer_consumer("immediate", lambda event: seen["immediate"].append(event))
+    core.register_answer_consumer("deferred", lambda event: seen["deferred"].append(event), deferred=True)
+    core.register_answer_consumer("latest", lambda event: seen["latest"].append(event), deferred=True,
+                                  latest_only=True)
+    core.register_answer_consumer("hidden", lambda event: seen["hidden"].append(event), deferred=True,
+                                  should_run=lambda: False)
+    return seen
+
+# A burst of answers runs the immediate consumers once per answer, and the
+# deferred ones once per burst, after it
+def test_deferred_consumers_run_once_per_burst(core, monkeypatch):
+    seen = add_consumers(core, monkeypatch)
+    scheduled = [core.queue_answer(ease) for ease in (3, 3, 4, 2, 3)]
+    assert scheduled == [True, False, False, False, False]
+    assert len(seen["immediate"]) == 5
+    assert seen["deferred"] == seen["latest"] == []
+
+    core.run_deferred_consumers()
+    assert seen["deferred"] == seen["immediate"]
+    assert seen["latest"] == seen["immediate"][-1:]
+    assert seen["hidden"] == []
+    assert [event.ease for event in seen["deferred"]] == [3, 3, 4, 2, 3]
+
+    # Nothing new to run; the next answer starts a new burst
+    core.run_deferred_consumers()
+    assert len(seen["deferred"]) == 5
+    assert core.queue_answer(3)
+    core.run_deferred_consumers()
+    assert len(seen["deferred"]) == 6 and len(seen["latest"]) == 2
+
+# A failing consumer doesn't keep the ones after it from running
+def test_failing_consumer_is_isolated(core, monkeypatch):
+    monkeypatch.setattr(core, "_answer_consumers", list(core._answer_consumers))
+
+    def fail(event):
+        raise RuntimeError("broken")
+    core.register_answer_consumer("broken", fail)
+    seen = add_consumers(core, monkeypatch)
+    core.queue_answer(4)
+    core.run_deferred_consumers()
+    assert len(seen["immediate"]) == len(seen["deferred"]) == 1
+    assert core.xp_state["total_xp"] > 0
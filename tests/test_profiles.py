@@ -0,0 +1,37 @@
+import os
+
+from conftest import answer
+
+def test_profile_dirs_are_distinct(core):
+    names = ["User 1", "a/b", "a_b", "a%2Fb", "a\\b", ".", "..", "a.", "a. ", " a", "", "%", "Zoë", "a:b", "a?b"]
+    folders = [os.path.basename(core.get_profile_dir(name)) for name in names]
+    assert len(set(folders)) == len(names)
+    assert folders[0] == "User 1"
+    for folder in folders:
+        assert folder not in (".", "..") and "/" not in folder and "\\" not in folder
+        assert folder == folder.strip(" .")
+
+# Each profile keeps its own state; the least recently used ones leave the
+# cache with their answers on disk, and come back from there
+def test_profile_switches_keep_states_apart(core, tmp_path, monkeypatch):
+    monkeypatch.setattr(core, "addon_dir", str(tmp_path))
+    names = [f"User {i}" for i in range(core.PROFILE_CACHE_SIZE + 2)]
+    totals = {}
+    for count, name in enumerate(names, 1):
+        core.switch_profile(name, str(tmp_path / name))
+        core.ensure_state()
+        assert core.xp_state["total_xp"] == 0
+        answer(core, [3] * count)
+        totals[name] = core.xp_state["total_xp"]
+    assert len(set(totals.values())) == len(names)
+    assert list(core._profiles) == names[-core.PROFILE_CACHE_SIZE - 1:-1]
+
+    # Cached profiles come back without reading their files
+    loads = []
+    load_state = core.load_state
+    monkeypatch.setattr(core, "load_state", lambda: loads.append(core.current_profile) or load_state())
+    for name in reversed(names):
+        core.switch_profile(name, str(tmp_path / name))
+        core.ensure_state()
+        assert core.xp_state["total_xp"] == totals[name]
+    assert loads == names[1::-1]
@@ -0,0 +1,61 @@
+import csv
+import json
+import random
+
+from conftest import load
+
+DAY_MS = 86400 * 1000
+
+# Revlog rows over a few weeks, with manual reschedules (ease 0) mixed in
+def make_rows(seed):
+    rng = random.Random(seed)
+    rows = []
+    revlog_id = 1700000000000
+    for day in range(rng.randint(5, 25)):
+        for answer in range(rng.randint(0, 40)):
+            revlog_id += rng.randint(1000, 60000)
+            rows.append((revlog_id, rng.choice([0, 1, 2, 3, 3, 3, 4])))
+        revlog_id += DAY_MS
+    return rows
+
+def write_students(folder):
+    students = {}
+    for index, name in enumerate(["ann", "ben", "cat", "dan"]):
+        rows = make_rows(index)
+        students[name] = rows
+        if index % 2:
+            with open(folder / f"{name}.csv", "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["id", "cid", "ease"])
+                writer.writerows((revlog_id, 1, ease) for revlog_id, ease in rows)
+        else:
+            with open(folder / f"{name}.jsonl", "w") as f:
+                f.writelines(json.dumps({"id": revlog_id, "ease": ease}) + "\n" for revlog_id, ease in rows)
+    return students
+
+def read_report(path):
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+# Rows from the worker pool match replaying each student in this process, and
+# a rerun into the same folder doesn't report on the earlier report
+def test_report_matches_replay(tmp_path):
+    report = load("report")
+    replay = load("replay")
+    students = write_students(tmp_path)
+    output = tmp_path / "out.csv"
+    assert report.run_report(str(tmp_path), str(output), workers=2, rollover_hour=4) == (4, 0)
+    assert report.run_report(str(tmp_path), str(output), workers=2, rollover_hour=4) == (4, 0)
+    (tmp_path / "out.csv").rename(tmp_path / "earlier.csv")
+    assert report.run_report(str(tmp_path), str(output), workers=2, rollover_hour=4) == (4, 0)
+
+    rows = read_report(output)
+    assert [row["student"] for row in rows] == sorted(students)
+    for row in rows:
+        answers = [(revlog_id, ease) for revlog_id, ease in students[row["student"]] if ease > 0]
+        state = replay.replay_answers(iter(students[row["student"]]), rollover_hour=4)
+        assert int(row["reviews"]) == len(answers)
+        assert row["first_day"] == replay.get_replay_day(answers[0][0], 4)[0]
+        assert int(row["total_xp"]) == state["total_xp"]
+        assert int(row["level"]) == state["level"]
+        assert row["achievements"].split() == sorted(state["achievements"])
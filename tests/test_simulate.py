@@ -0,0 +1,29 @@
+import pytest
+
+from conftest import load
+
+np = pytest.importorskip("numpy")
+
+SKILLS = {"xp_boost": 2, "multiplier_boost": 1, "streak_shield": 2, "recovery": 1, "daily_bonus": 1}
+
+@pytest.fixture
+def simulate():
+    return load("simulate")
+
+@pytest.mark.parametrize("skills", [None, SKILLS])
+def test_matches_rules(simulate, skills):
+    eases = simulate.random_eases(40, 20, 25, seed=7)
+    assert simulate.verify(eases, skills, seed=11) == []
+
+# One user per answer count: 1 to 80 Easy answers on a single day, then a few
+# Good ones the next day, so consecutive users sit on both sides of each level
+# threshold the totals pass
+@pytest.mark.parametrize("skills", [None, SKILLS])
+def test_level_thresholds(simulate, skills):
+    eases = np.zeros((80, 2, 90), dtype=np.int8)
+    for user in range(80):
+        eases[user, 0, :user + 1] = 4
+        eases[user, 1, :5] = 3
+    assert simulate.verify(eases, skills, seed=0) == []
+    levels = simulate.simulate(eases, skills=skills).level
+    assert len(set(levels.tolist())) >= 4
@@ -0,0 +1,52 @@
+import pytest
+
+def skill(prerequisite=None, effect="xp_boost"):
+    return {"name": "Skill", "max_level": 3, "effect": effect, "effect_per_level": 0.1, "cost": 1,
+            "prerequisite": prerequisite}
+
+def test_parse_prerequisite(rules):
+    assert rules.parse_prerequisite(None) == []
+    assert rules.parse_prerequisite("") == []
+    assert rules.parse_prerequisite("xp_boost:2") == [("xp_boost", 2)]
+    assert rules.parse_prerequisite("xp_boost") == [("xp_boost", 1)]
+    assert rules.parse_prerequisite("xp_boost:2, streak_shield:1") == [("xp_boost", 2), ("streak_shield", 1)]
+    with pytest.raises(ValueError):
+        rules.parse_prerequisite("xp_boost:two")
+
+# Skills in a prerequisite cycle, requiring an unknown skill or a blocked one,
+# or with an unreadable prerequisite can't be unlocked; the rest still can
+def test_unmet_prerequisites_block_skills(rules):
+    tree = rules.SkillTree({
+        "base": skill(),
+        "next": skill("base:2"),
+        "loop_a": skill("loop_b"),
+        "loop_b": skill("loop_a"),
+        "after_loop": skill("base, loop_a"),
+        "missing": skill("nowhere:1"),
+        "after_missing": skill("missing"),
+        "garbled": skill("base:x"),
+        "no_effect": skill(effect="flying"),
+    })
+    assert tree.blocked == {"loop_a", "loop_b", "after_loop", "missing", "after_missing", "garbled"}
+    state = rules.default_state().to_dict()
+    state["skill_points"] = 10
+    assert sorted(tree.get_available(state)) == ["base", "no_effect"]
+    for _ in range(2):
+        rules.unlock_skill_level(state, "base", tree)
+    assert sorted(tree.get_available(state)) == ["base", "next", "no_effect"]
+    with pytest.raises(ValueError):
+        rules.unlock_skill_level(state, "loop_a", tree)
+
+    # Skills with an unknown effect can be unlocked but do nothing
+    rules.unlock_skill_level(state, "no_effect", tree)
+    assert tree.get_effects(state["skills"]).xp_boost == pytest.approx(0.2)
+
+def test_prerequisite_levels(rules):
+    state = rules.default_state().to_dict()
+    state["skill_points"] = 10
+    with pytest.raises(ValueError, match="requires XP Boost level 2"):
+        rules.unlock_skill_level(state, "daily_bonus")
+    rules.unlock_skill_level(state, "xp_boost")
+    rules.unlock_skill_level(state, "xp_boost")
+    assert rules.unlock_skill_level(state, "daily_bonus") == 1
+    assert state["skill_points"] == 7
@@ -0,0 +1,68 @@
+import json
+import random
+import datetime
+
+import pytest
+
+from conftest import answer, load
+
+# Study runs of a {"YYYY-MM-DD": xp} history, oldest first, counted day by day
+def reference_runs(days):
+    runs = []
+    for day in sorted(day for day, xp in days.items() if xp > 0):
+        previous = (datetime.date.fromisoformat(day) - datetime.timedelta(days=1)).isoformat()
+        if runs and runs[-1][1] == previous:
+            runs[-1] = [runs[-1][0], day, runs[-1][2] + 1]
+        else:
+            runs.append([day, day, 1])
+    return runs
+
+# The aggregates built when a stored history is loaded match a recount of the
+# history, with either store's history summary
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_aggregates_match_history(core, tmp_path, monkeypatch, backend):
+    monkeypatch.setattr(core, "STORAGE_BACKEND", backend)
+    core.set_data_dir(str(tmp_path))
+    today = core.get_today()
+    rng = random.Random(3)
+    date = datetime.date.fromisoformat(today)
+    history = {(date - datetime.timedelta(days=offset)).isoformat(): rng.choice([100, 200, 300, 300])
+               for offset in range(1, 80) if rng.random() < 0.7}
+    state = core.default_state().to_dict()
+    state.update(date=today, last_study_date=today, daily_xp=50, total_xp=sum(history.values()) + 50,
+                 xp_history=history)
+    state["level"] = core.calculate_level(state["total_xp"])[0]
+    with open(core.get_file_path(), "w") as f:
+        json.dump(state, f)
+
+    core.ensure_state()
+    stats = core.xp_state["stats"]
+    best = max(sorted(history), key=history.get)  # Earliest of the best days
+    assert stats["best_day"] == [best, history[best]]
+    runs = reference_runs(history)
+    assert stats["runs"] == runs[-core.RUNS_KEPT:]
+    assert stats["best_run"] == max(runs, key=lambda run: run[2])
+    start_30 = (date - datetime.timedelta(days=29)).isoformat()
+    start_7 = (date - datetime.timedelta(days=6)).isoformat()
+    assert stats["sum_30"] == 50 + sum(xp for day, xp in history.items() if day >= start_30)
+    assert stats["sum_7"] == 50 + sum(xp for day, xp in history.items() if day >= start_7)
+
+    # Counted from the days alone, the aggregates come out the same
+    days, archive = core._store.get_stats_history(core.xp_state)
+    assert load("stats").build_stats(days, archive, core.xp_state) == stats
+
+# A card streak reached and lost between snapshots still counts after the
+# journal is replayed
+@pytest.mark.parametrize("backend", ["json", "snapshot"])
+def test_best_card_streak_survives_journal_replay(core, tmp_path, monkeypatch, backend):
+    monkeypatch.setattr(core, "STORAGE_BACKEND", backend)
+    core.set_data_dir(str(tmp_path))
+    core.ensure_state()
+    core.flush_state_now()
+    answer(core, [3] * 6 + [1])
+    core.flush_state(wait=True)
+    assert core.xp_state["stats"]["best_card_streak"] == 6
+
+    core.set_data_dir(str(tmp_path))
+    core.ensure_state()
+    assert core.xp_state["stats"]["best_card_streak"] == 6
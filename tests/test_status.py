@@ -0,0 +1,47 @@
+import pytest
+
+from conftest import answer, load
+
+# Stands in for the status widget's label and progress bar, recording what
+# was pushed to Qt
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name,) + args)
+
+# The status widget (needs Anki's aqt), with its Qt widgets recorded
+@pytest.fixture
+def status(core):
+    qt = pytest.importorskip("aqt.qt")
+    app = qt.QApplication.instance() or qt.QApplication([])
+    status = load("ui").XPStatus()
+    status.text_label = status.progress_bar = Recorder()
+    yield status
+    app.processEvents()
+
+# Repaints only push the fields that changed
+def test_repaint_pushes_changed_fields(core, status):
+    status.update_text()
+    assert status.text_label.calls == []
+
+    answer(core, [3])
+    status.update_text()
+    assert [call[0] for call in status.text_label.calls] == ["setText", "setValue", "setFormat"]
+
+    # Same streak and XP, so nothing is pushed
+    status.text_label.calls.clear()
+    status.update_text()
+    assert status.text_label.calls == []
+
+# A burst of update requests shares one repaint timer
+def test_update_requests_coalesce(core, status):
+    for ease in [3] * 20:
+        answer(core, [ease])
+        status.request_update()
+    assert status.repaint_timer.isActive()
+    assert status.text_label.calls == []
+    status.repaint_timer.timeout.emit()
+    assert not status.repaint_timer.isActive()
+    assert [call[0] for call in status.text_label.calls] == ["setText", "setValue", "setFormat"]
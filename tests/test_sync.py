@@ -0,0 +1,65 @@
+from conftest import answer, load
+
+# One device's study in its own data folder: 40 Easy answers and 2 skill
+# points spent on skill_id. Returns its total XP and achievement rewards.
+def study_on_device(core, data_dir, device, skill_id):
+    data_dir.mkdir()
+    core.set_device_id(device)
+    core.set_data_dir(str(data_dir))
+    answer(core, [4] * 40)
+    core.unlock_skill(skill_id)
+    core.unlock_skill(skill_id)
+    rewards = {ach_id: core.ACHIEVEMENTS[ach_id]["reward_xp"] for ach_id in core.xp_state["achievements"]}
+    return core.xp_state["total_xp"], rewards
+
+def test_merge_counts_rewards_and_skill_points_once(core, tmp_path):
+    rules = load("rules")
+    b_total, b_rewards = study_on_device(core, tmp_path / "b", "b", "streak_shield")
+    export_path = str(tmp_path / "b.json")
+    core.export_sync_file(export_path)
+    core.flush_state_now()
+
+    a_total, a_rewards = study_on_device(core, tmp_path / "a", "a", "xp_boost")
+    shared = set(a_rewards) & set(b_rewards)
+    assert shared
+    core.merge_sync_file(export_path)
+
+    state = core.xp_state
+    assert state["total_xp"] == a_total + b_total - sum(a_rewards[ach_id] for ach_id in shared)
+    assert state["skills"] == {"xp_boost": 2, "streak_shield": 2}
+    assert state["level"] == rules.calculate_level(state["total_xp"])[0]
+    earned = (state["level"] - 1) * rules.SKILL_POINTS_PER_LEVEL
+    assert state["skill_points"] + 4 == earned
+
+    # Merging the same export again changes nothing
+    before = (state["total_xp"], state["skill_points"], state["level"])
+    core.merge_sync_file(export_path)
+    assert (state["total_xp"], state["skill_points"], state["level"]) == before
+
+# Achievements taken back by an undo after the sync state saw them aren't
+# counted as this device's on a merge
+def test_merge_after_undo(core, tmp_path):
+    data_dir = tmp_path / "b"
+    data_dir.mkdir()
+    core.set_device_id("b")
+    core.set_data_dir(str(data_dir))
+    answer(core, [4] * 12)
+    b_total = core.xp_state["total_xp"]
+    assert core.xp_state["achievements"]
+    export_path = str(tmp_path / "b.json")
+    core.export_sync_file(export_path)
+    core.flush_state_now()
+
+    data_dir = tmp_path / "a"
+    data_dir.mkdir()
+    core.set_device_id("a")
+    core.set_data_dir(str(data_dir))
+    answer(core, [4] * 12)
+    core.flush_state(wait=True)
+    while core.xp_state["achievements"]:
+        assert core.undo_answer() is not None
+    a_total = core.xp_state["total_xp"]
+
+    core.merge_sync_file(export_path)
+    assert core.xp_state["total_xp"] == a_total + b_total
+    assert set(core.xp_state["achievements"]) == set(core.xp_state["sync"]["rewarded"])
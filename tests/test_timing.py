@@ -0,0 +1,11 @@
+from conftest import answer, load
+
+# Every answer's level lookup (inside the rules) is timed
+def test_answers_time_level_lookups(core):
+    timing = load("timing")
+    core.ensure_state()
+    timing.reset_timers()
+    answer(core, [3] * 10)
+    report = timing.get_timing_report()
+    assert report["calculate_xp"]["count"] == 10
+    assert report["calculate_level"]["count"] >= 10
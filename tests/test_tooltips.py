@@ -0,0 +1,47 @@
+import random
+import types
+
+from conftest import load
+
+# The answer tooltip as it was built with f-strings before the templates,
+# kept as the reference they must match
+def reference_message(rules, event):
+    message = ""
+    if event.level_up:
+        message += f"<div style='color: #FFD700; font-weight: bold;'>LEVEL UP! You are now level {event.new_level}!</div>"
+        message += f"<div style='color: #FFD700;'>You earned {rules.SKILL_POINTS_PER_LEVEL} skill point(s)!</div>"
+    if event.earned_xp >= 0:
+        message += f"<div style='color: #00AA00; font-weight: bold;'>+{event.earned_xp} XP (x{event.multiplier:.1f})</div>"
+    else:
+        message += f"<div style='color: #AA0000; font-weight: bold;'>{event.earned_xp} XP</div>"
+    for ach_id in event.achievement_ids:
+        achievement = rules.ACHIEVEMENTS[ach_id]
+        message += f"<div style='color: #FFD700; font-weight: bold;'>Achievement Unlocked: {achievement['icon']} {achievement['name']}</div>"
+        message += f"<div style='color: #FFD700;'>+{achievement['reward_xp']} XP</div>"
+    return message
+
+def test_answer_tooltips_match_reference(rules):
+    tooltips = load("tooltips")
+    templates = tooltips.TooltipTemplates()
+    rng = random.Random(18)
+    for _ in range(2000):
+        event = types.SimpleNamespace(earned_xp=rng.randint(-20, 200), multiplier=rng.choice([1.0, 1.25, 2.55, 5.0]),
+                                      level_up=rng.random() < 0.2, new_level=rng.randint(2, 50),
+                                      achievement_ids=rng.sample(sorted(rules.ACHIEVEMENTS), rng.choice([0, 0, 0, 1, 2])))
+        message, period = templates.render_answer(event)
+        assert message == reference_message(rules, event)
+        important = event.level_up or event.achievement_ids
+        assert period == (tooltips.TOOLTIP_PERIOD_LONG if important else tooltips.TOOLTIP_PERIOD)
+
+# Plain tooltips are held to one per interval; important ones always show
+def test_limiter(monkeypatch):
+    tooltips = load("tooltips")
+    now = [0.0]
+    monkeypatch.setattr(tooltips.time, "monotonic", lambda: now[0])
+    limiter = tooltips.TooltipLimiter(500)
+    shown = []
+    for step in range(20):
+        now[0] = 100 + step * 0.125
+        shown.append(limiter.allow(important=step == 7))
+    assert [step for step, allowed in enumerate(shown) if allowed] == [0, 4, 7, 11, 15, 19]
+    assert all(tooltips.TooltipLimiter().allow() for _ in range(5))
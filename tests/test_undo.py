@@ -0,0 +1,46 @@
+import copy
+import random
+
+import pytest
+
+# The state as undo restores it: the sync and stats aggregates are rebuilt
+# rather than taken back
+def strip(state):
+    state = copy.deepcopy(state.to_dict())
+    state.pop("sync", None)
+    state.pop("stats", None)
+    return state
+
+# Random answers with bursts of undos (as when Anki undoes several reviews):
+# every undo must bring back the state from before its answer, and what's on
+# disk must load back into the same state
+@pytest.mark.parametrize("backend", ["json", "snapshot", "sqlite"])
+def test_random_answers_and_undos(core, tmp_path, monkeypatch, backend):
+    monkeypatch.setattr(core, "STORAGE_BACKEND", backend)
+    monkeypatch.setattr(core, "COMPACT_EVERY_ANSWERS", 37)
+    core.set_data_dir(str(tmp_path))
+    core.ensure_state()
+    rng = random.Random(1)
+    history = [strip(core.xp_state)]
+    undone = 0
+    for i in range(1500):
+        if len(history) > 1 and rng.random() < 0.1:
+            for _ in range(rng.randint(1, 5)):
+                if len(history) <= 1:
+                    break
+                assert core.undo_answer() is not None
+                undone += 1
+                history.pop()
+                assert strip(core.xp_state) == history[-1]
+            continue
+        if core.queue_answer(rng.choice([1, 2, 3, 3, 3, 4, 4]), card_id=i, answered_at=i):
+            core.run_deferred_consumers()
+        history.append(strip(core.xp_state))
+        del history[:-(core.UNDO_DEPTH + 1)]
+    assert undone > 100
+
+    live = strip(core.xp_state)
+    core.flush_state(wait=True)
+    core.set_data_dir(str(tmp_path))
+    core.ensure_state()
+    assert strip(core.xp_state) == live
@@ -0,0 +1,51 @@
+import os
+import threading
+
+from conftest import answer, load
+
+# Writes to a file land in the order they were queued, calls included
+def test_writer_keeps_order(tmp_path):
+    storage = load("storage")
+    writer = storage.StateWriter()
+    path = str(tmp_path / "journal")
+    seen = []
+    for i in range(50):
+        writer.append(path, f"{i}\n")
+        if i % 10 == 0:
+            writer.call(path, lambda i=i: seen.append((i, open(path).read().split())))
+    assert writer.wait(5)
+    with open(path) as f:
+        assert f.read().split() == [str(i) for i in range(50)]
+    assert [lines[-1] for i, lines in seen] == [str(i) for i, lines in seen]
+
+# A snapshot replaces the queued writes it covers and empties the journal
+def test_writer_snapshot_supersedes_queued_writes(tmp_path):
+    storage = load("storage")
+    writer = storage.StateWriter()
+    state_path, journal_path = str(tmp_path / "state"), str(tmp_path / "journal")
+    # Hold the writer thread while the writes queue up
+    release = threading.Event()
+    writer.call(str(tmp_path / "other"), release.wait)
+    for i in range(5):
+        writer.append(journal_path, f"{i}\n")
+        writer.replace(state_path, f"snapshot {i}", journal_path)
+    release.set()
+    assert writer.wait(5)
+    with open(state_path) as f:
+        assert f.read() == "snapshot 4"
+    assert os.path.getsize(journal_path) == 0
+    assert writer.written_stamp(state_path) == storage.get_stamp(state_path)
+
+# Closing Anki flushes every answer still buffered or queued
+def test_flush_on_shutdown(core, tmp_path):
+    answer(core, [4, 3, 2] * 20)
+    live = core.xp_state.to_dict()
+    core.flush_state_now()
+    assert not core._writer.is_pending(core.get_file_path())
+
+    core.set_data_dir(str(tmp_path))
+    core.ensure_state()
+    loaded = core.xp_state.to_dict()
+    assert loaded["total_xp"] == live["total_xp"]
+    assert loaded["achievements"] == live["achievements"]
+    assert loaded["daily_xp"] == live["daily_xp"]
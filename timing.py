@@ -0,0 +1,90 @@
+import json
+import time
+import functools
+from collections import deque
+
+# Samples kept per timer; older ones roll off, so percentiles describe the
+# recent session rather than everything since startup
+TIMING_WINDOW = 1000
+
+# Rolling timings for one named piece of work
+class Timer:
+    def __init__(self, name, window=TIMING_WINDOW):
+        self.name = name
+        self.samples = deque(maxlen=window)  # Durations in seconds, oldest first
+        self.count = 0  # Calls since startup (not just the window)
+        self.total = 0.0
+        self.max = 0.0  # Slowest call since startup
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def reset(self):
+        self.samples.clear()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    # Summary in milliseconds: p50/p95/max over the window, plus totals
+    def summary(self):
+        samples = sorted(self.samples)
+        if not samples:
+            return {"count": 0, "p50_ms": 0, "p95_ms": 0, "max_ms": 0, "window_max_ms": 0, "total_ms": 0}
+        return {
+            "count": self.count,
+            "p50_ms": samples[(len(samples) - 1) // 2] * 1000,
+            "p95_ms": samples[(len(samples) - 1) * 95 // 100] * 1000,
+            "max_ms": self.max * 1000,
+            "window_max_ms": samples[-1] * 1000,
+            "total_ms": self.total * 1000
+        }
+
+timers = {}  # Format: {name: Timer}
+timing_enabled = True
+
+# Get the timer for name, creating it on first use
+def get_timer(name):
+    timer = timers.get(name)
+    if timer is None:
+        timer = timers[name] = Timer(name)
+    return timer
+
+# Decorator recording how long each call of the function takes
+def timed(name):
+    timer = get_timer(name)
+
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not timing_enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                timer.record(time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+# Turn timing on or off (timers keep what they've recorded)
+def set_timing_enabled(enabled):
+    global timing_enabled
+    timing_enabled = enabled
+
+def reset_timers():
+    for timer in timers.values():
+        timer.reset()
+
+# Summaries of every timer that has recorded something
+def get_timing_report():
+    return {name: timer.summary() for name, timer in sorted(timers.items()) if timer.count}
+
+def export_timings(path):
+    report = {"window": TIMING_WINDOW, "exported": int(time.time()), "timers": get_timing_report()}
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
@@ -0,0 +1,62 @@
+import time
+
+from .rules import ACHIEVEMENTS, SKILL_POINTS_PER_LEVEL
+
+# Tooltip HTML, compiled into fragments once so that showing an answer only
+# splices numbers into finished strings
+
+XP_GAIN_TEMPLATE = "<div style='color: #00AA00; font-weight: bold;'>+%d XP (x%.1f)</div>"
+XP_LOSS_TEMPLATE = "<div style='color: #AA0000; font-weight: bold;'>%d XP</div>"
+LEVEL_UP_TEMPLATE = ("<div style='color: #FFD700; font-weight: bold;'>LEVEL UP! You are now level %d!</div>"
+                     "<div style='color: #FFD700;'>You earned {points} skill point(s)!</div>")
+ACHIEVEMENT_TEMPLATE = ("<div style='color: #FFD700; font-weight: bold;'>Achievement Unlocked: {icon} {name}</div>"
+                        "<div style='color: #FFD700;'>+{reward_xp} XP</div>")
+DAILY_BONUS_TEMPLATE = "<div style='color: #00AA00; font-weight: bold;'>Daily Bonus: +%d XP</div>"
+
+# How long tooltips stay up (ms)
+TOOLTIP_PERIOD = 1500
+TOOLTIP_PERIOD_LONG = 3000  # Level ups and achievements
+TOOLTIP_PERIOD_BONUS = 2000
+
+class TooltipTemplates:
+    def __init__(self, achievements=None, skill_points_per_level=None):
+        if skill_points_per_level is None:
+            skill_points_per_level = SKILL_POINTS_PER_LEVEL
+        self.level_up = LEVEL_UP_TEMPLATE.replace("{points}", str(skill_points_per_level))
+        self.achievements = {}  # Format: {achievement_id: finished HTML}
+        for ach_id, achievement in (ACHIEVEMENTS if achievements is None else achievements).items():
+            self.achievements[ach_id] = ACHIEVEMENT_TEMPLATE.format(
+                icon=achievement["icon"], name=achievement["name"], reward_xp=achievement["reward_xp"])
+
+    # Tooltip for an answer event: (HTML, period in ms)
+    def render_answer(self, event):
+        if event.earned_xp >= 0:
+            message = XP_GAIN_TEMPLATE % (event.earned_xp, event.multiplier)
+        else:
+            message = XP_LOSS_TEMPLATE % event.earned_xp
+        if not event.level_up and not event.achievement_ids:
+            return message, TOOLTIP_PERIOD
+        parts = [self.level_up % event.new_level] if event.level_up else []
+        parts.append(message)
+        parts.extend(self.achievements[ach_id] for ach_id in event.achievement_ids)
+        return "".join(parts), TOOLTIP_PERIOD_LONG
+
+    def render_achievement(self, ach_id):
+        return self.achievements[ach_id]
+
+    def render_daily_bonus(self, bonus_xp):
+        return DAILY_BONUS_TEMPLATE % bonus_xp
+
+# Keeps plain XP tooltips to at most one per min_interval_ms; important ones
+# (level ups, achievements) always get through
+class TooltipLimiter:
+    def __init__(self, min_interval_ms=0):
+        self.min_interval = min_interval_ms / 1000
+        self.last_shown = 0.0
+
+    def allow(self, important=False):
+        now = time.monotonic()
+        if important or now - self.last_shown >= self.min_interval:
+            self.last_shown = now
+            return True
+        return False
@@ -0,0 +1,643 @@
+import os
+import html
+import time
+import atexit
+from aqt import mw
+from aqt.qt import *
+from aqt.utils import askUser, showInfo, tooltip
+from anki.hooks import addHook, wrap
+from aqt.reviewer import Reviewer
+from .core import *
+from .replay import iter_revlog
+from .dashboard import show_dashboard
+from .timing import timed, get_timing_report, export_timings
+from .tooltips import TooltipLimiter
+
+# Print debug info
+print("XP Add-on: Starting initialization...")
+
+# Status bar configuration
+REPAINT_DELAY_MS = 16  # Updates requested within this window share one repaint (about one frame)
+
+# Startup configuration: at import the add-on only adds its menu and hooks;
+# loading state and building the status bar wait until the main window is up
+STARTUP_DELAY_MS = 1000  # After the profile loads, before the deferred startup runs
+STARTUP_BUDGET_MS = 50  # Startup work that can wait is put off to later event loop turns past this
+
+# Tooltip configuration (overridden by the add-on config, see config.json)
+TOOLTIPS_ENABLED = True
+TOOLTIP_MIN_INTERVAL_MS = 0  # Plain XP tooltips closer together than this are skipped
+
+# Leaderboard configuration (overridden by the add-on config); uploads are off
+# until a server URL and cohort are set
+LEADERBOARD_URL = ""
+LEADERBOARD_COHORT = ""
+LEADERBOARD_NAME = ""
+
+_started = False
+_startup_steps_done = 0  # Startup steps that have run (see start_addon)
+tooltip_limiter = TooltipLimiter(TOOLTIP_MIN_INTERVAL_MS)
+
+# Read the user's add-on config (Tools > Add-ons > Config)
+def load_config():
+    global TOOLTIPS_ENABLED, TOOLTIP_MIN_INTERVAL_MS, tooltip_limiter
+    global LEADERBOARD_URL, LEADERBOARD_COHORT, LEADERBOARD_NAME
+    config = mw.addonManager.getConfig(__name__.split(".")[0])
+    if not isinstance(config, dict):
+        return
+    TOOLTIPS_ENABLED = bool(config.get("tooltips", TOOLTIPS_ENABLED))
+    TOOLTIP_MIN_INTERVAL_MS = int(config.get("tooltip_min_interval_ms", TOOLTIP_MIN_INTERVAL_MS))
+    tooltip_limiter = TooltipLimiter(TOOLTIP_MIN_INTERVAL_MS)
+    LEADERBOARD_URL = str(config.get("leaderboard_url", LEADERBOARD_URL))
+    LEADERBOARD_COHORT = str(config.get("leaderboard_cohort", LEADERBOARD_COHORT))
+    LEADERBOARD_NAME = str(config.get("leaderboard_name", LEADERBOARD_NAME))
+
+# Get timing export file path
+def get_timings_path():
+    addon_dir = os.path.dirname(os.path.realpath(__file__))
+    return os.path.join(addon_dir, "xp_timings.json")
+
+# Reset state
+def reset_state():
+    start_addon()
+    clear_state()
+    update_display()
+    showInfo("XP data has been reset.")
+
+# Rebuild XP state from Anki's review history
+def rebuild_from_revlog():
+    if not askUser("Rebuild your XP from Anki's review history? This replaces your current XP data."):
+        return
+    start_addon()
+    mw.progress.start(label="Rebuilding XP from review history...")
+    try:
+        rebuild_state(iter_revlog(mw.col.db))
+    finally:
+        mw.progress.finish()
+    update_display()
+    showInfo(f"XP rebuilt from review history: level {xp_state['level']}, {xp_state['total_xp']} total XP.")
+
+# Write this profile's XP for merging on another device
+def export_sync():
+    start_addon()
+    path = QFileDialog.getSaveFileName(mw, "Export XP for Another Device", "xp_sync.json", "XP sync files (*.json)")[0]
+    if not path:
+        return
+    try:
+        export_sync_file(path)
+    except Exception as e:
+        showInfo(f"Couldn't export XP: {str(e)}")
+        return
+    tooltip("XP exported.")
+
+# Merge XP exported on another device into this profile
+def merge_sync():
+    start_addon()
+    path = QFileDialog.getOpenFileName(mw, "Merge XP from Another Device", "", "XP sync files (*.json)")[0]
+    if not path:
+        return
+    try:
+        merge_sync_file(path)
+    except Exception as e:
+        showInfo(f"Couldn't merge XP: {str(e)}")
+        return
+    update_display()
+    showInfo(f"XP merged: level {xp_state['level']}, {xp_state['total_xp']} total XP.")
+
+# Full answer handling: state, immediate consumers, then the deferred ones
+# after the reviewer has shown the next card
+@timed("process_answer")
+def process_answer(ease, card_id=None, answered_at=0, deck_id=None, note_type_id=None):
+    start_addon()
+    if queue_answer(ease, card_id, answered_at, deck_id, note_type_id):
+        QTimer.singleShot(0, run_deferred_consumers)
+
+# (card id, deck id, note type id) of the card being answered. The deck is
+# the card's home deck when it's in a filtered one; the reviewer has already
+# loaded the note, so its note type costs nothing.
+def get_card_ids(card):
+    if card is None:
+        return None, None, None
+    try:
+        return card.id, card.odid or card.did, card.note().mid
+    except Exception:
+        return card.id, None, None
+
+# True if the review an answer's XP came from is still in Anki's revlog
+def has_review(delta):
+    return bool(mw.col.db.scalar("select 1 from revlog where cid = ? and id >= ? limit 1",
+                                 delta.card_id, delta.answered_at))
+
+# Anki undid something: take back the XP of every answer whose review is gone.
+# Usually that's the latest answer, or nothing when the undo wasn't a review
+# (answers made without a known card are left alone).
+def on_undo(*args):
+    if not _started or mw.col is None:
+        return
+    try:
+        undone = False
+        while True:
+            delta = get_last_answer()
+            if delta is None or delta.card_id is None or has_review(delta):
+                break
+            undo_answer()
+            undone = True
+        if undone:
+            update_display()
+    except Exception as e:
+        print(f"Error in on_undo: {str(e)}")
+
+# Tooltip consumer: show what the answer earned
+def tooltips_enabled():
+    return TOOLTIPS_ENABLED
+
+@timed("tooltip")
+def consume_tooltip(event):
+    if not tooltip_limiter.allow(important=event.level_up or bool(event.achievement_ids)):
+        return
+    message, tooltip_duration = get_answer_message(event)
+    tooltip(message, period=tooltip_duration)
+
+# Status bar consumer: only repaint while the main window can be seen
+_display_stale = False
+
+def is_main_window_visible():
+    global _display_stale
+    visible = mw.isVisible() and not mw.isMinimized()
+    if not visible:
+        _display_stale = True
+    return visible
+
+def consume_status_bar(event):
+    update_display()
+
+# Custom progress bar style
+class XPProgressBar(QProgressBar):
+    def __init__(self, parent=None):
+        super(XPProgressBar, self).__init__(parent)
+        self.setTextVisible(True)
+        self.setMinimumHeight(20)
+        self.setStyleSheet("""
+            QProgressBar {
+                border: 1px solid #076329;
+                border-radius: 5px;
+                text-align: center;
+                background-color: #f0f0f0;
+            }
+            QProgressBar::chunk {
+                background-color: qlineargradient(x1: 0, y1: 0.5, x2: 1, y2: 0.5, stop: 0 #5cb85c, stop: 1 #3e8f3e);
+                border-radius: 5px;
+            }
+        """)
+
+# Status bar widget
+class XPStatus(QWidget):
+    def __init__(self, parent=None):
+        super(XPStatus, self).__init__(parent)
+        self.layout = QHBoxLayout(self)
+        self.layout.setContentsMargins(0, 0, 0, 0)
+        self.layout.setSpacing(10)
+        
+        # Level and XP text
+        self.text_label = QLabel()
+        self.text_label.setStyleSheet("font-weight: bold; color: #009900;")
+        
+        # Progress bar
+        self.progress_bar = XPProgressBar()
+        self.progress_bar.setFixedWidth(150)
+        
+        # Add widgets to layout
+        self.layout.addWidget(self.text_label)
+        self.layout.addWidget(self.progress_bar)
+        
+        self.setLayout(self.layout)
+        
+        # View model as last shown, so a repaint only touches what changed
+        self.shown_text = None  # (level, daily_xp, total_xp, multiplier, streak)
+        self.shown_value = None
+        self.shown_format = None  # (next level, progress)
+        self.level_cache = (None, None)  # (total_xp, calculate_level(total_xp))
+        
+        # Coalesces bursts of update requests into one repaint
+        self.repaint_timer = QTimer(self)
+        self.repaint_timer.setSingleShot(True)
+        self.repaint_timer.setInterval(REPAINT_DELAY_MS)
+        self.repaint_timer.timeout.connect(self.update_text)
+        
+        self.update_text()
+    
+    # Ask for a repaint; requests made before the timer fires share it
+    def request_update(self):
+        if not self.repaint_timer.isActive():
+            self.repaint_timer.start()
+    
+    @timed("update_display")
+    def update_text(self):
+        self.repaint_timer.stop()
+        total_xp = xp_state["total_xp"]
+        if self.level_cache[0] != total_xp:
+            self.level_cache = (total_xp, calculate_level(total_xp))
+        level, progress, xp_needed = self.level_cache[1]
+        
+        # Only push the fields that changed to Qt
+        text = (level, xp_state["daily_xp"], total_xp, f"{xp_state['multiplier']:.1f}", xp_state["streak"])
+        if text != self.shown_text:
+            self.text_label.setText(f"Level: {level} | XP: {text[1]} | Total: {total_xp} | Multiplier: x{text[3]} | Streak: {text[4]}")
+            self.shown_text = text
+        if progress != self.shown_value:
+            self.progress_bar.setValue(progress)
+            self.shown_value = progress
+        if (level, progress) != self.shown_format:
+            self.progress_bar.setFormat(f"Level {level+1}: {progress}%")
+            self.shown_format = (level, progress)
+
+# Update display
+def update_display(*args):
+    global _display_stale
+    _display_stale = False
+    if hasattr(mw, 'xp_status'):
+        mw.xp_status.request_update()
+
+# Catch up on status bar updates skipped while the main window was hidden
+def refresh_stale_display():
+    if _display_stale and mw.isVisible() and not mw.isMinimized():
+        update_display()
+
+# Rules and level sections of the stats view; they only depend on the rule
+# constants, so they're built on first use and kept
+_static_stats_html = None
+
+def get_static_stats_html():
+    global _static_stats_html
+    if _static_stats_html is None:
+        _static_stats_html = f"""
+    <h3>XP Rules</h3>
+    <ul>
+        <li>Again: {BASE_XP_AGAIN} XP</li>
+        <li>Hard: {BASE_XP_HARD} XP</li>
+        <li>Good: +{BASE_XP_GOOD} XP</li>
+        <li>Easy: +{BASE_XP_EASY} XP</li>
+        <li>Consecutive Good/Easy answers increase your multiplier!</li>
+        <li>Maximum multiplier: x{MAX_MULTIPLIER:.1f}</li>
+    </ul>
+    
+    <h3>Level System</h3>
+    <ul>
+        <li>Your level is based on your total XP</li>
+        <li>Each level requires more XP than the previous</li>
+        <li>You earn {SKILL_POINTS_PER_LEVEL} skill point(s) per level</li>
+        <li>Maximum level: {MAX_LEVEL}</li>
+    </ul>
+    """
+    return _static_stats_html
+
+# Show the stats dashboard
+def show_stats():
+    start_addon()
+    show_dashboard(get_static_stats_html())
+
+# Start the leaderboard client for the current profile, if one is configured
+def setup_leaderboard():
+    if LEADERBOARD_URL and LEADERBOARD_COHORT:
+        try:
+            start_leaderboard(LEADERBOARD_URL, LEADERBOARD_COHORT, LEADERBOARD_NAME)
+        except ValueError as e:
+            print(f"XP Add-on: {e}")
+
+# Show the cohort leaderboard from the cache; a stale cache is refreshed in the
+# background and the leaderboard shown again once the refresh is in
+def show_leaderboard(refresh=True):
+    start_addon()
+    if not is_leaderboard_running():
+        showInfo("Set leaderboard_url and leaderboard_cohort in the add-on config (Tools > Add-ons > Config) to join a leaderboard.")
+        return
+    entries, future = get_leaderboard()
+    if future is not None and refresh:
+        future.add_done_callback(lambda done: mw.taskman.run_on_main(lambda: show_leaderboard(refresh=False)))
+        if entries is None:
+            tooltip("Fetching the leaderboard...")
+            return
+    user = get_leaderboard_user()
+    rows = "".join(f"<tr><td align='right'>{rank}.</td><td>{'<b>' if entry['user'] == user else ''}{html.escape(str(entry['name']))}"
+                   f"{'</b>' if entry['user'] == user else ''}</td><td align='right'>{entry['xp']}</td>"
+                   f"<td align='right'>{entry['today']}</td></tr>"
+                   for rank, entry in enumerate(entries or [], 1))
+    status = get_leaderboard_status()
+    leaderboard = f"""
+    <h2>{html.escape(LEADERBOARD_COHORT)} Leaderboard</h2>
+    <table cellspacing="6">
+        <tr><th></th><th align='left'>Name</th><th>Total XP</th><th>Today</th></tr>
+        {rows or "<tr><td colspan='4'>Couldn't reach the leaderboard server</td></tr>"}
+    </table>
+    <p>Uploaded {status['uploaded']} answers, {status['queued']} waiting.</p>
+    """
+    showInfo(leaderboard, title="XP Leaderboard", textFormat="rich")
+
+# Names for the breakdown's deck and note type ids (decks or note types since
+# deleted get their id)
+def get_deck_name(deck_id):
+    deck = mw.col.decks.get(int(deck_id), default=False)
+    return html.escape(deck["name"]) if deck else f"Deleted deck {deck_id}"
+
+def get_note_type_name(note_type_id):
+    note_type = mw.col.models.get(int(note_type_id))
+    return html.escape(note_type["name"]) if note_type else f"Deleted note type {note_type_id}"
+
+# Show XP per deck (the top decks) and per note type
+def show_breakdown():
+    start_addon()
+    summary = get_breakdown()
+    deck_rows = "".join(f"<tr><td align='right'>{rank}.</td><td>{get_deck_name(deck['deck_id'])}</td>"
+                        f"<td align='right'>{deck['xp']}</td><td align='right'>{deck['last_7']}</td>"
+                        f"<td align='right'>{deck['today']}</td><td align='right'>{deck['answers']}</td></tr>"
+                        for rank, deck in enumerate(summary["decks"], 1))
+    note_type_rows = "".join(f"<tr><td>{get_note_type_name(note_type['note_type_id'])}</td>"
+                             f"<td align='right'>{note_type['xp']}</td><td align='right'>{note_type['answers']}</td></tr>"
+                             for note_type in summary["note_types"])
+    other_rows = ""
+    if summary["other_decks"]["answers"]:
+        other_rows += (f"<p>Decks no longer tracked: {summary['other_decks']['xp']} XP over "
+                       f"{summary['other_decks']['answers']} answers.</p>")
+    if summary["other_note_types"]["answers"]:
+        other_rows += (f"<p>Note types no longer tracked: {summary['other_note_types']['xp']} XP over "
+                       f"{summary['other_note_types']['answers']} answers.</p>")
+    breakdown = f"""
+    <h2>XP by Deck</h2>
+    <table cellspacing="6">
+        <tr><th></th><th align='left'>Deck</th><th>Total XP</th><th>Last 7 Days</th><th>Today</th><th>Answers</th></tr>
+        {deck_rows or "<tr><td colspan='6'>No answers counted per deck yet</td></tr>"}
+    </table>
+    <p>Top {len(summary['decks'])} of the {summary['deck_count']} decks tracked.</p>
+    <h2>XP by Note Type</h2>
+    <table cellspacing="6">
+        <tr><th align='left'>Note Type</th><th>Total XP</th><th>Answers</th></tr>
+        {note_type_rows or "<tr><td colspan='3'>No answers counted per note type yet</td></tr>"}
+    </table>
+    {other_rows}
+    """
+    showInfo(breakdown, title="XP by Deck", textFormat="rich")
+
+# Show timings of the add-on's hot paths, also exported as JSON
+def show_timings():
+    report = get_timing_report()
+    try:
+        export_timings(get_timings_path())
+        exported = f"Exported to {get_timings_path()}"
+    except Exception as e:
+        exported = f"Export failed: {str(e)}"
+    timing_rows = "".join(f"<tr><td>{name}</td><td align='right'>{timing['count']}</td>"
+                          f"<td align='right'>{timing['p50_ms']:.2f}</td><td align='right'>{timing['p95_ms']:.2f}</td>"
+                          f"<td align='right'>{timing['max_ms']:.2f}</td><td align='right'>{timing['total_ms']:.0f}</td></tr>"
+                          for name, timing in report.items())
+    
+    timings = f"""
+    <h2>XP Add-on Timings</h2>
+    <p>Milliseconds per call; p50 and p95 cover the most recent calls.</p>
+    <table cellspacing="6">
+        <tr><th align='left'>Timer</th><th>Calls</th><th>p50</th><th>p95</th><th>Max</th><th>Total</th></tr>
+        {timing_rows or "<tr><td>Nothing timed yet</td></tr>"}
+    </table>
+    <p>{exported}</p>
+    """
+    showInfo(timings, title="XP Add-on Timings", textFormat="rich")
+
+# Setup status bar
+def setup_status_bar():
+    mw.xp_status = XPStatus()
+    mw.statusBar().addPermanentWidget(mw.xp_status)
+
+# Setup menu
+def setup_menu():
+    menu = QMenu("XP System", mw)
+    
+    # Stats action
+    stats_action = QAction("View XP Stats", mw)
+    stats_action.triggered.connect(show_stats)
+    menu.addAction(stats_action)
+    
+    # Leaderboard action
+    leaderboard_action = QAction("View XP Leaderboard", mw)
+    leaderboard_action.triggered.connect(lambda: show_leaderboard())
+    menu.addAction(leaderboard_action)
+    
+    # Breakdown action
+    breakdown_action = QAction("View XP by Deck", mw)
+    breakdown_action.triggered.connect(show_breakdown)
+    menu.addAction(breakdown_action)
+    
+    # Timings action
+    timings_action = QAction("View XP Timings", mw)
+    timings_action.triggered.connect(show_timings)
+    menu.addAction(timings_action)
+    
+    # Reset action
+    reset_action = QAction("Reset XP Data", mw)
+    reset_action.triggered.connect(reset_state)
+    menu.addAction(reset_action)
+    
+    # Rebuild action
+    rebuild_action = QAction("Rebuild XP from Review History", mw)
+    rebuild_action.triggered.connect(rebuild_from_revlog)
+    menu.addAction(rebuild_action)
+    
+    # Sync actions
+    export_action = QAction("Export XP for Another Device...", mw)
+    export_action.triggered.connect(export_sync)
+    menu.addAction(export_action)
+    merge_action = QAction("Merge XP from Another Device...", mw)
+    merge_action.triggered.connect(merge_sync)
+    menu.addAction(merge_action)
+    
+    # Add to main menu
+    mw.form.menuTools.addMenu(menu)
+
+# Setup periodic and shutdown flushes
+def setup_persistence():
+    # Flush batches that are waiting on the time limit once answers stop
+    mw.xp_flush_timer = QTimer(mw)
+    mw.xp_flush_timer.timeout.connect(flush_state)
+    mw.xp_flush_timer.start(SAVE_EVERY_SECONDS * 1000)
+    
+    # Pick up skipped status bar updates once the window is back
+    mw.xp_display_timer = QTimer(mw)
+    mw.xp_display_timer.timeout.connect(refresh_stale_display)
+    mw.xp_display_timer.start(1000)
+    
+    # Roll the day over at the day boundary, even if no card is answered
+    mw.xp_rollover_timer = QTimer(mw)
+    mw.xp_rollover_timer.setSingleShot(True)
+    mw.xp_rollover_timer.timeout.connect(on_day_boundary)
+    arm_rollover_timer()
+
+# Arm the rollover timer for the end of the current study day (a second
+# late, so the new day has surely started)
+def arm_rollover_timer():
+    mw.xp_rollover_timer.start(int(get_seconds_to_day_end() * 1000) + 1000)
+
+# A new study day started: roll over once and wait for the next boundary
+def on_day_boundary():
+    try:
+        ensure_state()
+        update_display()
+    except Exception as e:
+        print(f"XP Add-on: Error during day rollover: {str(e)}")
+    arm_rollover_timer()
+
+# Hour Anki starts a new day at ("Next day starts at" in the preferences)
+def get_anki_rollover_hour():
+    try:
+        return int(mw.col.get_config("rollover", 4))
+    except Exception:
+        pass
+    try:
+        return int(mw.col.conf.get("rollover", 4))
+    except Exception:
+        return DAY_ROLLOVER_HOUR
+
+# Setup the answer pipeline's UI consumers (the core registers its own)
+def setup_answer_pipeline():
+    register_answer_consumer("tooltip", consume_tooltip, deferred=True, should_run=tooltips_enabled)
+    register_answer_consumer("status_bar", consume_status_bar, deferred=True,
+                             should_run=is_main_window_visible, latest_only=True)
+
+# Deferred startup: load the state and build the status bar. Runs once, from
+# a timer after the profile loads, or sooner if a review or an XP menu entry
+# needs the state first. If a step fails, the add-on isn't started and the
+# next call carries on from that step. Work that can wait (leaderboard,
+# history compaction) runs within STARTUP_BUDGET_MS, and past it on later
+# event loop turns.
+@timed("startup")
+def start_addon(*args):
+    global _started, _startup_steps_done
+    if _started:
+        return
+    start = time.perf_counter()
+    steps = (lambda: set_notifier(tooltip), load_config, select_profile, load_state, setup_status_bar,
+             setup_persistence)
+    try:
+        while _startup_steps_done < len(steps):
+            steps[_startup_steps_done]()
+            _startup_steps_done += 1
+    except Exception as e:
+        print(f"XP Add-on: Error during startup: {str(e)}")
+        return
+    _started = True
+    run_startup_steps([setup_leaderboard, compact_history], start)
+
+# Run startup steps in order until the startup has taken STARTUP_BUDGET_MS
+# (since start, a perf_counter time), leaving the rest to the next event loop
+# turn
+def run_startup_steps(steps, start):
+    while steps:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms > STARTUP_BUDGET_MS:
+            print(f"XP Add-on: Startup took {elapsed_ms:.0f} ms (budget {STARTUP_BUDGET_MS} ms), "
+                  f"putting off {len(steps)} step(s)")
+            QTimer.singleShot(0, lambda: run_startup_steps(steps, time.perf_counter()))
+            return
+        step = steps.pop(0)
+        try:
+            step()
+        except Exception as e:
+            print(f"XP Add-on: Error during startup: {str(e)}")
+
+# Run the deferred startup once the main window has had time to show
+def schedule_startup(*args):
+    if not _started:
+        QTimer.singleShot(STARTUP_DELAY_MS, start_addon)
+
+# Make Anki's current profile the add-on's current profile
+def select_profile():
+    if mw.pm.name:
+        switch_profile(mw.pm.name, get_profile_dir(mw.pm.name))
+    set_rollover_hour(get_anki_rollover_hour())
+
+# Profile opened: start up, or switch to its state if already running
+def on_profile_loaded(*args):
+    if not _started:
+        schedule_startup()
+        return
+    select_profile()
+    ensure_state()
+    setup_leaderboard()
+    update_display()
+    arm_rollover_timer()
+
+# Hook for answering cards
+def on_answer(*args):
+    # Extract the ease value (should be the last argument)
+    try:
+        process_answer(args[-1])
+    except Exception as e:
+        # Print error for debugging but don't show to user
+        print(f"Error in on_answer: {str(e)}")
+
+# Initialize add-on: only the light parts (menu, hooks, answer detection);
+# start_addon does the rest later
+@timed("init")
+def init():
+    try:
+        # Setup UI
+        setup_menu()
+        setup_answer_pipeline()
+        
+        # Deferred startup, and flushes on profile close and shutdown
+        addHook("profileLoaded", on_profile_loaded)
+        addHook("showQuestion", start_addon)
+        addHook("unloadProfile", flush_state_now)
+        addHook("unloadProfile", stop_leaderboard)
+        
+        # Take XP back when Anki undoes a review (revertedCard on older
+        # versions, state_did_undo on newer ones; on_undo checks the revlog,
+        # so running for both is harmless)
+        addHook("revertedCard", on_undo)
+        try:
+            from aqt import gui_hooks
+            gui_hooks.state_did_undo.append(on_undo)
+        except (ImportError, AttributeError):
+            pass
+        atexit.register(flush_state_now)
+        atexit.register(stop_leaderboard)
+        
+        try:
+            # Try to use direct method wrapping for more reliable answer detection
+            from aqt.reviewer import Reviewer
+            
+            # Original _answerCard method
+            original_answer_card = Reviewer._answerCard
+            
+            # Wrapped method
+            def wrapped_answer_card(self, ease):
+                # Card and start time identify the review, for undo
+                card_id, deck_id, note_type_id = get_card_ids(getattr(self, "card", None))
+                answered_at = int(time.time() * 1000)
+                
+                # Call original method
+                ret = original_answer_card(self, ease)
+                
+                # Process XP
+                try:
+                    process_answer(ease, card_id, answered_at, deck_id, note_type_id)
+                except Exception as e:
+                    # Print error for debugging but don't show to user
+                    print(f"Error in wrapped_answer_card: {str(e)}")
+                
+                return ret
+            
+            # Replace the method
+            Reviewer._answerCard = wrapped_answer_card
+            
+            print("XP Add-on: Using method wrapping for answer detection")
+        except:
+            # Fall back to regular hooks if method wrapping fails
+            addHook("reviewCleanup", update_display)
+            addHook("showQuestion", update_display)
+            addHook("showAnswer", update_display)
+            addHook("afterReviewerAnswered", on_answer)
+            
+            print("XP Add-on: Using hooks for answer detection")
+    except Exception as e:
+        print(f"XP Add-on: Error during initialization: {str(e)}")
+
+# Start the add-on
+init()
\ No newline at end of file